@@ -0,0 +1,202 @@
+"""
+Бенчмарк стиснення сховища: ціна CPU проти економії диска та IO.
+
+    python -m benchmarks.compression --path D:/court/files/3f --disk-mbps 150
+    python -m benchmarks.compression --synthetic 300 --output compression.json
+
+Проганяє файли через той самий потоковий шлях, що й збирач
+(utils/compression.should_compress + create_compressor, блоки по 1 МіБ,
+як DOWNLOAD_CHUNK_SIZE за замовчуванням),
+для gzip і zstd (якщо встановлено zstandard) на кількох рівнях і рахує:
+коефіцієнт стиснення, CPU-час стиснення і розпакування, пропущені як уже
+стиснені файли та скільки часу запису на диск з пропускною здатністю
+--disk-mbps економить зменшений обсяг. Реальні висновки — лише на вибірці
+справжніх документів (--path); синтетичний корпус лише перевіряє механіку.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import zipfile
+import zlib
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from utils.compression import GZIP, ZSTD, create_compressor, should_compress, zstandard
+
+CHUNK_SIZE = 1024 * 1024
+LEVELS = {GZIP: (1, 6, 9), ZSTD: (1, 3, 9, 19)}
+_WORDS = (
+    "суд рішення позивач відповідач справа постанова ухвала апеляційна скарга "
+    "задовольнити відмовити підстави закон статті кодексу України представник "
+    "розгляд засідання сторони договір стягнення заборгованість"
+).split()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк стиснення файлів сховища.")
+    parser.add_argument("--path", help="Папка з вибіркою справжніх документів (рекурсивно).")
+    parser.add_argument("--limit", type=int, default=0, help="Не більше стількох файлів з --path.")
+    parser.add_argument(
+        "--synthetic", type=int, default=200, help="Розмір синтетичного корпусу, якщо --path не задано."
+    )
+    parser.add_argument(
+        "--disk-mbps", type=float, default=150.0,
+        help="Пропускна здатність запису сховища, МБ/с — для оцінки зекономленого часу IO.",
+    )
+    parser.add_argument("--output", help="Зберегти результати у JSON.")
+    return parser.parse_args(argv)
+
+
+def iter_folder(path: Path, limit: int) -> Iterator[Tuple[str, bytes]]:
+    count = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            if name.endswith(".part") or name.startswith("."):
+                continue
+            yield name, (Path(root) / name).read_bytes()
+            count += 1
+            if limit and count >= limit:
+                return
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def iter_synthetic(count: int) -> Iterator[Tuple[str, bytes]]:
+    """Грубе наближення суміші документів: HTML/RTF-текст, PDF з deflate-потоками, DOCX (zip)."""
+    rng = random.Random(0)
+    for i in range(count):
+        kind = i % 4
+        words = rng.randint(500, 20000)
+        if kind == 0:
+            yield f"doc{i}.html", f"<html><body><p>{_text(rng, words)}</p></body></html>".encode("utf-8")
+        elif kind == 1:
+            body = _text(rng, words).encode("cp1251", errors="ignore").hex()
+            yield f"doc{i}.rtf", ("{\\rtf1\\ansi " + body + "}").encode("ascii")
+        elif kind == 2:
+            stream = zlib.compress(_text(rng, words).encode("utf-8"))
+            noise = rng.randbytes(rng.randint(1000, 200000))
+            yield f"doc{i}.pdf", b"%PDF-1.7\n" + stream + b"\nendstream\n" + noise + b"\n%%EOF"
+        else:
+            buffer = BytesIO()
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr("word/document.xml", f"<w:t>{_text(rng, words)}</w:t>")
+            yield f"doc{i}.docx", buffer.getvalue()
+
+
+def _decompressor(codec: str):
+    if codec == ZSTD:
+        return zstandard.ZstdDecompressor().decompressobj()
+    return zlib.decompressobj(31)
+
+
+def measure(files: List[Tuple[str, bytes]], codec: str, level: int, disk_mbps: float) -> Dict:
+    original = stored = skipped = 0
+    compress_cpu = decompress_cpu = 0.0
+    by_extension: Dict[str, List[int]] = {}
+    for name, content in files:
+        original += len(content)
+        extension = os.path.splitext(name)[1].lower() or "-"
+        totals = by_extension.setdefault(extension, [0, 0])
+        totals[0] += len(content)
+        if not should_compress(name, content[:CHUNK_SIZE]):
+            skipped += 1
+            stored += len(content)
+            totals[1] += len(content)
+            continue
+
+        started = time.process_time()
+        compressor = create_compressor(codec, level)
+        parts = [compressor.compress(content[i:i + CHUNK_SIZE]) for i in range(0, len(content), CHUNK_SIZE)]
+        parts.append(compressor.flush())
+        compress_cpu += time.process_time() - started
+        packed = b"".join(parts)
+
+        started = time.process_time()
+        restored = _decompressor(codec).decompress(packed)
+        decompress_cpu += time.process_time() - started
+        if restored != content:
+            raise RuntimeError(f"{codec}:{level} пошкодив {name}")
+        stored += len(packed)
+        totals[1] += len(packed)
+
+    mb = 1024 * 1024
+    saved = original - stored
+    disk_seconds_saved = saved / mb / disk_mbps if disk_mbps else 0.0
+    return {
+        "codec": codec,
+        "level": level,
+        "files": len(files),
+        "skipped": skipped,
+        "original_mb": round(original / mb, 2),
+        "stored_mb": round(stored / mb, 2),
+        "ratio": round(original / stored, 3) if stored else None,
+        "saved_pct": round(100 * saved / original, 1) if original else 0.0,
+        "compress_cpu_s": round(compress_cpu, 3),
+        "compress_mb_per_s": round(original / mb / compress_cpu, 1) if compress_cpu else None,
+        "decompress_cpu_s": round(decompress_cpu, 3),
+        "disk_seconds_saved": round(disk_seconds_saved, 3),
+        # Секунди запису, зекономлені на секунду CPU одного ядра.
+        "io_saved_per_cpu_s": round(disk_seconds_saved / compress_cpu, 2) if compress_cpu else None,
+        "by_extension": {
+            extension: round(before / after, 3) if after else None
+            for extension, (before, after) in sorted(by_extension.items())
+        },
+    }
+
+
+def print_report(results: List[Dict], disk_mbps: float):
+    print(
+        f"{'codec':>6} {'lvl':>4} {'МБ':>9} {'на диску':>9} {'ratio':>6} {'-%':>6} "
+        f"{'CPU с':>8} {'МБ/с':>7} {'розп. с':>8} {'IO с':>7} {'IO/CPU':>7}"
+    )
+    for r in results:
+        print(
+            f"{r['codec']:>6} {r['level']:>4} {r['original_mb']:>9} {r['stored_mb']:>9} "
+            f"{r['ratio'] or '-':>6} {r['saved_pct']:>6} {r['compress_cpu_s']:>8} "
+            f"{r['compress_mb_per_s'] or '-':>7} {r['decompress_cpu_s']:>8} "
+            f"{r['disk_seconds_saved']:>7} {r['io_saved_per_cpu_s'] or '-':>7}"
+        )
+    if results:
+        print(f"\nПропущено як уже стиснені: {results[0]['skipped']} з {results[0]['files']} файлів.")
+    print(
+        f"IO с — час запису зекономлених байтів при {disk_mbps} МБ/с; "
+        f"IO/CPU — зекономлені секунди запису на секунду CPU одного ядра."
+    )
+    for r in results:
+        ratios = ", ".join(f"{ext} {ratio}" for ext, ratio in r["by_extension"].items())
+        print(f"  {r['codec']}:{r['level']}: {ratios}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.path:
+        files = list(iter_folder(Path(args.path), args.limit))
+    else:
+        files = list(iter_synthetic(args.synthetic))
+    if not files:
+        print("Немає файлів для бенчмарку.")
+        return 1
+
+    codecs = [GZIP] + ([ZSTD] if zstandard is not None else [])
+    if zstandard is None:
+        print("zstandard не встановлено — вимірюється лише gzip.\n")
+    results = [
+        measure(files, codec, level, args.disk_mbps)
+        for codec in codecs
+        for level in LEVELS[codec]
+    ]
+    print_report(results, args.disk_mbps)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+Локальний фейковий API суду для офлайн-бенчмарків.
+
+    python -m benchmarks.fake_server --documents 2000 --latency-ms 20 --error-rate 0.01
+
+Обслуговує:
+- GET /storage/file/<link> — детермінований вміст (унікальний для кожного
+  посилання) з розміром за лог-нормальним розподілом, ETag і Range (206);
+- GET /list?limit=&offset= — пагінований список документів у форматі
+  {"data": [...], "pageCount": n, "page": k}.
+
+Затримка, частка 503 (з Retry-After), 404 та обривів з'єднання посеред тіла
+задаються параметрами. Перший рядок stdout — "PORT <номер>".
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import socket
+import sys
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator
+from urllib.parse import parse_qs, urlparse
+
+BASE_UPDATED_AT = datetime(2024, 1, 1)
+_BLOCK = random.Random(0).randbytes(64 * 1024)
+_RANGE_RE = re.compile(r"bytes=(\d+)-(\d*)$")
+
+
+def document_at(index: int) -> Dict:
+    """Документ-джерело з номером index (однаковий для SQLite-джерела і /list)."""
+    return {
+        "DocumentId": f"doc-{index:08d}",
+        "updatedAt": BASE_UPDATED_AT + timedelta(seconds=index),
+        "originalText": json.dumps({"link": f"files/{index:08d}.pdf", "attachNum": 1}),
+    }
+
+
+def iter_documents(count: int) -> Iterator[Dict]:
+    for index in range(count):
+        yield document_at(index)
+
+
+def _link_seed(link: str) -> int:
+    return int.from_bytes(hashlib.blake2b(link.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class FakeStorage:
+    def __init__(
+        self,
+        size_median: int,
+        size_sigma: float,
+        size_max: int,
+        missing_rate: float,
+    ):
+        self.size_mu = math.log(size_median)
+        self.size_sigma = size_sigma
+        self.size_max = size_max
+        self.missing_rate = missing_rate
+
+    def describe(self, link: str):
+        """(існує, розмір, etag) — детерміновано за посиланням."""
+        rng = random.Random(_link_seed(link))
+        exists = rng.random() >= self.missing_rate
+        size = int(min(self.size_max, max(1024, rng.lognormvariate(self.size_mu, self.size_sigma))))
+        return exists, size, f'"{_link_seed(link):016x}-{size}"'
+
+    @staticmethod
+    def iter_bytes(link: str, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """
+        Байти [start, end) віртуального файлу: префікс з посиланням
+        (вміст кожного файлу унікальний), далі повторюваний блок.
+        """
+        prefix = f"{link}\n".encode("utf-8")
+        position = start
+        while position < end:
+            if position < len(prefix):
+                piece = prefix[position:min(end, len(prefix))]
+            else:
+                offset = (position - len(prefix)) % len(_BLOCK)
+                piece = _BLOCK[offset:offset + min(chunk_size, end - position)]
+            yield piece
+            position += len(piece)
+
+
+def make_handler(args, storage: FakeStorage):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *log_args):
+            pass
+
+        def _delay(self):
+            if args.latency_ms:
+                jitter = random.uniform(-args.latency_jitter_ms, args.latency_jitter_ms)
+                time.sleep(max(0.0, args.latency_ms + jitter) / 1000)
+
+        def _send_json(self, status: int, payload: Dict):
+            body = json.dumps(payload, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_empty(self, status: int, headers: Dict = None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_GET(self):
+            self._delay()
+            parsed = urlparse(self.path)
+            if random.random() < args.error_rate:
+                self._send_empty(503, {"Retry-After": "0"})
+                return
+            marker = "/storage/file/"
+            if marker in parsed.path:
+                self._serve_file(parsed.path.split(marker, 1)[1])
+            elif parsed.path.rstrip("/").endswith("/list"):
+                self._serve_list(parse_qs(parsed.query))
+            else:
+                self._send_empty(404)
+
+        def _serve_list(self, query: Dict):
+            limit = int(query.get("limit", ["100"])[0])
+            offset = int(query.get("offset", ["0"])[0])
+            end = min(args.documents, offset + limit)
+            self._send_json(200, {
+                "data": [document_at(index) for index in range(offset, end)],
+                "pageCount": math.ceil(args.documents / limit) if limit else 0,
+                "page": offset // limit + 1 if limit else 1,
+            })
+
+        def _serve_file(self, link: str):
+            exists, size, etag = storage.describe(link)
+            if not exists:
+                self._send_empty(404)
+                return
+
+            start, end, status = 0, size, 200
+            range_header = self.headers.get("Range")
+            if_range = self.headers.get("If-Range")
+            if range_header and (if_range is None or if_range == etag):
+                match = _RANGE_RE.match(range_header.strip())
+                if match is None or int(match.group(1)) >= size:
+                    self._send_empty(416, {"Content-Range": f"bytes */{size}"})
+                    return
+                start = int(match.group(1))
+                end = min(size, int(match.group(2)) + 1) if match.group(2) else size
+                status = 206
+
+            self.send_response(status)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(end - start))
+            self.send_header("ETag", etag)
+            self.send_header("Accept-Ranges", "bytes")
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+            self.end_headers()
+
+            # Обрив з'єднання посеред тіла — перевірка докачування.
+            drop_at = end
+            if random.random() < args.drop_rate:
+                drop_at = start + (end - start) // 2
+            for piece in storage.iter_bytes(link, start, drop_at):
+                self.wfile.write(piece)
+            if drop_at < end:
+                self.close_connection = True
+                self.wfile.flush()
+                self.connection.shutdown(socket.SHUT_RDWR)
+
+    return Handler
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Фейковий API суду для бенчмарків.")
+    add_server_arguments(parser)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--documents", type=int, default=2000, help="Кількість документів у джерелі.")
+    parser.add_argument("--size-median", type=int, default=200_000, help="Медіанний розмір файлу, байт.")
+    parser.add_argument("--size-sigma", type=float, default=1.0, help="Sigma лог-нормального розподілу розмірів.")
+    parser.add_argument("--size-max", type=int, default=20_000_000, help="Максимальний розмір файлу, байт.")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Затримка перед відповіддю, мс.")
+    parser.add_argument("--latency-jitter-ms", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.01, help="Частка відповідей 503.")
+    parser.add_argument("--missing-rate", type=float, default=0.005, help="Частка посилань з 404.")
+    parser.add_argument("--drop-rate", type=float, default=0.005, help="Частка обривів посеред тіла.")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    storage = FakeStorage(args.size_median, args.size_sigma, args.size_max, args.missing_rate)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args, storage))
+    server.daemon_threads = True
+    print(f"PORT {server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
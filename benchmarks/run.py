@@ -0,0 +1,374 @@
+"""
+Офлайн-бенчмарк пропускної здатності збору документів.
+
+    python -m benchmarks.run --documents 2000 --concurrency 4,16,64
+    python -m benchmarks.run --mode api --concurrency 16 --output bench.json
+    python -m benchmarks.run --nodes 3 --concurrency 16
+
+Запускає локальний фейковий API (benchmarks/fake_server.py), створює
+SQLite-джерело з тими самими документами і для кожного рівня паралелізму
+виконує повний прохід в окремому процесі з чистою SQLite-базою Documents
+(DATABASE_URL / SOURCE_DATABASE_URL). Мережа і MSSQL не потрібні.
+
+--nodes N запускає N вузлів-збирачів одночасно на спільній базі Documents
+(оренди repo/leases.py) і рахує дубльовані завантаження та помилки
+"database is locked" у логах вузлів.
+
+Звіт: файли/с, МБ/с, пікова RSS та час стадій з utils/metrics
+(зі STORAGE_COMPRESSION=gzip|zstd у середовищі — і стадія compress; вміст
+фейкового сервера випадковий, тож коефіцієнт стиснення дивіться в
+benchmarks/compression.py).
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.fake_server import add_server_arguments, iter_documents
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+COMPANY = "bench"
+TOKEN = "bench-token"
+
+
+class _LockErrorCounter(logging.Filter):
+    """Рахує записи логу з "database is locked", нічого не відкидаючи."""
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if "database is locked" in record.getMessage():
+            self.count += 1
+        return True
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк збору документів.")
+    add_server_arguments(parser)
+    parser.add_argument(
+        "--concurrency", default="4,16,64", help="Рівні паралелізму завантажень через кому."
+    )
+    parser.add_argument(
+        "--mode", choices=("db", "api"), default="db",
+        help="Джерело документів: SQLite-таблиця (db) або пагінований /list (api).",
+    )
+    parser.add_argument(
+        "--adaptive", action="store_true",
+        help="Не фіксувати ліміт: рівень задає лише початковий адаптивний ліміт.",
+    )
+    parser.add_argument(
+        "--nodes", type=int, default=1,
+        help="Кількість вузлів на спільній БД Documents (CLUSTER_NODE_ID), 1 — без оренд.",
+    )
+    parser.add_argument("--workdir", help="Робоча папка (за замовчуванням — тимчасова).")
+    parser.add_argument("--output", help="Зберегти результати у JSON.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def server_argv(args) -> List[str]:
+    options = (
+        "documents", "size_median", "size_sigma", "size_max", "latency_ms",
+        "latency_jitter_ms", "error_rate", "missing_rate", "drop_rate",
+    )
+    argv = []
+    for name in options:
+        argv += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    return argv
+
+
+def create_source_db(path: Path, documents: int):
+    """SQLite-копія таблиці document<company> з тими ж рядками, що й /list."""
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute(
+            f'CREATE TABLE "document{COMPANY}" ('
+            '"DocumentId" VARCHAR(64) PRIMARY KEY, "updatedAt" DATETIME, "originalText" TEXT)'
+        )
+        connection.execute(f'CREATE INDEX ix_updated ON "document{COMPANY}" ("updatedAt", "DocumentId")')
+        connection.executemany(
+            f'INSERT INTO "document{COMPANY}" VALUES (?, ?, ?)',
+            (
+                (doc["DocumentId"], doc["updatedAt"].strftime("%Y-%m-%d %H:%M:%S.%f"), doc["originalText"])
+                for doc in iter_documents(documents)
+            ),
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def start_server(args) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_server", *server_argv(args)],
+        cwd=REPO_ROOT,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    line = process.stdout.readline()
+    if not line.startswith("PORT "):
+        process.kill()
+        raise RuntimeError(f"Фейковий сервер не запустився: {line!r}")
+    process.port = int(line.split()[1])
+    return process
+
+
+def run_level(args, workdir: Path, source_db: Path, base_link: str, concurrency: int) -> Dict:
+    """
+    Один прохід в окремому процесі: чисті модулі, engine і пікова RSS.
+    З --nodes N — N процесів-вузлів одночасно на спільній SQLite-базі Documents.
+    """
+    level_dir = workdir / f"c{concurrency}"
+    shutil.rmtree(level_dir, ignore_errors=True)
+    level_dir.mkdir(parents=True)
+    database_path = level_dir / "documents.sqlite3"
+    env = dict(
+        os.environ,
+        BASE_LINK=base_link,
+        API_VERSION="",
+        TOKENS_FOLDERS_COMPANIES="{}",
+        TABLE_NAME="Documents",
+        DATABASE_URL=f"sqlite:///{database_path.as_posix()}",
+        SOURCE_DATABASE_URL=f"sqlite:///{source_db.as_posix()}",
+        SOURCE_SCHEMA_CACHE_DIR="",
+        DOWNLOAD_CONCURRENCY_INITIAL=str(concurrency),
+        RETRY_BACKOFF_BASE="0.05",
+        RETRY_BACKOFF_MAX="0.5",
+        CLUSTER_HEARTBEAT_SECONDS="2",
+        CLUSTER_NODE_TTL_SECONDS="10",
+    )
+    if not args.adaptive:
+        env["DOWNLOAD_CONCURRENCY_MIN"] = str(concurrency)
+        env["DOWNLOAD_CONCURRENCY_MAX"] = str(concurrency)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(REPO_ROOT), env.get("PYTHONPATH")]))
+
+    def child(config: Dict) -> subprocess.Popen:
+        return subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.run", "--child", json.dumps(config)],
+            cwd=level_dir,
+            env=env,
+            stdout=subprocess.DEVNULL,
+        )
+
+    base_config = {"mode": args.mode, "concurrency": concurrency, "base_link": base_link}
+    if args.nodes > 1:
+        # Таблиці створює один процес, щоб вузли не змагалися за create_all.
+        if child({**base_config, "init_only": True}).wait():
+            raise RuntimeError("Не вдалося створити таблиці бенчмарку")
+
+    processes, result_paths = [], []
+    for node in range(args.nodes):
+        node_dir = level_dir / f"node{node}" if args.nodes > 1 else level_dir
+        result_paths.append(node_dir / "result.json")
+        processes.append(child({
+            **base_config,
+            "folder": str(node_dir / "files"),
+            "result_path": str(result_paths[-1]),
+            "node_id": f"bench-node-{node}" if args.nodes > 1 else "",
+            "nodes": args.nodes,
+        }))
+    codes = [process.wait() for process in processes]
+    if any(codes):
+        raise RuntimeError(f"Дочірні процеси завершились з кодами {codes}")
+
+    results = []
+    for path in result_paths:
+        with open(path, encoding="utf-8") as f:
+            results.append(json.load(f))
+    if args.nodes == 1:
+        return results[0]
+    return merge_node_results(results, database_path)
+
+
+def merge_node_results(results: List[Dict], database_path: Path) -> Dict:
+    """Сумарний результат вузлів: файли і байти — сума, час — найдовший вузол."""
+    elapsed = max(r["elapsed"] for r in results)
+    merged = {key: sum(r[key] for r in results) for key in (
+        "files", "not_found", "failed", "retries", "bytes_resumed", "bytes", "lock_errors",
+    )}
+    stages: Dict[str, float] = {}
+    for r in results:
+        for name, value in r["stages"].items():
+            stages[name] = round(stages.get(name, 0) + value, 3)
+    links_table = os.environ.get("DOCUMENT_LINKS_TABLE_NAME", "document_links")
+    connection = sqlite3.connect(database_path)
+    try:
+        # Кожне збереження посилання додає рядок DocumentLinks — повтори означають дублі.
+        duplicates = connection.execute(
+            f'SELECT COUNT(*) - COUNT(DISTINCT original_url) FROM "{links_table}"'
+        ).fetchone()[0]
+    finally:
+        connection.close()
+    rss = [r["peak_rss_mb"] for r in results if r["peak_rss_mb"] is not None]
+    return {
+        **merged,
+        "concurrency": results[0]["concurrency"],
+        "mode": results[0]["mode"],
+        "nodes": len(results),
+        "elapsed": elapsed,
+        "files_per_s": round(merged["files"] / elapsed, 2) if elapsed else 0,
+        "mb_per_s": round(merged["bytes"] / (1024 * 1024) / elapsed, 2) if elapsed else 0,
+        "peak_rss_mb": max(rss) if rss else None,
+        "duplicates": duplicates,
+        "per_node_files": [r["files"] for r in results],
+        "stages": stages,
+    }
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux — КБ, macOS — байти.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def child_main(config: Dict) -> int:
+    """Виконується в дочірньому процесі з уже налаштованим середовищем."""
+    import asyncio
+    from datetime import datetime
+
+    from config.logger import get_logger
+    from database.database import SessionLocal, initialize_database
+    from database.source import dispose_source_engines
+    from repo.documents import DocumentRepository
+    from services.cluster import cluster_membership, create_lease_store
+    from services.documents import DocumentService
+    from utils import metrics
+
+    lock_errors = _LockErrorCounter()
+    # Усі логери пишуть через один спільний обробник черги.
+    get_logger(__name__).handlers[0].addFilter(lock_errors)
+    initialize_database()
+    if config.get("init_only"):
+        return 0
+    session = SessionLocal()
+    repo = DocumentRepository(session=session, folder=config["folder"], company=COMPANY)
+    service = DocumentService(document_repo=repo, doc_type="data", token=TOKEN, company=COMPANY)
+    service.lease_store = create_lease_store(config.get("node_id", ""))
+
+    async def gather():
+        # Усі вузли мають побачити одне одного до старту, інакше розподіл нерівний.
+        async with cluster_membership(service.lease_store, grace=30, expected_nodes=config["nodes"]):
+            if config["mode"] == "api":
+                return await service.gather_documents_from_api_async(
+                    f"{config['base_link']}list",
+                    config["base_link"],
+                    "2000-01-01T00:00:00",
+                    "2100-01-01T00:00:00",
+                    concurrency_limit=config["concurrency"],
+                )
+            return await service.gather_documents_async(
+                config["base_link"],
+                datetime(2000, 1, 1),
+                datetime(2100, 1, 1),
+                full_rescan=True,
+                concurrency_limit=config["concurrency"],
+            )
+
+    started = time.perf_counter()
+    summary = asyncio.run(gather())
+    elapsed = time.perf_counter() - started
+    session.close()
+    dispose_source_engines()
+
+    downloaded = metrics.BYTES.total()
+    stages = {
+        dict(key).get("stage", "?"): round(total, 3)
+        for key, (total, _) in metrics.STAGE_SECONDS.totals().items()
+    }
+    for name, histogram in (("http_ttfb", metrics.HTTP_TTFB), ("download", metrics.DOWNLOAD_SECONDS)):
+        stages[name] = round(sum(total for total, _ in histogram.totals().values()), 3)
+
+    result = {
+        "concurrency": config["concurrency"],
+        "mode": config["mode"],
+        "elapsed": round(elapsed, 3),
+        "files": summary.get("success", 0),
+        "not_found": summary.get("not_found", 0),
+        "failed": summary.get("failed", 0),
+        "retries": summary.get("retries", 0),
+        "bytes_resumed": summary.get("bytes_resumed", 0),
+        "bytes": downloaded,
+        "lock_errors": lock_errors.count,
+        "files_per_s": round(summary.get("success", 0) / elapsed, 2) if elapsed else 0,
+        "mb_per_s": round(downloaded / (1024 * 1024) / elapsed, 2) if elapsed else 0,
+        "peak_rss_mb": _peak_rss_mb(),
+        "stages": stages,
+    }
+    with open(config["result_path"], "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    return 0
+
+
+def print_report(results: List[Dict]):
+    if any("duplicates" in r for r in results):
+        for r in results:
+            print(
+                f"conc={r['concurrency']}: вузлів {r.get('nodes', 1)}, файлів по вузлах "
+                f"{r.get('per_node_files', [r['files']])}, дублів {r.get('duplicates', 0)}, "
+                f"помилок блокування БД {r.get('lock_errors', 0)}"
+            )
+        print()
+    print(
+        f"{'conc':>5} {'files':>7} {'404':>5} {'fail':>5} {'retry':>6} {'сек':>8} "
+        f"{'файли/с':>9} {'МБ/с':>8} {'RSS МБ':>8}"
+    )
+    for r in results:
+        rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-"
+        print(
+            f"{r['concurrency']:>5} {r['files']:>7} {r['not_found']:>5} {r['failed']:>5} "
+            f"{r['retries']:>6} {r['elapsed']:>8.2f} {r['files_per_s']:>9.2f} "
+            f"{r['mb_per_s']:>8.2f} {rss:>8}"
+        )
+    print("\nЧас стадій, с (сумарно по всіх воркерах):")
+    for r in results:
+        stages = ", ".join(f"{k}={v}" for k, v in sorted(r["stages"].items(), key=lambda kv: -kv[1]))
+        print(f"  conc={r['concurrency']}: {stages}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.child:
+        return child_main(json.loads(args.child))
+
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    with tempfile.TemporaryDirectory(prefix="ecourt-bench-") as tmp:
+        workdir = Path(args.workdir or tmp).resolve()
+        workdir.mkdir(parents=True, exist_ok=True)
+        source_db = workdir / "source.sqlite3"
+        source_db.unlink(missing_ok=True)
+        create_source_db(source_db, args.documents)
+
+        server = start_server(args)
+        try:
+            base_link = f"http://127.0.0.1:{server.port}/"
+            results = []
+            for concurrency in levels:
+                print(f"Рівень паралелізму {concurrency}...", flush=True)
+                results.append(run_level(args, workdir, source_db, base_link, concurrency))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,3 +25,102 @@ TABLE_NAME = os.environ.get("TABLE_NAME")
 
 TOKENS_FOLDERS_COMPANIES_STR = os.environ.get("TOKENS_FOLDERS_COMPANIES")
 TOKENS_FOLDERS_COMPANIES = json.loads(TOKENS_FOLDERS_COMPANIES_STR)
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", "600"))
+HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+
+DOWNLOAD_CHUNK_SIZE = int(os.environ.get("DOWNLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+SYNC_WATERMARK_TABLE_NAME = os.environ.get("SYNC_WATERMARK_TABLE_NAME", "sync_watermarks")
+SYNC_WATERMARK_OVERLAP_MINUTES = int(os.environ.get("SYNC_WATERMARK_OVERLAP_MINUTES", "10"))
+
+SOURCE_FETCH_SIZE = int(os.environ.get("SOURCE_FETCH_SIZE", "1000"))
+PLAN_QUEUE_SIZE = int(os.environ.get("PLAN_QUEUE_SIZE", "10000"))
+
+GOV_REG_POOL_SIZE = int(os.environ.get("GOV_REG_POOL_SIZE", "5"))
+GOV_REG_MAX_OVERFLOW = int(os.environ.get("GOV_REG_MAX_OVERFLOW", "5"))
+GOV_REG_POOL_RECYCLE = int(os.environ.get("GOV_REG_POOL_RECYCLE", "1800"))
+SOURCE_SCHEMA_CACHE_DIR = os.environ.get("SOURCE_SCHEMA_CACHE_DIR") or None
+
+LINK_INDEX_FETCH_SIZE = int(os.environ.get("LINK_INDEX_FETCH_SIZE", "50000"))
+
+WRITE_BATCH_SIZE = int(os.environ.get("WRITE_BATCH_SIZE", "200"))
+WRITE_BATCH_INTERVAL_MS = int(os.environ.get("WRITE_BATCH_INTERVAL_MS", "500"))
+
+GLOBAL_DOWNLOAD_CONCURRENCY = int(os.environ.get("GLOBAL_DOWNLOAD_CONCURRENCY", "50"))
+TOKEN_DOWNLOAD_CONCURRENCY = int(os.environ.get("TOKEN_DOWNLOAD_CONCURRENCY", "10"))
+
+DOWNLOAD_CONCURRENCY_INITIAL = int(os.environ.get("DOWNLOAD_CONCURRENCY_INITIAL", "10"))
+DOWNLOAD_CONCURRENCY_MIN = int(os.environ.get("DOWNLOAD_CONCURRENCY_MIN", "2"))
+DOWNLOAD_CONCURRENCY_MAX = int(os.environ.get("DOWNLOAD_CONCURRENCY_MAX", "64"))
+ADAPTIVE_DECREASE_FACTOR = float(os.environ.get("ADAPTIVE_DECREASE_FACTOR", "0.7"))
+ADAPTIVE_LATENCY_TOLERANCE = float(os.environ.get("ADAPTIVE_LATENCY_TOLERANCE", "2.0"))
+ADAPTIVE_COOLDOWN_SECONDS = float(os.environ.get("ADAPTIVE_COOLDOWN_SECONDS", "5"))
+
+DOWNLOAD_MAX_ATTEMPTS = int(os.environ.get("DOWNLOAD_MAX_ATTEMPTS", "9"))
+RETRY_BACKOFF_BASE = float(os.environ.get("RETRY_BACKOFF_BASE", "1.0"))
+RETRY_BACKOFF_MAX = float(os.environ.get("RETRY_BACKOFF_MAX", "120"))
+
+DOWNLOAD_QUEUE_FLUSH_EVERY = int(os.environ.get("DOWNLOAD_QUEUE_FLUSH_EVERY", "500"))
+
+DOCUMENT_LINKS_TABLE_NAME = os.environ.get("DOCUMENT_LINKS_TABLE_NAME", "document_links")
+DOWNLOAD_LEASES_TABLE_NAME = os.environ.get("DOWNLOAD_LEASES_TABLE_NAME", "download_leases")
+COLLECTOR_NODES_TABLE_NAME = os.environ.get("COLLECTOR_NODES_TABLE_NAME", "collector_nodes")
+
+HASH_WRITE_WORKERS = int(os.environ.get("HASH_WRITE_WORKERS", "4"))
+
+MANIFEST_WORKERS = int(os.environ.get("MANIFEST_WORKERS") or max(1, (os.cpu_count() or 2) - 1))
+MANIFEST_CHUNK_SIZE = int(os.environ.get("MANIFEST_CHUNK_SIZE", "2000"))
+
+API_PAGE_SIZE = int(os.environ.get("API_PAGE_SIZE", "100"))
+API_PAGE_CONCURRENCY = int(os.environ.get("API_PAGE_CONCURRENCY", "4"))
+API_TIMEOUT = float(os.environ.get("API_TIMEOUT", "360"))
+
+METRICS_TEXTFILE = os.environ.get("METRICS_TEXTFILE", "")
+METRICS_EXPORT_INTERVAL = float(os.environ.get("METRICS_EXPORT_INTERVAL", "15"))
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "")
+SOURCE_DATABASE_URL = os.environ.get("SOURCE_DATABASE_URL", "")
+
+SOURCE_SCAN_SHARDS = int(os.environ.get("SOURCE_SCAN_SHARDS", "1"))
+SOURCE_SHARD_PREFETCH = int(os.environ.get("SOURCE_SHARD_PREFETCH", "4"))
+SOURCE_SHARD_RETRIES = int(os.environ.get("SOURCE_SHARD_RETRIES", "3"))
+
+SOURCE_QUERY_MODE = os.environ.get("SOURCE_QUERY_MODE", "full").lower()
+
+STORAGE_SHARD_LEVELS = int(os.environ.get("STORAGE_SHARD_LEVELS", "2"))
+STORAGE_SHARD_WIDTH = int(os.environ.get("STORAGE_SHARD_WIDTH", "2"))
+LAYOUT_MIGRATION_WORKERS = int(os.environ.get("LAYOUT_MIGRATION_WORKERS", "8"))
+LAYOUT_MIGRATION_BATCH_SIZE = int(os.environ.get("LAYOUT_MIGRATION_BATCH_SIZE", "1000"))
+
+LOG_JSON = os.environ.get("LOG_JSON", "false").lower() in ("1", "true", "yes")
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "0"))
+LOG_RATE_LIMIT_PER_MINUTE = int(os.environ.get("LOG_RATE_LIMIT_PER_MINUTE", "20"))
+
+LINK_INDEX_REFRESH_OVERLAP_SECONDS = int(os.environ.get("LINK_INDEX_REFRESH_OVERLAP_SECONDS", "300"))
+LINK_INDEX_COMPACT_THRESHOLD = int(os.environ.get("LINK_INDEX_COMPACT_THRESHOLD", "100000"))
+DAEMON_INTERVAL_MINUTES = float(os.environ.get("DAEMON_INTERVAL_MINUTES", "30"))
+DAEMON_POLL_SECONDS = float(os.environ.get("DAEMON_POLL_SECONDS", "60"))
+
+AUDIT_WORKERS = int(os.environ.get("AUDIT_WORKERS") or os.cpu_count() or 2)
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", "500"))
+AUDIT_READ_BUFFER = int(os.environ.get("AUDIT_READ_BUFFER", "1048576"))
+AUDIT_VERIFY_HASH = os.environ.get("AUDIT_VERIFY_HASH", "true").lower() in ("1", "true", "yes")
+AUDIT_OUTPUT_DIR = os.environ.get("AUDIT_OUTPUT_DIR", "")
+
+CLUSTER_NODE_ID = os.environ.get("CLUSTER_NODE_ID", "")
+CLUSTER_HEARTBEAT_SECONDS = float(os.environ.get("CLUSTER_HEARTBEAT_SECONDS", "30"))
+CLUSTER_NODE_TTL_SECONDS = float(os.environ.get("CLUSTER_NODE_TTL_SECONDS", "90"))
+CLUSTER_CLAIM_BATCH = int(os.environ.get("CLUSTER_CLAIM_BATCH", "200"))
+DOWNLOAD_LEASE_SECONDS = float(os.environ.get("DOWNLOAD_LEASE_SECONDS", "300"))
+DOWNLOAD_NOT_FOUND_SECONDS = float(os.environ.get("DOWNLOAD_NOT_FOUND_SECONDS", "86400"))
+CLUSTER_STARTUP_GRACE_SECONDS = float(os.environ.get("CLUSTER_STARTUP_GRACE_SECONDS", "15"))
+CLUSTER_EXPECTED_NODES = int(os.environ.get("CLUSTER_EXPECTED_NODES", "0"))
+
+STORAGE_COMPRESSION = os.environ.get("STORAGE_COMPRESSION", "none").lower()
+STORAGE_COMPRESSION_BY_COMPANY = json.loads(os.environ.get("STORAGE_COMPRESSION_BY_COMPANY") or "{}")
+STORAGE_COMPRESSION_LEVEL = int(os.environ["STORAGE_COMPRESSION_LEVEL"]) if os.environ.get("STORAGE_COMPRESSION_LEVEL") else None
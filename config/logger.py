@@ -1,35 +1,176 @@
+import atexit
+import copy
+import json
 import logging
+import queue
 import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
+from typing import Dict, Tuple
 
+from config.config import LOG_JSON, LOG_QUEUE_SIZE, LOG_RATE_LIMIT_PER_MINUTE
 
-def get_logger(name: str, log_file_name: str = "data.log") -> logging.Logger:
+_lock = threading.Lock()
+_queue_handlers: Dict[str, QueueHandler] = {}
+_exception_formatter = logging.Formatter()
+
+# extra= для повідомлень на кожен файл: лише вони обмежуються RateLimitFilter.
+RATE_LIMITED = {"rate_limited": True}
+
+
+class JsonFormatter(logging.Formatter):
+    """Один JSON-об'єкт на рядок: час, рівень, логер, повідомлення, трасування."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
     """
-    Логер, який пише у консоль і файл у тій же папці, де запущено .exe
+    Обмежує лише записи з extra=RATE_LIMITED (повідомлення на кожен файл):
+    не більше per_minute за хвилину з одного місця виклику (файл:рядок)
+    і рівня; решта, зокрема підсумки запуску і CRITICAL, проходять завжди.
+    Кількість пропущених дописується до першого запису наступного вікна,
+    а залишок — окремим записом у flush() при завершенні. Працює до
+    форматування, тож відкинуті записи нічого не коштують.
     """
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
 
-    if not logger.handlers:
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setLevel(logging.INFO)
-        console_formatter = logging.Formatter(
-            "%(asctime)s [%(levelname)-s] - %(message)s",
-            datefmt="%Y-%m-%d %H:%M:%S",
-        )
-        console_handler.setFormatter(console_formatter)
-        logger.addHandler(console_handler)
+    def __init__(self, per_minute: int):
+        super().__init__()
+        self.per_minute = per_minute
+        self._windows: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if (
+            self.per_minute <= 0
+            or record.levelno >= logging.CRITICAL
+            or not getattr(record, "rate_limited", False)
+        ):
+            return True
+        key = (record.pathname, record.lineno, record.levelno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= 60:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0, None]
+                if suppressed:
+                    record.msg = f"{record.msg} (пропущено схожих повідомлень: {suppressed})"
+                return True
+            if window[1] < self.per_minute:
+                window[1] += 1
+                return True
+            window[2] += 1
+            window[3] = (record.name, record.msg)
+            return False
+
+    def flush(self, handler: logging.Handler):
+        """Записує кількість пропущених повідомлень, ще не дописану до наступного вікна."""
+        with self._lock:
+            pending = [(key, window) for key, window in self._windows.items() if window[2]]
+            self._windows.clear()
+        for (pathname, lineno, levelno), (_, _, suppressed, (name, msg)) in pending:
+            handler.handle(logging.LogRecord(
+                name, levelno, pathname, lineno,
+                f"Пропущено схожих повідомлень: {suppressed}, останнє: {msg}", None, None,
+            ))
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """При переповненій обмеженій черзі запис відкидається, а не блокує потік."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Як QueueHandler.prepare, але трасування не вклеюється в повідомлення,
+        а лишається в exc_text: обробники слухача додають його самі,
+        JsonFormatter — окремим полем exc_info.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
 
-        exe_path = Path(sys.executable).parent
-        log_file_path = exe_path / log_file_name
 
-        file_handler = logging.FileHandler(log_file_path, encoding="utf-8")
-        file_handler.setLevel(logging.DEBUG)
-        file_formatter = logging.Formatter(
+def _build_pipeline(log_file_name: str) -> QueueHandler:
+    """
+    Спільна черга на файл логу: логери з різних модулів і потоків лише кладуть
+    записи в чергу, а консоль і файл пише один фоновий QueueListener.
+    """
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setLevel(logging.INFO)
+    console_handler.setFormatter(logging.Formatter(
+        "%(asctime)s [%(levelname)-s] - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    ))
+
+    exe_path = Path(sys.executable).parent
+    log_file_path = exe_path / log_file_name
+
+    file_handler = logging.FileHandler(log_file_path, encoding="utf-8")
+    file_handler.setLevel(logging.DEBUG)
+    if LOG_JSON:
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(
             "%(asctime)s [%(levelname)-s] - %(name)s - %(message)s",
             datefmt="%Y-%m-%d %H:%M:%S",
-        )
-        file_handler.setFormatter(file_formatter)
-        logger.addHandler(file_handler)
+        ))
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = _DroppingQueueHandler(log_queue)
+    rate_limit = RateLimitFilter(LOG_RATE_LIMIT_PER_MINUTE)
+    queue_handler.addFilter(rate_limit)
+
+    listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+
+    def shutdown():
+        # Спершу лічильники пропущених записів, потім дописати чергу у файл.
+        rate_limit.flush(queue_handler)
+        listener.stop()
+
+    atexit.register(shutdown)
+    return queue_handler
+
+
+def get_logger(name: str, log_file_name: str = "data.log") -> logging.Logger:
+    """
+    Логер, який пише у консоль і файл у тій же папці, де запущено .exe.
+    Запис — через спільний QueueHandler, тож потік, що логує, не чекає на диск.
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+
+    if not logger.handlers:
+        with _lock:
+            queue_handler = _queue_handlers.get(log_file_name)
+            if queue_handler is None:
+                queue_handler = _queue_handlers[log_file_name] = _build_pipeline(log_file_name)
+        logger.addHandler(queue_handler)
+        logger.propagate = False
 
     return logger
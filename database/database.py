@@ -2,22 +2,72 @@ import os
 from contextlib import contextmanager
 from urllib.parse import quote_plus
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from config.logger import get_logger
-from config.config import DB_NAME, DB_DRIVER, DB_PASSWORD, DB_SERVER, DB_USER
+from config.config import DATABASE_URL, DB_NAME, DB_DRIVER, DB_PASSWORD, DB_SERVER, DB_USER
 
 logger = get_logger(__name__)
 
-password_encoded = quote_plus(DB_PASSWORD)
-driver_encoded = quote_plus(DB_DRIVER)
-db_url = (
-    f"mssql+pyodbc://{DB_USER}:{password_encoded}@{DB_SERVER}/{DB_NAME}?"
-    f"driver={driver_encoded}&TrustServerCertificate=yes"
-)
-engine = create_engine(db_url, pool_pre_ping=True)
+
+def get_db_url() -> str:
+    """DATABASE_URL, якщо задано (напр. SQLite для бенчмарків), інакше MSSQL з DB_*."""
+    if DATABASE_URL:
+        return DATABASE_URL
+    password_encoded = quote_plus(DB_PASSWORD)
+    driver_encoded = quote_plus(DB_DRIVER)
+    return (
+        f"mssql+pyodbc://{DB_USER}:{password_encoded}@{DB_SERVER}/{DB_NAME}?"
+        f"driver={driver_encoded}&TrustServerCertificate=yes"
+    )
+
+
+def create_db_engine(url: str, read_only: bool = False, **kwargs) -> Engine:
+    """
+    Engine з налаштуваннями під діалект. Для SQLite (стенд без MSSQL):
+    схема "dbo" прибирається з імен таблиць, з'єднання дозволені з різних
+    потоків, а транзакції починаються явно, щоб працювали SAVEPOINT'и.
+    BEGIN IMMEDIATE бере блокування запису на початку транзакції: інакше
+    транзакція «прочитати, потім записати» (пачка документів, оренди, watermark)
+    отримує SQLITE_BUSY_SNAPSHOT, який busy timeout не повторює.
+    read_only=True (або execution option read_only) — звичайний BEGIN для
+    читання, що не блокує запис інших з'єднань.
+    """
+    if not url.startswith("sqlite"):
+        if url.startswith("mssql"):
+            kwargs.setdefault("fast_executemany", True)
+        return create_engine(url, pool_pre_ping=True, **kwargs)
+
+    kwargs.pop("pool_size", None)
+    kwargs.pop("max_overflow", None)
+    sqlite_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": 30},
+        execution_options={"schema_translate_map": {"dbo": None}, "read_only": read_only},
+        **kwargs,
+    )
+
+    @event.listens_for(sqlite_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+        dbapi_connection.execute("PRAGMA synchronous=NORMAL")
+
+    @event.listens_for(sqlite_engine, "begin")
+    def _on_begin(connection):
+        if connection.get_execution_options().get("read_only"):
+            connection.exec_driver_sql("BEGIN")
+        else:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return sqlite_engine
+
+
+db_url = get_db_url()
+engine = create_db_engine(db_url)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -30,11 +80,44 @@ def initialize_database():
     try:
         logger.info("Спроба створення таблиць бази даних...")
         Base.metadata.create_all(bind=engine)
+        _add_missing_columns()
         logger.info("Таблиці бази даних успішно створено (або вони вже існували).")
     except Exception as e:
         logger.error(f"Не вдалося створити таблиці: {e}", exc_info=True)
 
 
+def _add_missing_columns():
+    """
+    create_all не змінює вже існуючі таблиці, тож нові nullable-колонки
+    моделей (та їхні індекси) додаються до них через ALTER TABLE.
+    """
+    inspector = inspect(engine)
+    schema_map = engine.get_execution_options().get("schema_translate_map") or {}
+    preparer = engine.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        schema = schema_map.get(table.schema, table.schema)
+        if not inspector.has_table(table.name, schema=schema):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name, schema=schema)}
+        missing = [c for c in table.columns if c.name not in existing]
+        if not missing:
+            continue
+        table_name = preparer.quote(table.name)
+        if schema:
+            table_name = f"{preparer.quote_schema(schema)}.{table_name}"
+        with engine.begin() as connection:
+            for column in missing:
+                column_type = column.type.compile(dialect=engine.dialect)
+                logger.info(f"Додаємо колонку {table.fullname}.{column.name} ({column_type})")
+                connection.execute(text(
+                    f"ALTER TABLE {table_name} "
+                    f"ADD {preparer.format_column(column)} {column_type} NULL"
+                ))
+            for index in table.indexes:
+                if any(column in missing for column in index.columns):
+                    index.create(bind=connection)
+
+
 @contextmanager
 def get_db_session():
     """
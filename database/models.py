@@ -1,9 +1,15 @@
 import uuid
-from sqlalchemy import BigInteger, Column, DateTime, Integer, String, func
-from sqlalchemy.dialects.mssql import UNIQUEIDENTIFIER
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, UniqueConstraint, Uuid, func
 
 from .database import Base
-from config.config import TABLE_NAME
+from config.config import (
+    COLLECTOR_NODES_TABLE_NAME,
+    DOCUMENT_LINKS_TABLE_NAME,
+    DOWNLOAD_LEASES_TABLE_NAME,
+    SYNC_WATERMARK_TABLE_NAME,
+    TABLE_NAME,
+)
+from utils.link_index import link_hash
 # from config.config import DATA_DOCS_TABLE_NAME, PARTY_DOCS_TABLE_NAME
 
 
@@ -13,11 +19,86 @@ class Documents(Base):
     __table_args__ = {"schema": "dbo"}
 
     id = Column(
-        UNIQUEIDENTIFIER(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True
+        Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True
     )
 
     original_url = Column(String(2048), nullable=True, index=True)
+    url_hash = Column(
+        BigInteger,
+        nullable=True,
+        index=True,
+        default=lambda context: link_hash(context.get_current_parameters().get("original_url")),
+    )
     local_path = Column(String(2048), nullable=True)
     size = Column(BigInteger, nullable=True)
     file_hash = Column(String(64), nullable=True, index=True, unique=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Стиснення на диску (utils/compression.py): size і file_hash — вихідного вмісту.
+    codec = Column(String(16), nullable=True)
+    stored_size = Column(BigInteger, nullable=True)
+
+
+class DocumentLinks(Base):
+    """
+    Посилання -> вміст. Documents зберігає один файл на file_hash,
+    а тут записується кожне original_url, навіть якщо його вміст уже існує.
+    """
+    __tablename__ = DOCUMENT_LINKS_TABLE_NAME
+    __table_args__ = {"schema": "dbo"}
+
+    id = Column(
+        Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    original_url = Column(String(2048), nullable=False)
+    url_hash = Column(
+        BigInteger,
+        nullable=True,
+        index=True,
+        default=lambda context: link_hash(context.get_current_parameters().get("original_url")),
+    )
+    file_hash = Column(String(64), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class SyncWatermark(Base):
+    """
+    Останній успішно оброблений updatedAt (з id як tie-breaker)
+    для пари (company, doc_type) — межа для інкрементальної синхронізації.
+    """
+    __tablename__ = SYNC_WATERMARK_TABLE_NAME
+    __table_args__ = (
+        UniqueConstraint("company", "doc_type"),
+        {"schema": "dbo"},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    company = Column(String(255), nullable=False)
+    doc_type = Column(String(32), nullable=False)
+    last_updated_at = Column(DateTime(timezone=True), nullable=False)
+    last_id = Column(String(255), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class DownloadLease(Base):
+    """
+    Оренда посилання вузлом-збирачем: рядок існує, поки вузол завантажує файл.
+    Первинний ключ url_hash робить захоплення атомарним — вставка вдається
+    лише одному вузлу; прострочена оренда (вузол зник) може бути перехоплена.
+    """
+    __tablename__ = DOWNLOAD_LEASES_TABLE_NAME
+    __table_args__ = {"schema": "dbo"}
+
+    url_hash = Column(BigInteger, primary_key=True, autoincrement=False)
+    original_url = Column(String(2048), nullable=False)
+    owner = Column(String(255), nullable=False, index=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class CollectorNode(Base):
+    """Живі вузли-збирачі: heartbeat_at оновлюється періодично, застарілі вважаються мертвими."""
+    __tablename__ = COLLECTOR_NODES_TABLE_NAME
+    __table_args__ = {"schema": "dbo"}
+
+    node_id = Column(String(255), primary_key=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=False)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
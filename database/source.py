@@ -0,0 +1,134 @@
+import pickle
+import threading
+from pathlib import Path
+from typing import Dict
+from urllib.parse import quote_plus
+
+from sqlalchemy import MetaData, Table
+from sqlalchemy.engine import Engine
+
+from config.config import (
+    DB_DRIVER,
+    GOV_REG_DB_NAME,
+    GOV_REG_DB_PASSWORD,
+    GOV_REG_DB_SERVER,
+    GOV_REG_DB_USER,
+    GOV_REG_MAX_OVERFLOW,
+    GOV_REG_POOL_RECYCLE,
+    GOV_REG_POOL_SIZE,
+    SOURCE_DATABASE_URL,
+    SOURCE_SCHEMA_CACHE_DIR,
+)
+from config.logger import get_logger
+from database.database import create_db_engine
+
+logger = get_logger(__name__)
+
+_engines: Dict[str, Engine] = {}
+_tables: Dict[str, Table] = {}
+_metadata = MetaData()
+_lock = threading.Lock()
+
+
+def get_source_db_url() -> str:
+    if SOURCE_DATABASE_URL:
+        return SOURCE_DATABASE_URL
+    password_encoded = quote_plus(GOV_REG_DB_PASSWORD)
+    driver_encoded = quote_plus(DB_DRIVER)
+    return (
+        f"mssql+pyodbc://{GOV_REG_DB_USER}:{password_encoded}@{GOV_REG_DB_SERVER}/{GOV_REG_DB_NAME}?"
+        f"driver={driver_encoded}&TrustServerCertificate=yes"
+    )
+
+
+def get_source_engine(db_url: str = None) -> Engine:
+    """
+    Повертає спільний engine для бази-джерела (GOV_REG), створюючи його один раз
+    на процес з налаштованим пулом з'єднань і pre-ping.
+    """
+    db_url = db_url or get_source_db_url()
+    with _lock:
+        engine = _engines.get(db_url)
+        if engine is None:
+            engine = create_db_engine(
+                db_url,
+                read_only=True,
+                pool_size=GOV_REG_POOL_SIZE,
+                max_overflow=GOV_REG_MAX_OVERFLOW,
+                pool_recycle=GOV_REG_POOL_RECYCLE,
+            )
+            _engines[db_url] = engine
+        return engine
+
+
+def _schema_cache_path(table_name: str) -> Path:
+    return Path(SOURCE_SCHEMA_CACHE_DIR) / f"{table_name}.schema.pickle"
+
+
+def _load_cached_table(table_name: str):
+    if not SOURCE_SCHEMA_CACHE_DIR:
+        return None
+    path = _schema_cache_path(table_name)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "rb") as f:
+            table = pickle.load(f)
+        logger.info(f"Схему таблиці {table_name} завантажено з кешу {path}")
+        return table
+    except Exception as e:
+        logger.warning(f"Не вдалося прочитати кеш схеми {path}: {e}")
+        return None
+
+
+def _store_cached_table(table_name: str, table: Table):
+    if not SOURCE_SCHEMA_CACHE_DIR:
+        return
+    path = _schema_cache_path(table_name)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(table, f)
+        tmp_path.replace(path)
+    except Exception as e:
+        logger.warning(f"Не вдалося зберегти кеш схеми {path}: {e}")
+
+
+def get_source_table(table_name: str, engine: Engine = None) -> Table:
+    """
+    Повертає відображену (reflected) таблицю-джерело. Результат кешується
+    в пам'яті за назвою таблиці і, якщо задано SOURCE_SCHEMA_CACHE_DIR, на диску,
+    тож повторні сканування не виконують запитів до каталогу.
+    """
+    # До _lock: get_source_engine бере той самий (нереентрантний) замок.
+    engine = engine or get_source_engine()
+    with _lock:
+        table = _tables.get(table_name)
+        if table is not None:
+            return table
+
+        table = _load_cached_table(table_name)
+        if table is None:
+            table = Table(table_name, _metadata, autoload_with=engine)
+            _store_cached_table(table_name, table)
+        _tables[table_name] = table
+        return table
+
+
+def invalidate_source_table(table_name: str):
+    """Скидає кеш схеми таблиці (в пам'яті та на диску), напр. після зміни схеми."""
+    with _lock:
+        table = _tables.pop(table_name, None)
+        if table is not None and table.metadata is _metadata:
+            _metadata.remove(table)
+        if SOURCE_SCHEMA_CACHE_DIR:
+            _schema_cache_path(table_name).unlink(missing_ok=True)
+
+
+def dispose_source_engines():
+    """Закриває пули з'єднань усіх engine бази-джерела."""
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
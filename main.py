@@ -1,64 +1,145 @@
-from datetime import datetime, timedelta, timezone
+import argparse
+import asyncio
+import multiprocessing
+from contextlib import ExitStack
 
-from config.config import BASE_LINK_AND_API_VERSION, TOKENS_FOLDERS_COMPANIES
+from config.config import (
+    BASE_LINK_AND_API_VERSION,
+    METRICS_EXPORT_INTERVAL,
+    METRICS_PORT,
+    METRICS_TEXTFILE,
+    TOKENS_FOLDERS_COMPANIES,
+)
 from config.logger import get_logger
 from database.database import get_db_session, initialize_database
+from database.source import dispose_source_engines
 from repo.documents import DocumentRepository
+from services.audit import audit_storage
 from services.documents import DocumentService
+from services.daemon import run_daemon
+from services.layout_migration import migrate_flat_folder
+from services.manifest import shutdown_pool
+from services.orchestrator import collection_window, run_pipelines
+from utils import metrics
 
 logger = get_logger(__name__)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Збір документів суду.")
+    parser.add_argument(
+        "--full-rescan",
+        action="store_true",
+        help="Ігнорувати збережений watermark і сканувати весь період.",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Працювати постійно: цикли збору за розкладом і при появі нових рядків.",
+    )
+    parser.add_argument(
+        "--migrate-layout",
+        action="store_true",
+        help="Перенести файли з плоских папок компаній у шардовану структуру і завершити роботу.",
+    )
+    parser.add_argument(
+        "--audit",
+        action="store_true",
+        help="Звірити Documents з файлами на диску (відсутні, пошкоджені, сироти) і завершити роботу.",
+    )
+    parser.add_argument(
+        "--audit-requeue",
+        action="store_true",
+        help=(
+            "Разом з --audit: поставити відсутні й пошкоджені файли в чергу повторного завантаження "
+            "їхньої компанії; файли, компанію яких не визначити, лише потрапляють у unattributed.tsv."
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Після завершення вивести розподіл часу по стадіях.",
+    )
+    return parser.parse_args()
+
+
+def start_metrics_exporters(stack: ExitStack):
+    """HTTP /metrics та/або періодичний textfile — якщо задані в конфігурації."""
+    if METRICS_PORT:
+        server = metrics.start_http_server(METRICS_PORT)
+        stack.callback(server.shutdown)
+        logger.info(f"Метрики доступні на http://0.0.0.0:{METRICS_PORT}/metrics")
+    if METRICS_TEXTFILE:
+        stop = metrics.start_textfile_exporter(METRICS_TEXTFILE, METRICS_EXPORT_INTERVAL)
+        stack.callback(stop.set)
+
+
 def main():
     """Головна функція для запуску процесу збору даних."""
+    args = parse_args()
     initialize_database()
-    with get_db_session() as db_session:
+    if args.migrate_layout:
+        for folder, _ in TOKENS_FOLDERS_COMPANIES.values():
+            migrate_flat_folder(folder)
+        return
+    if args.audit:
+        audit_storage(
+            [folder for folder, _ in TOKENS_FOLDERS_COMPANIES.values()],
+            base_link=BASE_LINK_AND_API_VERSION,
+            requeue=args.audit_requeue,
+        )
+        return
+    with ExitStack() as stack:
         try:
+            start_metrics_exporters(stack)
+            services = []
             for token, (folder, company) in TOKENS_FOLDERS_COMPANIES.items():
+                # Окрема сесія на компанію: проходи різних компаній йдуть паралельно.
+                db_session = stack.enter_context(get_db_session())
                 doc_repo = DocumentRepository(
                     session=db_session, folder=folder, company=company
                 )
-                data_doc_service = DocumentService(
-                    document_repo=doc_repo,
-                    doc_type="data",
-                    token=token,
-                    company=company,
-                )
-                party_doc_service = DocumentService(
-                    document_repo=doc_repo,
-                    doc_type="party",
-                    token=token,
-                    company=company,
-                )
-                now = datetime.now(timezone.utc)
-                start_date = (
-                    now - timedelta(weeks=5000, hours=24, seconds=10)
-                ).isoformat()
-                end_date = (now + timedelta(seconds=10)).isoformat()
+                for doc_type in ("data", "party"):
+                    service = DocumentService(
+                        document_repo=doc_repo,
+                        doc_type=doc_type,
+                        token=token,
+                        company=company,
+                    )
+                    stack.callback(service.close)
+                    services.append(service)
 
-                # start_date = "2025-10-16T20:01:37.000Z"
-                # end_date = "2025-10-16T20:09:37.000Z"
-                logger.info(
-                    f"Період збору документів data_doc: {start_date} по {end_date}"
-                )
+            if args.daemon:
+                asyncio.run(run_daemon(services, BASE_LINK_AND_API_VERSION))
+                return
 
-                data_doc_service.gather_documents(
-                    BASE_LINK_AND_API_VERSION,
-                    start_date=start_date,
-                    end_date=end_date,
-                )
+            start_date, end_date = collection_window()
 
-                logger.info(
-                    f"Період збору документів party_doc: {start_date} по {end_date}"
-                )
-                party_doc_service.gather_documents(
+            # start_date = "2025-10-16T20:01:37.000Z"
+            # end_date = "2025-10-16T20:09:37.000Z"
+            logger.info(f"Період збору документів: {start_date} по {end_date}")
+
+            asyncio.run(
+                run_pipelines(
+                    services,
                     BASE_LINK_AND_API_VERSION,
                     start_date=start_date,
                     end_date=end_date,
+                    full_rescan=args.full_rescan,
                 )
+            )
         except Exception as e:
             logger.critical(f"Критична помилка в main: {e}", exc_info=True)
+        finally:
+            dispose_source_engines()
+            shutdown_pool()
+            if METRICS_TEXTFILE:
+                metrics.REGISTRY.write_textfile(METRICS_TEXTFILE)
+            if args.profile:
+                logger.info("Розподіл часу по стадіях:\n" + metrics.profile_report())
 
 
 if __name__ == "__main__":
+    # Пул процесів ManifestBuilder у зібраному .exe.
+    multiprocessing.freeze_support()
     main()
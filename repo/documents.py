@@ -1,28 +1,244 @@
 import asyncio
 import json
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, List, Optional
-from urllib.parse import quote_plus
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
 
 import aiofiles
 from sqlalchemy.orm import Session
-from sqlalchemy import create_engine, MetaData, Table, select
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import bindparam, delete, func, insert, select, text, union, update
+from sqlalchemy.exc import DBAPIError, IntegrityError, TimeoutError as PoolTimeoutError
 
-from config.logger import get_logger
+from config.logger import RATE_LIMITED, get_logger
 # from database.models import Document_data, Document_party_docs
-from database.models import Documents
+from database.models import DocumentLinks, Documents, SyncWatermark
 from config.config import (
-    GOV_REG_DB_NAME,
-    GOV_REG_DB_PASSWORD,
-    GOV_REG_DB_SERVER,
-    GOV_REG_DB_USER,
-    DB_DRIVER,
+    GOV_REG_MAX_OVERFLOW,
+    GOV_REG_POOL_SIZE,
+    LINK_INDEX_COMPACT_THRESHOLD,
+    LINK_INDEX_FETCH_SIZE,
+    LINK_INDEX_REFRESH_OVERLAP_SECONDS,
+    SOURCE_FETCH_SIZE,
+    SOURCE_SCAN_SHARDS,
+    SOURCE_SHARD_PREFETCH,
+    SOURCE_SHARD_RETRIES,
+    STORAGE_COMPRESSION,
+    STORAGE_COMPRESSION_BY_COMPANY,
+    STORAGE_SHARD_LEVELS,
+    STORAGE_SHARD_WIDTH,
+    WRITE_BATCH_INTERVAL_MS,
+    WRITE_BATCH_SIZE,
 )
+from utils.compression import ZSTD, available_codec, open_stored, stored_file_name
 from utils.file_hashing import calculate_file_hash_from_bytes
+from utils.file_layout import sharded_relative_path
+from utils.link_index import LinkIndex, link_hash
+from utils.metrics import QUEUE_DEPTH, timed
 from database.database import SessionLocal
+from database.source import get_source_engine, get_source_table, invalidate_source_table
 logger = get_logger(__name__)
 
+_SHARD_DONE = object()
+
+
+def _split_time_range(first: datetime, last: datetime, shards: int) -> List[Tuple[datetime, datetime]]:
+    """
+    Ділить [first, last] на не більше shards суміжних проміжків [a, b).
+    Останній проміжок закінчується на last (включно — див. _iter_sharded).
+    """
+    if (first.tzinfo is None) != (last.tzinfo is None):
+        first = first.replace(tzinfo=first.tzinfo or timezone.utc)
+        last = last.replace(tzinfo=last.tzinfo or timezone.utc)
+    step = (last - first) / shards
+    if not step:
+        return [(first, last)]
+    cuts = [first + step * i for i in range(shards)] + [last]
+    return list(zip(cuts, cuts[1:]))
+
+
+class DocumentWriteBatcher:
+    """
+    Write-behind для рядків Documents: збирає завершені завантаження і вставляє
+    їх пачками по batch_size рядків або кожні interval_ms мілісекунд.
+    Файл вважається збереженим лише після коміту його пачки — тоді .part
+    атомарно перейменовується у кінцевий файл.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = WRITE_BATCH_SIZE,
+        interval_ms: int = WRITE_BATCH_INTERVAL_MS,
+    ):
+        self.batch_size = batch_size
+        self.interval = interval_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "DocumentWriteBatcher":
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._queue.put(None)
+        await self._task
+
+    def enqueue(self, values: Dict, part_path: Path, final_path: Path) -> asyncio.Future:
+        """
+        Ставить рядок у чергу на вставку без очікування. Future отримає True
+        після коміту пачки, якщо файл збережено або такий вміст уже існує.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((values, part_path, final_path, future))
+        return future
+
+    async def submit(self, values: Dict, part_path: Path, final_path: Path) -> bool:
+        """Ставить рядок у чергу на вставку і чекає коміту його пачки."""
+        return await self.enqueue(values, part_path, final_path)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            QUEUE_DEPTH.set(self._queue.qsize(), queue="write_batch")
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple]):
+        try:
+            results = await asyncio.to_thread(
+                self._write_batch_sync, [(values, part, final) for values, part, final, _ in batch]
+            )
+        except Exception as e:
+            logger.error(f"Критична помилка запису пачки з {len(batch)} документів: {e}", exc_info=True)
+            results = [False] * len(batch)
+        for (_, _, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    @staticmethod
+    def _write_batch_sync(items: List[Tuple[Dict, Path, Path]]) -> List[bool]:
+        """
+        Контентно-адресований запис пачки:
+        - вміст, чий file_hash уже є в Documents (або раніше в цій пачці),
+          повторно на диск не пишеться — .part видаляється;
+        - новий вміст вставляється одним executemany; при конфлікті по file_hash
+          (паралельний запис) — поодинці в savepoint'ах;
+        - кожне посилання записується в DocumentLinks, навіть для дублікатів.
+        Після коміту перейменовує .part файли нового вмісту.
+        """
+        table = Documents.__table__
+        rows = [dict(values, id=values.get("id") or uuid.uuid4()) for values, _, _ in items]
+        outcomes = ["inserted"] * len(items)
+
+        session = SessionLocal()
+        try:
+            hashes = {row["file_hash"] for row in rows}
+            known = set(
+                session.execute(
+                    select(table.c.file_hash).where(table.c.file_hash.in_(hashes))
+                ).scalars()
+            )
+            for i, row in enumerate(rows):
+                if row["file_hash"] in known:
+                    outcomes[i] = "duplicate"
+                else:
+                    known.add(row["file_hash"])
+            new_rows = [row for row, outcome in zip(rows, outcomes) if outcome == "inserted"]
+
+            try:
+                if new_rows:
+                    with session.begin_nested():
+                        session.execute(insert(table), new_rows)
+            except IntegrityError:
+                for i, row in enumerate(rows):
+                    if outcomes[i] != "inserted":
+                        continue
+                    try:
+                        with session.begin_nested():
+                            session.execute(insert(table), row)
+                    except IntegrityError:
+                        outcomes[i] = "duplicate"
+
+            session.execute(
+                insert(DocumentLinks.__table__),
+                [
+                    {"id": uuid.uuid4(), "original_url": row["original_url"], "file_hash": row["file_hash"]}
+                    for row in rows
+                ],
+            )
+            with timed("db_commit"):
+                session.commit()
+        except Exception as e:
+            logger.error(f"Неочікувана помилка БД при записі пачки: {e}", exc_info=True)
+            session.rollback()
+            session.close()
+            for _, part_path, _ in items:
+                part_path.unlink(missing_ok=True)
+            return [False] * len(items)
+
+        results = []
+        orphan_ids = []
+        for (_, part_path, final_path), row, outcome in zip(items, rows, outcomes):
+            if outcome == "duplicate":
+                part_path.unlink(missing_ok=True)
+                results.append(True)
+                continue
+            try:
+                os.replace(part_path, final_path)
+                results.append(True)
+            except OSError as e:
+                logger.error(f"! Помилка перейменування {part_path} -> {final_path}: {e}.", extra=RATE_LIMITED)
+                part_path.unlink(missing_ok=True)
+                orphan_ids.append(row["id"])
+                results.append(False)
+
+        if orphan_ids:
+            # Вміст відкочених рядків не збережено: незбереженими стають і дублікати
+            # цієї ж пачки з тим самим file_hash. Посилання видаляються лише їхні —
+            # інші посилання на цей вміст (інших пачок чи процесів) не зачіпаються.
+            orphan_hashes = {row["file_hash"] for row in rows if row["id"] in orphan_ids}
+            lost_links = set()
+            for i, row in enumerate(rows):
+                if row["file_hash"] in orphan_hashes:
+                    results[i] = False
+                    lost_links.add(row["original_url"])
+            links = DocumentLinks.__table__
+            try:
+                session.execute(delete(table).where(table.c.id.in_(orphan_ids)))
+                session.execute(
+                    delete(links).where(
+                        links.c.url_hash.in_({link_hash(link) for link in lost_links}),
+                        links.c.original_url.in_(lost_links),
+                    )
+                )
+                session.commit()
+            except Exception:
+                session.rollback()
+        session.close()
+        return results
+
 
 class DocumentRepository:
     def __init__(self, session: Session, folder, company: str):
@@ -30,6 +246,52 @@ class DocumentRepository:
         self.folder = Path(folder)
         self.company = company
         self.SessionLocal = SessionLocal
+        self._folder_ready = False
+        self._shard_dirs = set()
+        self._links_index: Optional[LinkIndex] = None
+        self._links_loaded_until: Optional[datetime] = None
+        self.storage_codec = self._resolve_codec(company)
+        # Проходи data і party однієї компанії можуть працювати одночасно
+        # і користуються спільною сесією репозиторію.
+        self._session_lock = threading.RLock()
+
+    @staticmethod
+    def _resolve_codec(company: str) -> Optional[str]:
+        """Кодек стиснення компанії: STORAGE_COMPRESSION_BY_COMPANY або STORAGE_COMPRESSION."""
+        requested = STORAGE_COMPRESSION_BY_COMPANY.get(company, STORAGE_COMPRESSION)
+        codec = available_codec(requested)
+        if (requested or "").lower() == ZSTD and codec != ZSTD:
+            logger.warning(f"Пакет zstandard не встановлено — файли {company} стискаються gzip.")
+        return codec
+
+    def open_document(self, document: Documents) -> BinaryIO:
+        """Відкриває збережений файл документа для читання, прозоро розпаковуючи стиснений."""
+        return open_stored(self.folder / document.local_path, document.codec)
+
+    def part_path(self, file_name: str, original_url: str) -> Path:
+        """
+        Шлях до тимчасового файлу (.part) у цільовій папці, куди пишеться
+        завантаження до коміту рядка в БД. Ім'я містить дайджест посилання:
+        різні посилання з однаковим file_name (напр. повторений або відсутній
+        attachNum у party) не пишуть в один .part одночасно.
+        """
+        if not self._folder_ready:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            self._folder_ready = True
+        return self.folder / f"{file_name}.{link_hash(original_url) & 0xFFFFFFFFFFFFFFFF:016x}.part"
+
+    @staticmethod
+    def relative_path(file_name: str) -> str:
+        """Шлях файлу відносно папки компанії (значення local_path)."""
+        return sharded_relative_path(file_name, STORAGE_SHARD_LEVELS, STORAGE_SHARD_WIDTH)
+
+    def final_path(self, file_name: str) -> Path:
+        """Кінцевий шлях файлу в шардованій папці; створює підпапку шарда."""
+        path = self.folder / self.relative_path(file_name)
+        if path.parent not in self._shard_dirs:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._shard_dirs.add(path.parent)
+        return path
 
     def save_document(
         self,
@@ -43,7 +305,7 @@ class DocumentRepository:
         """
         new_doc = Documents(
             original_url=original_url,
-            local_path=file_name,
+            local_path=self.relative_path(file_name),
             size=size_in_bytes,
             file_hash=calculate_file_hash_from_bytes(file_content)
         )
@@ -51,21 +313,34 @@ class DocumentRepository:
         try:
             self.session.flush()
             try:
-                self.folder.mkdir(parents=True, exist_ok=True)
-                with open(self.folder / file_name, "wb") as f:
+                with open(self.final_path(file_name), "wb") as f:
                     f.write(file_content)
             except IOError as e:
-                logger.error(f"! Помилка збереження файлу на диск: {e}.")
+                logger.error(f"! Помилка збереження файлу на диск: {e}.", extra=RATE_LIMITED)
                 self.session.rollback()
                 raise 
         except IntegrityError:
+            # Такий вміст уже збережено — фіксуємо лише посилання.
             self.session.rollback()
+        self.session.add(DocumentLinks(original_url=original_url, file_hash=new_doc.file_hash))
+        self.session.flush()
+
+    @staticmethod
+    def _record_link(session: Session, original_url: str, file_hash: str) -> bool:
+        """Записує посилання на вже збережений вміст (link -> file_hash)."""
+        try:
+            session.add(DocumentLinks(original_url=original_url, file_hash=file_hash))
+            session.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Помилка запису посилання {original_url}: {e}", exc_info=True, extra=RATE_LIMITED)
+            session.rollback()
+            return False
 
     @staticmethod
     def _save_document_task_sync(
         new_doc: Documents,
-        folder: Path,
-        file_name: str,
+        file_path: Path,
         file_content: bytes
     ) -> bool:
         """
@@ -79,19 +354,19 @@ class DocumentRepository:
             session.flush()
 
             try:
-                folder.mkdir(parents=True, exist_ok=True)
-                with open(folder / file_name, "wb") as f:
+                with open(file_path, "wb") as f:
                     f.write(file_content)
             except IOError:
                 session.rollback()
                 return False
 
+            session.add(DocumentLinks(original_url=new_doc.original_url, file_hash=new_doc.file_hash))
             session.commit()
             return True
 
         except IntegrityError:
             session.rollback()
-            return True
+            return DocumentRepository._record_link(session, new_doc.original_url, new_doc.file_hash)
         except Exception as e:
             logger.error(f"Неочікувана помилка БД в _save_document_task_sync: {e}", exc_info=True)
             session.rollback()
@@ -112,7 +387,7 @@ class DocumentRepository:
         """
         new_doc = Documents(
             original_url=original_url,
-            local_path=file_name,
+            local_path=self.relative_path(file_name),
             size=size_in_bytes,
             file_hash=calculate_file_hash_from_bytes(file_content)
         )
@@ -121,18 +396,157 @@ class DocumentRepository:
             success = await asyncio.to_thread(
                 self._save_document_task_sync,
                 new_doc,
-                self.folder,
-                file_name,
+                self.final_path(file_name),
                 file_content
             )
             return success
         except Exception as e:
             logger.error(
                 f"Критична помилка в save_document_async (to_thread): {e}",
-                exc_info=True
+                exc_info=True,
+                extra=RATE_LIMITED,
             )
             return False
 
+    @staticmethod
+    def _commit_streamed_document_sync(
+        new_doc: Documents,
+        part_path: Path,
+        final_path: Path,
+    ) -> bool:
+        """
+        Комітить рядок документа, після чого атомарно перейменовує
+        тимчасовий файл у кінцевий. Якщо перейменування не вдалося,
+        рядок видаляється, щоб БД не посилалась на відсутній файл.
+        """
+        session = SessionLocal()
+        try:
+            session.add(new_doc)
+            session.add(DocumentLinks(original_url=new_doc.original_url, file_hash=new_doc.file_hash))
+            with timed("db_commit"):
+                session.commit()
+        except IntegrityError:
+            # Такий вміст уже збережено — файл не пишемо, фіксуємо лише посилання.
+            session.rollback()
+            part_path.unlink(missing_ok=True)
+            recorded = DocumentRepository._record_link(session, new_doc.original_url, new_doc.file_hash)
+            session.close()
+            return recorded
+        except Exception as e:
+            logger.error(
+                f"Неочікувана помилка БД в _commit_streamed_document_sync: {e}", exc_info=True, extra=RATE_LIMITED
+            )
+            session.rollback()
+            session.close()
+            part_path.unlink(missing_ok=True)
+            return False
+
+        try:
+            os.replace(part_path, final_path)
+            return True
+        except OSError as e:
+            logger.error(f"! Помилка перейменування {part_path} -> {final_path}: {e}.", extra=RATE_LIMITED)
+            try:
+                session.execute(
+                    delete(DocumentLinks).where(
+                        DocumentLinks.url_hash == link_hash(new_doc.original_url),
+                        DocumentLinks.original_url == new_doc.original_url,
+                    )
+                )
+                session.delete(new_doc)
+                session.commit()
+            except Exception:
+                session.rollback()
+            part_path.unlink(missing_ok=True)
+            return False
+        finally:
+            session.close()
+
+    async def save_streamed_document_async(
+        self,
+        original_url: str,
+        part_path: Path,
+        file_name: str,
+        size_in_bytes: int,
+        file_hash: str,
+        codec: Optional[str] = None,
+        stored_size: Optional[int] = None,
+    ) -> bool:
+        """
+        Зберігає документ, вже записаний потоково у тимчасовий файл.
+        Хеш і розмір обчислені під час завантаження, тож файл не читається повторно.
+        codec — чим стиснено файл на диску (тоді stored_size — його розмір).
+        """
+        stored_name = stored_file_name(file_name, codec)
+        new_doc = Documents(
+            original_url=original_url,
+            local_path=self.relative_path(stored_name),
+            size=size_in_bytes,
+            file_hash=file_hash,
+            codec=codec,
+            stored_size=stored_size if codec else None,
+        )
+        try:
+            return await asyncio.to_thread(
+                self._commit_streamed_document_sync,
+                new_doc,
+                part_path,
+                self.final_path(stored_name),
+            )
+        except Exception as e:
+            logger.error(
+                f"Критична помилка в save_streamed_document_async (to_thread): {e}",
+                exc_info=True,
+                extra=RATE_LIMITED,
+            )
+            return False
+
+    def create_write_batcher(self) -> DocumentWriteBatcher:
+        """Новий write-behind батчер для одного запуску завантажень."""
+        return DocumentWriteBatcher()
+
+    async def save_streamed_document_batched(
+        self,
+        batcher: DocumentWriteBatcher,
+        original_url: str,
+        part_path: Path,
+        file_name: str,
+        size_in_bytes: int,
+        file_hash: str,
+        codec: Optional[str] = None,
+        stored_size: Optional[int] = None,
+    ) -> bool:
+        """Як save_streamed_document_async, але через пакетну вставку."""
+        return await self.enqueue_streamed_document(
+            batcher, original_url, part_path, file_name, size_in_bytes, file_hash, codec, stored_size
+        )
+
+    def enqueue_streamed_document(
+        self,
+        batcher: DocumentWriteBatcher,
+        original_url: str,
+        part_path: Path,
+        file_name: str,
+        size_in_bytes: int,
+        file_hash: str,
+        codec: Optional[str] = None,
+        stored_size: Optional[int] = None,
+    ) -> asyncio.Future:
+        """
+        Ставить документ у пачку батчера і одразу повертає Future результату
+        коміту — завантажувач не чекає на БД.
+        """
+        stored_name = stored_file_name(file_name, codec)
+        values = {
+            "original_url": original_url,
+            "local_path": self.relative_path(stored_name),
+            "size": size_in_bytes,
+            "file_hash": file_hash,
+            "codec": codec,
+            "stored_size": stored_size if codec else None,
+        }
+        return batcher.enqueue(values, part_path, self.final_path(stored_name))
+
     def find_by_file_link(self, original_url: str, doc_type: str):
         """
         Знаходить документ за полем file_link.
@@ -153,43 +567,435 @@ class DocumentRepository:
             logger.error(
                 f"Помилка пошуку документа за посиланням '{original_url}': {e}",
                 exc_info=True,
+                extra=RATE_LIMITED,
             )
             return None
 
+    def source_table_name(self, doc_type: str) -> str:
+        if doc_type == "data":
+            return "document" + self.company
+        return "partyDocs" + self.company
+
+    @staticmethod
+    def source_id_column(doc_type: str) -> str:
+        """Назва колонки ідентифікатора в таблиці-джерелі для типу документів."""
+        return "DocumentId" if doc_type == "data" else "id"
+
     def _fetch_data_from_db_by_date_range(
-        self, start_date: str, end_date: str, doc_type
+        self, start_date: str, end_date: str, doc_type, since: Optional[datetime] = None
     ) -> Optional[List[Dict]]:
+        """
+        Вибирає рядки таблиці-джерела за updatedAt у проміжку.
+        Якщо задано since, нижньою межею слугує він (включно) замість start_date.
+        Рядки впорядковані за (updatedAt, id).
+        """
+        try:
+            results_list = []
+            for batch in self.iter_data_from_db_by_date_range(
+                start_date, end_date, doc_type, since=since
+            ):
+                results_list.extend(batch)
+            logger.info(f"Для цього проміжку знайдено {len(results_list)} записів")
+            return results_list if results_list else None
+
+        except Exception as e:
+            logger.debug(f"Сталася помилка вибірки з джерела: {e}", exc_info=True)
+
+    def iter_data_from_db_by_date_range(
+        self,
+        start_date: str,
+        end_date: str,
+        doc_type,
+        since: Optional[datetime] = None,
+        fetch_size: int = SOURCE_FETCH_SIZE,
+        shards: int = SOURCE_SCAN_SHARDS,
+    ) -> Iterator[List[Dict]]:
+        """
+        Потоково читає рядки таблиці-джерела серверним курсором
+        (stream_results/yield_per) і віддає їх пачками по fetch_size,
+        впорядковані за (updatedAt, id). Пам'ять не залежить від розміру проміжку.
+        При shards > 1 проміжок ділиться на часові шарди, які читаються
+        паралельно (див. _iter_sharded). Помилки не перехоплюються.
+        """
+        return self._iter_source(start_date, end_date, doc_type, since, fetch_size, shards, projected=False)
+
+    def iter_links_from_db_by_date_range(
+        self,
+        start_date: str,
+        end_date: str,
+        doc_type,
+        since: Optional[datetime] = None,
+        fetch_size: int = SOURCE_FETCH_SIZE,
+        shards: int = SOURCE_SCAN_SHARDS,
+    ) -> Iterator[List[Dict]]:
+        """
+        Як iter_data_from_db_by_date_range, але посилання витягуються на боці
+        сервера (JSON_VALUE/OPENJSON на MSSQL, json_extract/json_each на SQLite):
+        по рядку на вкладення з ключами doc_id, updatedAt, link, attachNum,
+        attachment_ord. Документ без вкладень дає один рядок з attachment_ord=None.
+        Доступно лише для діалектів із supports_link_projection().
+        """
+        return self._iter_source(start_date, end_date, doc_type, since, fetch_size, shards, projected=True)
+
+    def source_max_updated_at(self, doc_type: str):
+        """Найбільший updatedAt у таблиці-джерелі — дешева перевірка появи нових рядків."""
+        engine = get_source_engine()
+        table = get_source_table(self.source_table_name(doc_type), engine)
+        with engine.connect() as connection:
+            return connection.execute(select(func.max(table.c["updatedAt"]))).scalar()
+
+    @staticmethod
+    def supports_link_projection() -> bool:
+        return get_source_engine().dialect.name in ("mssql", "sqlite")
+
+    def _iter_source(
+        self,
+        start_date,
+        end_date,
+        doc_type,
+        since: Optional[datetime],
+        fetch_size: int,
+        shards: int,
+        projected: bool,
+    ) -> Iterator[List[Dict]]:
+        table_name = self.source_table_name(doc_type)
+        engine = get_source_engine()
+        table = get_source_table(table_name, engine)
+        lower = since if since is not None else start_date
+
+        rows_count = 0
         try:
-            metadata = MetaData()
-            password_encoded = quote_plus(GOV_REG_DB_PASSWORD)
-            driver_encoded = quote_plus(DB_DRIVER)
-            db_url = (
-                f"mssql+pyodbc://{GOV_REG_DB_USER}:{password_encoded}@{GOV_REG_DB_SERVER}/{GOV_REG_DB_NAME}?"
-                f"driver={driver_encoded}&TrustServerCertificate=yes"
+            if shards > 1:
+                batches = self._iter_sharded(
+                    engine, table, doc_type, lower, end_date, fetch_size, shards, projected
+                )
+            else:
+                batches = self._iter_source_range(
+                    engine, table, doc_type, lower, end_date, fetch_size, projected=projected
+                )
+            for batch in batches:
+                rows_count += len(batch)
+                yield batch
+        except DBAPIError:
+            # Схема могла змінитися — наступне сканування відобразить таблицю наново.
+            invalidate_source_table(table_name)
+            raise
+        logger.info(f"Для цього проміжку прочитано {rows_count} записів")
+
+    def _iter_source_range(
+        self,
+        engine,
+        table,
+        doc_type,
+        lower,
+        upper,
+        fetch_size: int,
+        upper_inclusive: bool = True,
+        after_key: Optional[Tuple] = None,
+        projected: bool = False,
+    ) -> Iterator[List[Dict]]:
+        """
+        Рядки з lower <= updatedAt <= upper (або < upper) на одному з'єднанні.
+        after_key (див. _row_key) продовжує читання після вже отриманого рядка.
+        """
+        query = self._source_query(engine, table, doc_type, lower, upper, upper_inclusive, after_key, projected)
+        with engine.connect() as connection:
+            result = connection.execution_options(
+                stream_results=True, yield_per=fetch_size
+            ).execute(query)
+            for partition in result.partitions():
+                yield [row._asdict() for row in partition]
+
+    def _iter_source_pages(
+        self,
+        engine,
+        table,
+        doc_type,
+        lower,
+        upper,
+        fetch_size: int,
+        upper_inclusive: bool = True,
+        after_key: Optional[Tuple] = None,
+        projected: bool = False,
+    ) -> Iterator[List[Dict]]:
+        """
+        Як _iter_source_range, але keyset-сторінками по fetch_size рядків:
+        з'єднання повертається в пул після кожної сторінки, а не тримається,
+        поки споживач не забере пачку.
+        """
+        id_name = self.source_id_column(doc_type)
+        while True:
+            query = self._source_query(
+                engine, table, doc_type, lower, upper, upper_inclusive, after_key, projected, limit=fetch_size
             )
-            if doc_type == "data":
-                table_name = "document" + self.company
+            with engine.connect() as connection:
+                batch = [row._asdict() for row in connection.execute(query)]
+            if batch:
+                yield batch
+            if len(batch) < fetch_size:
+                return
+            after_key = self._row_key(batch[-1], id_name, projected)
+
+    def _source_query(
+        self,
+        engine,
+        table,
+        doc_type,
+        lower,
+        upper,
+        upper_inclusive: bool,
+        after_key: Optional[Tuple],
+        projected: bool,
+        limit: Optional[int] = None,
+    ):
+        """Запит рядків проміжку в порядку (updatedAt, id); limit — не більше стількох рядків."""
+        if projected:
+            return self._links_query(engine, table, doc_type, lower, upper, upper_inclusive, after_key, limit)
+
+        date_column = table.c["updatedAt"]
+        id_column = table.c[self.source_id_column(doc_type)]
+
+        condition = date_column >= lower
+        condition &= (date_column <= upper) if upper_inclusive else (date_column < upper)
+        if after_key is not None:
+            last_date, last_id = after_key
+            condition &= (date_column > last_date) | ((date_column == last_date) & (id_column > last_id))
+        query = select(table).where(condition).order_by(date_column, id_column)
+        return query.limit(limit) if limit else query
+
+    def _links_query(
+        self, engine, table, doc_type, lower, upper, upper_inclusive: bool, after_key, limit: Optional[int] = None
+    ):
+        """
+        Текстовий запит з проєкцією лише потрібних колонок і розбором JSON
+        на сервері. Для party кожен елемент масиву attachments дає окремий рядок
+        (OUTER APPLY OPENJSON / LEFT JOIN json_each), порядок — (updatedAt, id, ключ елемента);
+        для data — (updatedAt, id), attachment_ord завжди 0.
+        """
+        quote = engine.dialect.identifier_preparer.quote_identifier
+        mssql = engine.dialect.name == "mssql"
+        json_value = "JSON_VALUE" if mssql else "json_extract"
+        id_name = self.source_id_column(doc_type)
+        doc_id = f"t.{quote(id_name)}"
+        updated_at = f"t.{quote('updatedAt')}"
+
+        if doc_type == "data":
+            # Одне вкладення на рядок: порядок і keyset — лише (updatedAt, id).
+            payload = f"t.{quote('originalText')}"
+            attachment_ord = None
+            from_clause = f"{quote(table.name)} AS t"
+        else:
+            payload = f"j.{quote('value')}"
+            attachments = f"t.{quote('attachments')}"
+            if mssql:
+                attachment_ord = f"CAST(j.{quote('key')} AS int)"
+                from_clause = f"{quote(table.name)} AS t OUTER APPLY OPENJSON({attachments}) AS j"
             else:
-                table_name = "partyDocs" + self.company
+                attachment_ord = f"j.{quote('key')}"
+                from_clause = f"{quote(table.name)} AS t LEFT JOIN json_each({attachments}) AS j"
 
-            engine = create_engine(db_url)
-            table = Table(table_name, metadata, autoload_with=engine)
+        conditions = [f"{updated_at} >= :lower", f"{updated_at} {'<=' if upper_inclusive else '<'} :upper"]
+        params = {"lower": lower, "upper": upper}
+        if after_key is not None:
+            after_id = f"{doc_id} > :after_id"
+            if attachment_ord is not None:
+                after_id = f"({after_id} OR ({doc_id} = :after_id AND {attachment_ord} > :after_ord))"
+                params["after_ord"] = after_key[2]
+            conditions.append(
+                f"({updated_at} > :after_date OR ({updated_at} = :after_date AND {after_id}))"
+            )
+            params.update(after_date=after_key[0], after_id=after_key[1])
 
-            date_column = table.c["updatedAt"]
+        order_by = [updated_at, doc_id] + ([attachment_ord] if attachment_ord is not None else [])
+        sql = (
+            f"SELECT {doc_id} AS doc_id, {updated_at} AS {quote('updatedAt')}, "
+            f"{json_value}({payload}, '$.link') AS link, "
+            f"{json_value}({payload}, '$.attachNum') AS {quote('attachNum')}, "
+            f"{attachment_ord or 'CAST(0 AS int)'} AS attachment_ord "
+            f"FROM {from_clause} WHERE {' AND '.join(conditions)} "
+            f"ORDER BY {', '.join(order_by)}"
+        )
+        if limit:
+            sql += f" OFFSET 0 ROWS FETCH NEXT {int(limit)} ROWS ONLY" if mssql else f" LIMIT {int(limit)}"
+        date_type = table.c["updatedAt"].type
+        types = {
+            "lower": date_type,
+            "upper": date_type,
+            "after_date": date_type,
+            "after_id": table.c[id_name].type,
+        }
+        binds = [bindparam(name, value, type_=types.get(name)) for name, value in params.items()]
+        return text(sql).bindparams(*binds).columns(updatedAt=date_type)
 
-            query = select(table).where(date_column.between(start_date, end_date))
+    @staticmethod
+    def _row_key(row: Dict, id_name: str, projected: bool) -> Tuple:
+        if projected:
+            return row["updatedAt"], row["doc_id"], row["attachment_ord"]
+        return row["updatedAt"], row[id_name]
 
-            results_list = []
-            with engine.connect() as connection:
-                result = connection.execute(query)
-                for row in result:
-                    results_list.append(row._asdict())
-            logger.info(f"Для цього проміжку знайдено {len(results_list)} записів")
-            return results_list if results_list else None
+    def _iter_sharded(
+        self,
+        engine,
+        table,
+        doc_type,
+        lower,
+        upper,
+        fetch_size: int,
+        shards: int,
+        projected: bool = False,
+    ) -> Iterator[List[Dict]]:
+        """
+        Ділить [lower, upper] на shards рівних часових проміжків між фактичними
+        min/max updatedAt і читає кожен в окремому потоці keyset-сторінками
+        (_iter_source_pages): шард, що чекає на заповнену чергу, не тримає
+        з'єднання, тож не відбирає пул у шарда, якого чекає споживач,
+        і в паралельних проходів на тому ж engine.
+        Шарди не перетинаються і йдуть за зростанням часу, тож віддаючи їх
+        по черзі, отримуємо той самий порядок (updatedAt, id), що й без шардів.
+        Кожен шард тримає не більше SOURCE_SHARD_PREFETCH пачок наперед.
+        Після помилки шард перечитується лише від останнього отриманого рядка
+        (до SOURCE_SHARD_RETRIES разів); інші шарди не зачіпаються.
+        Шардів не більше, ніж з'єднань у пулі джерела, а очікування з'єднання
+        довше за pool_timeout (пул зайняли паралельні проходи) повторюється
+        так само, як обрив.
+        """
+        capacity = GOV_REG_POOL_SIZE + GOV_REG_MAX_OVERFLOW
+        if shards > capacity:
+            logger.warning(
+                f"Шардів {shards} більше, ніж з'єднань у пулі джерела ({capacity}) — читаємо у {capacity}"
+            )
+            shards = capacity
+        date_column = table.c["updatedAt"]
+        with engine.connect() as connection:
+            first, last = connection.execute(
+                select(func.min(date_column), func.max(date_column))
+                .where((date_column >= lower) & (date_column <= upper))
+            ).one()
+        if first is None:
+            return
+
+        bounds = _split_time_range(first, last, shards)
+        logger.info(f"Сканування {table.name} у {len(bounds)} шардах з {first} по {last}")
+        stop = threading.Event()
+        queues = [queue.Queue(maxsize=SOURCE_SHARD_PREFETCH) for _ in bounds]
+
+        def put(shard_queue: queue.Queue, item) -> bool:
+            while not stop.is_set():
+                try:
+                    shard_queue.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
 
+        def scan_shard(index: int):
+            shard_lower, shard_upper = bounds[index]
+            upper_inclusive = index == len(bounds) - 1
+            after_key = None
+            id_name = self.source_id_column(doc_type)
+            for attempt in range(1, SOURCE_SHARD_RETRIES + 2):
+                try:
+                    for batch in self._iter_source_pages(
+                        engine, table, doc_type, shard_lower, shard_upper, fetch_size,
+                        upper_inclusive=upper_inclusive, after_key=after_key, projected=projected,
+                    ):
+                        if not put(queues[index], batch):
+                            return
+                        after_key = self._row_key(batch[-1], id_name, projected)
+                    put(queues[index], _SHARD_DONE)
+                    return
+                except Exception as e:
+                    if stop.is_set():
+                        return
+                    if attempt > SOURCE_SHARD_RETRIES or not isinstance(e, (DBAPIError, PoolTimeoutError)):
+                        put(queues[index], e)
+                        return
+                    logger.warning(
+                        f"Шард {index + 1}/{len(bounds)} {table.name} перервано ({e}), "
+                        f"повтор {attempt}/{SOURCE_SHARD_RETRIES} з {after_key or shard_lower}"
+                    )
+                    time.sleep(min(2 ** attempt, 30))
+
+        threads = [
+            threading.Thread(target=scan_shard, args=(index,), name=f"scan-{table.name}-{index}", daemon=True)
+            for index in range(len(bounds))
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for shard_queue in queues:
+                while True:
+                    item = shard_queue.get()
+                    if item is _SHARD_DONE:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def _end_read(self):
+        """
+        Завершує транзакцію спільної сесії після читання: інакше вона тримає
+        знімок (SQLite WAL) чи блокування до наступного запису цією сесією.
+        """
+        try:
+            self.session.rollback()
         except Exception as e:
-            print(f"Сталася помилка: {e}")
-    
+            logger.warning(f"Не вдалося завершити транзакцію читання: {e}")
+
+    def get_watermark(self, doc_type: str) -> Optional[Tuple[datetime, Optional[str]]]:
+        """
+        Повертає (last_updated_at, last_id) для пари (company, doc_type) або None.
+        """
+        with self._session_lock:
+            try:
+                watermark = (
+                    self.session.query(SyncWatermark)
+                    .filter(
+                        SyncWatermark.company == self.company,
+                        SyncWatermark.doc_type == doc_type,
+                    )
+                    .one_or_none()
+                )
+                if watermark is None:
+                    return None
+                return watermark.last_updated_at, watermark.last_id
+            except Exception as e:
+                logger.error(f"Помилка читання watermark для {self.company}/{doc_type}: {e}", exc_info=True)
+                return None
+            finally:
+                self._end_read()
+
+    def set_watermark(self, doc_type: str, last_updated_at: datetime, last_id) -> bool:
+        """
+        Зберігає останній успішно оброблений (updatedAt, id) для пари (company, doc_type).
+        Повертає False, якщо зберегти не вдалося.
+        """
+        with self._session_lock:
+            try:
+                watermark = (
+                    self.session.query(SyncWatermark)
+                    .filter(
+                        SyncWatermark.company == self.company,
+                        SyncWatermark.doc_type == doc_type,
+                    )
+                    .one_or_none()
+                )
+                if watermark is None:
+                    watermark = SyncWatermark(company=self.company, doc_type=doc_type)
+                    self.session.add(watermark)
+                watermark.last_updated_at = last_updated_at
+                watermark.last_id = None if last_id is None else str(last_id)
+                self.session.commit()
+                return True
+            except Exception as e:
+                logger.error(f"Помилка збереження watermark для {self.company}/{doc_type}: {e}", exc_info=True)
+                self.session.rollback()
+                return False
+
     def get_existing_links_set(self) -> set:
         """
         Завантажує множину всіх існуючих original_url з таблиці Documents.
@@ -203,6 +1009,110 @@ class DocumentRepository:
             return set()
 
 
+    def backfill_link_hashes(self, batch_size: int = LINK_INDEX_FETCH_SIZE) -> int:
+        """
+        Заповнює url_hash для рядків, збережених до появи цієї колонки.
+        Повертає кількість оновлених рядків.
+        """
+        updated = 0
+        while True:
+            rows = self.session.execute(
+                select(Documents.id, Documents.original_url)
+                .where(Documents.url_hash.is_(None), Documents.original_url.isnot(None))
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            self.session.execute(
+                update(Documents),
+                [{"id": row.id, "url_hash": link_hash(row.original_url)} for row in rows],
+            )
+            self.session.commit()
+            updated += len(rows)
+            logger.info(f"Заповнено url_hash для {updated} рядків...")
+        return updated
+
+    def get_existing_links_index(self, refresh: bool = False) -> LinkIndex:
+        """
+        Компактний індекс існуючих посилань, побудований з колонок url_hash
+        таблиць Documents і DocumentLinks (8 байт на посилання). Кешується в репозиторії, тож проходи data і party
+        однієї компанії завантажують його лише раз.
+        """
+        with self._session_lock:
+            if self._links_index is not None and not refresh:
+                return self._links_index
+            try:
+                self.backfill_link_hashes()
+                # Посилання на вміст-дублікати є лише в DocumentLinks.
+                hashes = union(
+                    select(Documents.url_hash.label("url_hash")).where(Documents.url_hash.isnot(None)),
+                    select(DocumentLinks.url_hash.label("url_hash")).where(DocumentLinks.url_hash.isnot(None)),
+                ).subquery()
+                result = self.session.execute(
+                    select(hashes.c.url_hash)
+                    .order_by(hashes.c.url_hash)
+                    .execution_options(yield_per=LINK_INDEX_FETCH_SIZE)
+                )
+                self._links_index = LinkIndex.from_sorted_hashes(
+                    value for partition in result.scalars().partitions() for value in partition
+                )
+                self._links_loaded_until = self._links_max_created_at()
+            except Exception as e:
+                logger.error(f"Помилка отримання існуючих посилань: {e}", exc_info=True)
+                self._links_index = LinkIndex()
+            finally:
+                self._end_read()
+            return self._links_index
+
+    def _links_max_created_at(self) -> Optional[datetime]:
+        values = [
+            self.session.execute(select(func.max(model.created_at))).scalar()
+            for model in (Documents, DocumentLinks)
+        ]
+        values = [value for value in values if value is not None]
+        return max(values) if values else None
+
+    def refresh_existing_links_index(self) -> LinkIndex:
+        """
+        Дозавантажує в кешований індекс посилання, записані після попереднього
+        завантаження (іншими процесами чи вузлами), за created_at з перекриттям
+        LINK_INDEX_REFRESH_OVERLAP_SECONDS. Для процесу, що працює постійно,
+        замість повного перечитування на кожному циклі.
+        """
+        with self._session_lock:
+            if self._links_index is None or self._links_loaded_until is None:
+                return self.get_existing_links_index(refresh=True)
+            since = self._links_loaded_until - timedelta(seconds=LINK_INDEX_REFRESH_OVERLAP_SECONDS)
+            try:
+                self.backfill_link_hashes()
+                rows = self.session.execute(union(
+                    select(Documents.url_hash.label("url_hash"), Documents.created_at.label("created_at"))
+                    .where(Documents.url_hash.isnot(None), Documents.created_at >= since),
+                    select(DocumentLinks.url_hash.label("url_hash"), DocumentLinks.created_at.label("created_at"))
+                    .where(DocumentLinks.url_hash.isnot(None), DocumentLinks.created_at >= since),
+                )).all()
+                index = self._links_index
+                for url_hash, created_at in rows:
+                    index.add_hash(url_hash)
+                    if created_at is not None and created_at > self._links_loaded_until:
+                        self._links_loaded_until = created_at
+                if index.added_count > LINK_INDEX_COMPACT_THRESHOLD:
+                    index.compact()
+                logger.info(f"Індекс посилань {self.company} оновлено: +{len(rows)}, всього {len(index)}")
+            except Exception as e:
+                logger.error(f"Помилка оновлення індексу посилань: {e}", exc_info=True)
+            finally:
+                self._end_read()
+            return self._links_index
+
+    def forget_cached_link(self, link: str):
+        """
+        Прибирає з кешованого індексу посилання, заплановане в цьому запуску,
+        але не збережене, щоб наступний цикл спробував його знову.
+        """
+        if self._links_index is not None:
+            self._links_index.discard(link)
+
     def find_file_by_original_or_attachments(self, attachmentsList_or_originalDict: Dict|List):
         all_links = []
 
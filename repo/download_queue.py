@@ -0,0 +1,216 @@
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from config.config import DOWNLOAD_QUEUE_FLUSH_EVERY
+from config.logger import get_logger
+
+logger = get_logger(__name__)
+
+PLANNED = "planned"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+# Сервер остаточно відмовив (403 та інші 4xx, що не повторюються): watermark їх не чекає.
+REJECTED = "rejected"
+# Посилання іншого вузла (див. repo/leases.py): не завантажене цим вузлом і не підтверджене як збережене.
+DEFERRED = "deferred"
+
+
+def download_queue_path(folder, doc_type: str) -> Path:
+    """Файл черги проходу doc_type у папці компанії."""
+    return Path(folder) / f".download_queue_{doc_type}.sqlite3"
+
+
+class DownloadQueue:
+    """
+    Стійка до збоїв локальна черга завантажень (SQLite-файл поруч із папкою файлів).
+    Для кожного посилання зберігає стан planned / in_progress / done / failed / rejected / deferred
+    і (updatedAt, id) рядка-джерела, а в meta — чи завершено сканування.
+    Перезапущений прохід продовжує з черги без повторного сканування джерела.
+    Зміни станів буферизуються і записуються пачками.
+    """
+
+    def __init__(self, path: Path, flush_every: int = DOWNLOAD_QUEUE_FLUSH_EVERY):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._pending_states: List[Tuple[str, str]] = []
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                link TEXT PRIMARY KEY,
+                download_url TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                state TEXT NOT NULL,
+                row_updated_at TEXT,
+                row_id TEXT
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_items_state ON items (state)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    # --- meta ---
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: Optional[str]):
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def scan_complete(self) -> bool:
+        with self._lock:
+            return self._get_meta("scan_complete") == "1"
+
+    def mark_scan_complete(self, last_row_key: Optional[Tuple]):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._set_meta("scan_complete", "1")
+            if last_row_key is not None:
+                self._set_meta("last_row_updated_at", _dump_dt(last_row_key[0]))
+                self._set_meta("last_row_id", str(last_row_key[1]))
+            self._conn.execute("COMMIT")
+
+    def last_row_key(self) -> Optional[Tuple[datetime, str]]:
+        with self._lock:
+            updated_at = self._get_meta("last_row_updated_at")
+            if updated_at is None:
+                return None
+            return _load_dt(updated_at), self._get_meta("last_row_id")
+
+    # --- items ---
+
+    def recover(self) -> int:
+        """Після збою повертає незавершені (in_progress) записи у planned."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE items SET state = ? WHERE state = ?", (PLANNED, IN_PROGRESS)
+            )
+            return cursor.rowcount
+
+    def add_planned(self, items: List[Tuple[str, str, str, Tuple]]):
+        """
+        Додає заплановані файли (download_url, link, file_name, row_key) однією транзакцією.
+        Раніше невдалі, відхилені та відкладені посилання знову стають planned.
+        """
+        if not items:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO items (link, download_url, file_name, state, row_updated_at, row_id) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(link) DO UPDATE SET state = excluded.state "
+                "WHERE items.state IN ('failed', 'rejected', 'deferred')",
+                [
+                    (link, url, file_name, PLANNED, _dump_dt(row_key[0]), str(row_key[1]))
+                    for url, link, file_name, row_key in items
+                ],
+            )
+            self._conn.execute("COMMIT")
+
+    def count_pending(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM items WHERE state IN (?, ?)", (PLANNED, IN_PROGRESS)
+            ).fetchone()[0]
+
+    def iter_pending(
+        self, batch_size: int = 1000, state: str = PLANNED
+    ) -> Iterator[List[Tuple[str, str, str]]]:
+        """Пачки (download_url, link, file_name) записів у стані state (keyset за link)."""
+        last_link = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT download_url, link, file_name FROM items "
+                    "WHERE state = ? AND link > ? ORDER BY link LIMIT ?",
+                    (state, last_link, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            last_link = rows[-1][1]
+            yield rows
+
+    def mark(self, link: str, state: str):
+        """Буферизована зміна стану; запис на диск кожні flush_every змін."""
+        with self._lock:
+            self._pending_states.append((state, link))
+            should_flush = len(self._pending_states) >= self.flush_every
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._pending_states:
+                return
+            updates, self._pending_states = self._pending_states, []
+            self._conn.execute("BEGIN")
+            self._conn.executemany("UPDATE items SET state = ? WHERE link = ?", updates)
+            self._conn.execute("COMMIT")
+
+    def min_failed_row_key(self) -> Optional[Tuple[datetime, str]]:
+        """
+        Найраніший рядок-джерело з невдалим або відкладеним (не підтвердженим) посиланням.
+        Відхилені (REJECTED) не враховуються: повтор їм не допоможе, а інакше
+        кожен наступний запуск сканував би джерело від них.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT row_updated_at, row_id FROM items "
+                "WHERE state IN (?, ?) AND row_updated_at IS NOT NULL "
+                "ORDER BY row_updated_at, row_id LIMIT 1",
+                (FAILED, DEFERRED),
+            ).fetchone()
+        if row is None:
+            return None
+        return _load_dt(row[0]), row[1]
+
+    def prune(self) -> int:
+        """
+        Масово видаляє завершені (done, failed, rejected і deferred) записи та скидає ознаку
+        сканування, щоб наступний прохід почав нове сканування. Невдалі
+        посилання не губляться: watermark лишається перед ними, тож
+        наступне сканування запланує їх знову. Відхилені сервером
+        повторно не плануються — вони видно в причинах підсумку запуску.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            deleted = self._conn.execute(
+                "DELETE FROM items WHERE state IN (?, ?, ?, ?)", (DONE, FAILED, REJECTED, DEFERRED)
+            ).rowcount
+            self._conn.execute("DELETE FROM meta")
+            self._conn.execute("COMMIT")
+        return deleted
+
+
+def _dump_dt(value) -> Optional[str]:
+    if value is None:
+        return None
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def _load_dt(value: Optional[str]):
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return value
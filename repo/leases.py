@@ -0,0 +1,254 @@
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+
+from sqlalchemy import delete, insert, select, union, update
+from sqlalchemy.exc import IntegrityError
+
+from config.config import CLUSTER_NODE_TTL_SECONDS, DOWNLOAD_LEASE_SECONDS, DOWNLOAD_NOT_FOUND_SECONDS
+from config.logger import get_logger
+from database.database import SessionLocal
+from database.models import CollectorNode, DocumentLinks, DownloadLease, Documents
+from utils.link_index import link_hash
+
+logger = get_logger(__name__)
+
+# Власник рядка-позначки "посилання остаточно 404": не вузол, тож позначку не
+# продовжує heartbeat і не знімає leave — вона спливає через not_found_seconds.
+NOT_FOUND_OWNER = "!not-found"
+
+
+def _utcnow() -> datetime:
+    """Наївний UTC: однаково порівнюється в SQLite і MSSQL."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _node_weight(node_id: str, link: str) -> int:
+    digest = hashlib.blake2b(f"{node_id}\0{link}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class LeaseStore:
+    """
+    Координація кількох вузлів-збирачів через спільну БД Documents.
+    - heartbeat() реєструє вузол, продовжує його оренди і прибирає прострочені;
+      живими вважаються вузли з heartbeat не старшим за node_ttl_seconds.
+    - is_owner(link) — rendezvous-хешування посилання по живих вузлах:
+      кожен вузол спершу бере свою частку, при зміні складу переходить лише
+      частка вузла, що зник.
+    - claim(links) атомарно захоплює пачку посилань однією транзакцією
+      (первинний ключ url_hash), пропускаючи вже збережені та орендовані живими.
+    - release(link) / mark_not_found(link) — звільнення оренди після завантаження;
+      для 404 оренда стає позначкою, щоб інші вузли не повторювали запит.
+    Працює на будь-якому діалекті, зокрема SQLite; годинники вузлів мають бути синхронізовані.
+    """
+
+    def __init__(
+        self,
+        node_id: str,
+        lease_seconds: float = DOWNLOAD_LEASE_SECONDS,
+        node_ttl_seconds: float = CLUSTER_NODE_TTL_SECONDS,
+        not_found_seconds: float = DOWNLOAD_NOT_FOUND_SECONDS,
+    ):
+        self.node_id = node_id
+        self.lease_seconds = lease_seconds
+        self.node_ttl_seconds = node_ttl_seconds
+        self.not_found_seconds = not_found_seconds
+        self._live_nodes: List[str] = [node_id]
+        self._pending_release: List[int] = []
+        self._pending_not_found: List[int] = []
+        self._lock = threading.Lock()
+
+    @property
+    def live_nodes(self) -> List[str]:
+        return self._live_nodes
+
+    def is_owner(self, link: str) -> bool:
+        nodes = self._live_nodes
+        if len(nodes) <= 1:
+            return True
+        return max(nodes, key=lambda node: _node_weight(node, link)) == self.node_id
+
+    def heartbeat(self) -> List[str]:
+        """Оновлює вузол і його оренди; повертає відсортований список живих вузлів."""
+        now = _utcnow()
+        nodes = CollectorNode.__table__
+        leases = DownloadLease.__table__
+        self.flush_releases()
+        session = SessionLocal()
+        try:
+            updated = session.execute(
+                update(nodes).where(nodes.c.node_id == self.node_id).values(heartbeat_at=now)
+            ).rowcount
+            if not updated:
+                try:
+                    with session.begin_nested():
+                        session.execute(insert(nodes).values(node_id=self.node_id, heartbeat_at=now))
+                except IntegrityError:
+                    pass
+            session.execute(
+                update(leases)
+                .where(leases.c.owner == self.node_id)
+                .values(expires_at=now + timedelta(seconds=self.lease_seconds))
+            )
+            session.execute(delete(leases).where(leases.c.expires_at < now))
+            live = sorted(
+                session.execute(
+                    select(nodes.c.node_id).where(
+                        nodes.c.heartbeat_at >= now - timedelta(seconds=self.node_ttl_seconds)
+                    )
+                ).scalars()
+            )
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Помилка heartbeat вузла {self.node_id}: {e}", exc_info=True)
+            return self._live_nodes
+        finally:
+            session.close()
+        if self.node_id not in live:
+            live = sorted(live + [self.node_id])
+        if live != self._live_nodes:
+            logger.info(f"Живі вузли: {live}")
+        self._live_nodes = live
+        return live
+
+    def claim(self, links: List[str]) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Захоплює посилання однією транзакцією. Повертає (claimed, stored, leased):
+        захоплені цим вузлом; вже збережені в Documents/DocumentLinks або
+        позначені як 404 (NOT_FOUND_OWNER); орендовані іншим живим вузлом.
+        Прострочені оренди перехоплюються.
+        """
+        if not links:
+            return [], [], []
+        by_hash = {link_hash(link): link for link in links}
+        hashes = list(by_hash)
+        leases = DownloadLease.__table__
+        now = _utcnow()
+        expires_at = now + timedelta(seconds=self.lease_seconds)
+        claimed, stored, leased = [], [], []
+
+        session = SessionLocal()
+        try:
+            stored_hashes = set(session.execute(union(
+                select(Documents.url_hash).where(Documents.url_hash.in_(hashes)),
+                select(DocumentLinks.url_hash).where(DocumentLinks.url_hash.in_(hashes)),
+            )).scalars())
+            session.execute(
+                delete(leases).where(leases.c.url_hash.in_(hashes), leases.c.expires_at < now)
+            )
+            owners = dict(session.execute(
+                select(leases.c.url_hash, leases.c.owner).where(leases.c.url_hash.in_(hashes))
+            ).all())
+
+            new_rows = []
+            for value, link in by_hash.items():
+                if value in stored_hashes or owners.get(value) == NOT_FOUND_OWNER:
+                    stored.append(link)
+                elif value not in owners:
+                    new_rows.append({
+                        "url_hash": value, "original_url": link,
+                        "owner": self.node_id, "expires_at": expires_at,
+                    })
+                elif owners[value] == self.node_id:
+                    claimed.append(link)
+                else:
+                    leased.append(link)
+            if claimed:
+                session.execute(
+                    update(leases)
+                    .where(leases.c.url_hash.in_([link_hash(link) for link in claimed]))
+                    .values(expires_at=expires_at)
+                )
+
+            try:
+                if new_rows:
+                    with session.begin_nested():
+                        session.execute(insert(leases), new_rows)
+                claimed.extend(row["original_url"] for row in new_rows)
+            except IntegrityError:
+                # Інший вузол захопив частину пачки одночасно — поодинці.
+                for row in new_rows:
+                    try:
+                        with session.begin_nested():
+                            session.execute(insert(leases), row)
+                        claimed.append(row["original_url"])
+                    except IntegrityError:
+                        leased.append(row["original_url"])
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Помилка захоплення пачки посилань: {e}", exc_info=True)
+            # Нічого не захоплено — посилання лишаються за іншими вузлами до наступної спроби.
+            return [], [], list(links)
+        finally:
+            session.close()
+        return claimed, stored, leased
+
+    def release(self, link: str):
+        """Відкладене звільнення оренди (пачкою в heartbeat або flush_releases)."""
+        with self._lock:
+            self._pending_release.append(link_hash(link))
+
+    def mark_not_found(self, link: str):
+        """
+        Відкладене перетворення оренди на позначку 404: інші вузли отримають
+        посилання в stored і не запитуватимуть його знову, доки позначка не спливе.
+        """
+        with self._lock:
+            self._pending_not_found.append(link_hash(link))
+
+    def flush_releases(self):
+        with self._lock:
+            released, self._pending_release = self._pending_release, []
+            not_found, self._pending_not_found = self._pending_not_found, []
+        if not released and not not_found:
+            return
+        leases = DownloadLease.__table__
+        expires_at = _utcnow() + timedelta(seconds=self.not_found_seconds)
+        session = SessionLocal()
+        try:
+            for start in range(0, len(released), 500):
+                session.execute(
+                    delete(leases).where(
+                        leases.c.owner == self.node_id,
+                        leases.c.url_hash.in_(released[start:start + 500]),
+                    )
+                )
+            for start in range(0, len(not_found), 500):
+                session.execute(
+                    update(leases)
+                    .where(
+                        leases.c.owner == self.node_id,
+                        leases.c.url_hash.in_(not_found[start:start + 500]),
+                    )
+                    .values(owner=NOT_FOUND_OWNER, expires_at=expires_at)
+                )
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.warning(
+                f"Не вдалося звільнити {len(released) + len(not_found)} оренд (спливуть самі): {e}"
+            )
+        finally:
+            session.close()
+
+    def leave(self):
+        """Вихід вузла: звільняє всі його оренди і видаляє з живих."""
+        # Позначки 404 мають пережити вихід вузла — записуємо їх до видалення оренд.
+        with self._lock:
+            self._pending_release = []
+        self.flush_releases()
+        session = SessionLocal()
+        try:
+            session.execute(delete(DownloadLease.__table__).where(DownloadLease.owner == self.node_id))
+            session.execute(delete(CollectorNode.__table__).where(CollectorNode.node_id == self.node_id))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.warning(f"Не вдалося зняти реєстрацію вузла {self.node_id}: {e}")
+        finally:
+            session.close()
+        self._live_nodes = [self.node_id]
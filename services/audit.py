@@ -0,0 +1,244 @@
+import os
+import posixpath
+import time
+from array import array
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select
+
+from config.config import (
+    AUDIT_BATCH_SIZE,
+    AUDIT_OUTPUT_DIR,
+    AUDIT_READ_BUFFER,
+    AUDIT_VERIFY_HASH,
+    AUDIT_WORKERS,
+)
+from config.logger import get_logger
+from database.database import SessionLocal, engine
+from database.models import DocumentLinks, Documents
+from repo.download_queue import DownloadQueue, download_queue_path
+from services.manifest import pool_context
+from utils.compression import CODEC_SUFFIXES
+from utils.file_hashing import check_stored_files
+from utils.link_index import LinkIndex, link_hash
+
+logger = get_logger(__name__)
+
+PROGRESS_INTERVAL_SECONDS = 10
+
+
+def _iter_row_batches(session, batch_size: int):
+    """Рядки Documents з local_path пачками (потоково, без завантаження таблиці в пам'ять)."""
+    table = Documents.__table__
+    result = session.execute(
+        select(
+            table.c.id, table.c.original_url, table.c.local_path, table.c.size,
+            table.c.file_hash, table.c.codec, table.c.stored_size,
+        )
+        .where(table.c.local_path.isnot(None))
+        .execution_options(yield_per=batch_size)
+    )
+    for partition in result.partitions():
+        yield partition
+
+
+def _iter_orphans(folder: str, seen: LinkIndex):
+    """Файли папки компанії, на які не посилається жоден local_path (без .part і службових)."""
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = [name for name in dirs if not name.startswith(".")]
+        relative_root = os.path.relpath(root, folder)
+        for name in files:
+            if name.startswith(".") or name.endswith(".part"):
+                continue
+            relative = name if relative_root == "." else posixpath.join(
+                Path(relative_root).as_posix(), name
+            )
+            # Рядки до шардування могли зберігати абсолютний шлях.
+            if relative in seen or os.path.join(root, name) in seen:
+                continue
+            yield os.path.join(root, name)
+
+
+def _owning_folder(local_path: str, found_path: Optional[str], folders: List[str]) -> Optional[str]:
+    """
+    Папка компанії, якій належить рядок: де знайдено файл або за абсолютним
+    local_path (рядки до шардування). Рядок Documents не зберігає компанію,
+    а таблиця спільна для всіх компаній, тож інакше власника не визначити — None.
+    """
+    for path in (found_path, local_path):
+        if path and os.path.isabs(path):
+            for folder in folders:
+                if path.startswith(os.path.join(folder, "")):
+                    return folder
+    return None
+
+
+def _requeue(candidates: List[Tuple], base_link: str, batch_size: int) -> int:
+    """
+    Видаляє рядки відсутніх/пошкоджених файлів (і їхні посилання в DocumentLinks),
+    щоб повторне завантаження не вважалося дублікатом, і додає посилання у стійку
+    чергу проходу data папки-власника (див. _owning_folder) — завантаження йде
+    з токеном саме цієї компанії. Наступний запуск докачає їх до нового
+    сканування джерела.
+    """
+    queues: Dict[str, DownloadQueue] = {}
+    requeued = 0
+    session = SessionLocal()
+    try:
+        for start in range(0, len(candidates), batch_size):
+            batch = [row for row in candidates[start:start + batch_size] if row[1]]
+            if not batch:
+                continue
+            session.execute(delete(Documents).where(Documents.id.in_([row[0] for row in batch])))
+            session.execute(
+                delete(DocumentLinks).where(
+                    DocumentLinks.url_hash.in_({link_hash(row[1]) for row in batch}),
+                    DocumentLinks.original_url.in_({row[1] for row in batch}),
+                )
+            )
+            session.commit()
+
+            planned: Dict[str, List[Tuple]] = {}
+            for _, link, local_path, codec, folder in batch:
+                file_name = posixpath.basename(local_path.replace(os.sep, "/"))
+                if codec:
+                    file_name = file_name.removesuffix(CODEC_SUFFIXES[codec])
+                item = (f"{base_link}storage/file/{link}", link, file_name, (None, ""))
+                planned.setdefault(folder, []).append(item)
+            for folder, items in planned.items():
+                if folder not in queues:
+                    queues[folder] = DownloadQueue(download_queue_path(folder, "data"))
+                queues[folder].add_planned(items)
+            requeued += len(batch)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+        for download_queue in queues.values():
+            download_queue.close()
+    return requeued
+
+
+def audit_storage(
+    folders: List[str],
+    base_link: Optional[str] = None,
+    requeue: bool = False,
+    verify_hash: bool = AUDIT_VERIFY_HASH,
+    workers: int = AUDIT_WORKERS,
+    batch_size: int = AUDIT_BATCH_SIZE,
+    output_dir: str = AUDIT_OUTPUT_DIR,
+) -> Dict[str, int]:
+    """
+    Звіряє Documents зі сховищем: для кожного рядка перевіряє, що файл
+    local_path існує в одній з folders, має розмір size (stored_size для
+    стиснених) і (verify_hash) SHA-256 file_hash вихідного вмісту. Рядки
+    читаються потоково пачками по batch_size і розподіляються по пулу процесів (не більше workers * 2 пачок у роботі),
+    тож швидкість обмежує диск, а не один потік Python; файл з невідповідним
+    розміром не хешується. Після цього обходить папки і шукає файли-сироти
+    без рядка. Списки missing.tsv / corrupt.tsv / orphans.tsv пишуться в
+    окрему папку звіту. requeue=True — відсутні й пошкоджені файли ставляться
+    у чергу повторного завантаження (потрібен base_link) своєї компанії;
+    рядки, компанію яких не визначити (див. _owning_folder), лише записуються
+    в unattributed.tsv і лишаються в БД.
+    """
+    folders = [str(Path(folder)) for folder in folders]
+    report_dir = Path(output_dir or ".") / f"audit-{datetime.now():%Y%m%d-%H%M%S}"
+    report_dir.mkdir(parents=True, exist_ok=True)
+    stats = {"rows": 0, "ok": 0, "missing": 0, "corrupt": 0, "orphans": 0, "requeued": 0, "unattributed": 0}
+    seen = array("q")
+    candidates: List[Tuple] = []
+    unattributed: List[Tuple] = []
+    started = last_progress = time.monotonic()
+
+    logger.info(
+        f"Аудит сховища {folders}: {workers} процесів, "
+        f"{'розмір і SHA-256' if verify_hash else 'лише розмір'}, звіт у {report_dir}"
+    )
+    # Довге потокове читання не повинно блокувати запис збирача (SQLite).
+    session = SessionLocal(bind=engine.execution_options(read_only=True))
+    with open(report_dir / "missing.tsv", "w", encoding="utf-8") as missing_file, \
+            open(report_dir / "corrupt.tsv", "w", encoding="utf-8") as corrupt_file, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=pool_context()) as pool:
+
+        def collect(future: Future, meta: Dict):
+            nonlocal last_progress
+            for row_id, status, path in future.result():
+                stats["rows"] += 1
+                if status == "ok":
+                    stats["ok"] += 1
+                    continue
+                link, local_path, codec = meta[row_id]
+                if status == "missing":
+                    stats["missing"] += 1
+                    missing_file.write(f"{row_id}\t{local_path}\t{link or ''}\n")
+                else:
+                    stats["corrupt"] += 1
+                    corrupt_file.write(f"{row_id}\t{path}\t{status}\t{link or ''}\n")
+                if requeue:
+                    folder = _owning_folder(local_path, path, folders)
+                    if folder is None:
+                        unattributed.append((row_id, local_path, link))
+                    else:
+                        candidates.append((row_id, link, local_path, codec, folder))
+            if time.monotonic() - last_progress >= PROGRESS_INTERVAL_SECONDS:
+                last_progress = time.monotonic()
+                logger.info(
+                    f"Перевірено {stats['rows']} файлів: відсутніх {stats['missing']}, "
+                    f"пошкоджених {stats['corrupt']}"
+                )
+
+        try:
+            in_flight: Deque[Tuple[Future, Dict]] = deque()
+            for rows in _iter_row_batches(session, batch_size):
+                tasks = []
+                meta = {}
+                for row_id, link, local_path, size, file_hash, codec, stored_size in rows:
+                    seen.append(link_hash(local_path))
+                    tasks.append((row_id, local_path, size, file_hash, codec, stored_size))
+                    meta[row_id] = (link, local_path, codec)
+                in_flight.append((
+                    pool.submit(check_stored_files, tasks, folders, verify_hash, AUDIT_READ_BUFFER),
+                    meta,
+                ))
+                if len(in_flight) >= workers * 2:
+                    collect(*in_flight.popleft())
+            while in_flight:
+                collect(*in_flight.popleft())
+        finally:
+            session.close()
+
+    seen_index = LinkIndex.from_sorted_hashes(sorted(seen))
+    del seen
+    with open(report_dir / "orphans.tsv", "w", encoding="utf-8") as orphans_file:
+        for folder in folders:
+            if not os.path.isdir(folder):
+                logger.warning(f"Папка {folder} не існує, пропускаємо пошук сиріт.")
+                continue
+            for path in _iter_orphans(folder, seen_index):
+                stats["orphans"] += 1
+                orphans_file.write(f"{path}\n")
+
+    if unattributed:
+        stats["unattributed"] = len(unattributed)
+        with open(report_dir / "unattributed.tsv", "w", encoding="utf-8") as unattributed_file:
+            for row_id, local_path, link in unattributed:
+                unattributed_file.write(f"{row_id}\t{local_path}\t{link or ''}\n")
+        logger.warning(
+            f"{len(unattributed)} відсутніх/пошкоджених файлів не вдалося віднести до папки компанії — "
+            f"не переплановано, див. unattributed.tsv"
+        )
+    if requeue and candidates:
+        if base_link is None:
+            logger.warning("base_link не задано — повторне завантаження не заплановано.")
+        else:
+            stats["requeued"] = _requeue(candidates, base_link, batch_size)
+
+    logger.info(
+        f"Аудит завершено за {time.monotonic() - started:.1f} с: {stats}. Звіт: {report_dir}"
+    )
+    return stats
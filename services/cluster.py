@@ -0,0 +1,80 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from config.config import (
+    CLUSTER_EXPECTED_NODES,
+    CLUSTER_HEARTBEAT_SECONDS,
+    CLUSTER_NODE_ID,
+    CLUSTER_STARTUP_GRACE_SECONDS,
+)
+from config.logger import get_logger
+from repo.leases import LeaseStore
+
+logger = get_logger(__name__)
+
+
+def create_lease_store(node_id: str = CLUSTER_NODE_ID) -> Optional[LeaseStore]:
+    """LeaseStore вузла або None, якщо CLUSTER_NODE_ID не задано (один вузол)."""
+    if not node_id:
+        return None
+    return LeaseStore(node_id)
+
+
+async def wait_for_nodes(
+    store: LeaseStore,
+    grace: float = CLUSTER_STARTUP_GRACE_SECONDS,
+    expected_nodes: int = CLUSTER_EXPECTED_NODES,
+    poll: float = 0.2,
+) -> List[str]:
+    """
+    Чекає реєстрації інших вузлів перед захопленням посилань: до expected_nodes
+    живих (0 — кількість невідома) або до кінця grace секунд. Без очікування
+    вузол, що стартував першим, вважає себе єдиним і забирає більшу частину роботи.
+    """
+    live = await asyncio.to_thread(store.heartbeat)
+    deadline = time.monotonic() + grace
+    while not (expected_nodes and len(live) >= expected_nodes):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        await asyncio.sleep(min(poll, remaining))
+        live = await asyncio.to_thread(store.heartbeat)
+    return live
+
+
+@asynccontextmanager
+async def cluster_membership(
+    store: Optional[LeaseStore],
+    interval: float = CLUSTER_HEARTBEAT_SECONDS,
+    grace: float = CLUSTER_STARTUP_GRACE_SECONDS,
+    expected_nodes: int = CLUSTER_EXPECTED_NODES,
+):
+    """
+    Участь вузла в кластері на час проходу: реєстрація і очікування інших
+    вузлів (wait_for_nodes), періодичний heartbeat (продовжує оренди і оновлює
+    список живих вузлів), на виході — звільнення оренд і зняття реєстрації,
+    щоб інші вузли одразу перебрали його частку.
+    """
+    if store is None:
+        yield
+        return
+
+    async def beat():
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(store.heartbeat)
+
+    live = await wait_for_nodes(store, grace, expected_nodes)
+    logger.info(f"Вузол {store.node_id} у кластері з {len(live)} живих вузлів")
+    task = asyncio.create_task(beat())
+    try:
+        yield
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await asyncio.to_thread(store.leave)
@@ -0,0 +1,129 @@
+import asyncio
+import signal
+import threading
+from typing import Dict, List
+
+from config.config import (
+    DAEMON_INTERVAL_MINUTES,
+    DAEMON_POLL_SECONDS,
+    GLOBAL_DOWNLOAD_CONCURRENCY,
+    TOKEN_DOWNLOAD_CONCURRENCY,
+)
+from config.logger import get_logger
+from services.documents import DocumentService
+from services.http_client import create_async_client
+from services.orchestrator import collection_window, prepare_pipelines, run_cycle
+
+logger = get_logger(__name__)
+
+
+def _install_stop_handlers(loop: asyncio.AbstractEventLoop, request_stop):
+    """SIGTERM/SIGINT (і SIGBREAK на Windows) — плавна зупинка замість обриву."""
+    signals = [signal.SIGTERM, signal.SIGINT]
+    if hasattr(signal, "SIGBREAK"):
+        signals.append(signal.SIGBREAK)
+    for sig in signals:
+        try:
+            loop.add_signal_handler(sig, request_stop)
+        except (NotImplementedError, RuntimeError):
+            # Windows: обробник викликається в головному потоці поза циклом подій.
+            signal.signal(sig, lambda *_: loop.call_soon_threadsafe(request_stop))
+
+
+async def _has_new_rows(services: List[DocumentService], seen: Dict) -> bool:
+    """Чи з'явилися в джерелах рядки новіші за бачені на початку попереднього циклу."""
+    for service in services:
+        key = (service.company, service.doc_type)
+        try:
+            latest = await asyncio.to_thread(
+                service.document_repo.source_max_updated_at, service.doc_type
+            )
+        except Exception as e:
+            logger.warning(f"Не вдалося перевірити нові рядки {key}: {e}")
+            continue
+        if latest is not None and (seen.get(key) is None or latest > seen[key]):
+            return True
+    return False
+
+
+async def _remember_latest(services: List[DocumentService], seen: Dict):
+    for service in services:
+        try:
+            seen[(service.company, service.doc_type)] = await asyncio.to_thread(
+                service.document_repo.source_max_updated_at, service.doc_type
+            )
+        except Exception as e:
+            logger.warning(f"Не вдалося прочитати max(updatedAt) {service.company}/{service.doc_type}: {e}")
+
+
+async def run_daemon(
+    services: List[DocumentService],
+    base_link: str,
+    interval_minutes: float = DAEMON_INTERVAL_MINUTES,
+    poll_seconds: float = DAEMON_POLL_SECONDS,
+    global_limit: int = GLOBAL_DOWNLOAD_CONCURRENCY,
+    per_token_limit: int = TOKEN_DOWNLOAD_CONCURRENCY,
+):
+    """
+    Постійний режим: цикл збору кожні interval_minutes хвилин або раніше,
+    щойно в таблицях-джерелах з'являться нові рядки (перевірка кожні
+    poll_seconds секунд). Між циклами лишаються «теплими» пули з'єднань,
+    відображені таблиці джерела, HTTP-клієнти, адаптивні ліміти та індекс
+    існуючих посилань (оновлюється інкрементально).
+    SIGTERM/SIGINT: нові файли не беруться, поточні завантаження завершуються,
+    незавантажене лишається у стійкій черзі до наступного запуску.
+    """
+    loop = asyncio.get_running_loop()
+    stop_event = threading.Event()
+    wake = asyncio.Event()
+
+    def request_stop():
+        if not stop_event.is_set():
+            logger.info("Отримано сигнал зупинки: завершуємо поточні завантаження...")
+        stop_event.set()
+        wake.set()
+
+    _install_stop_handlers(loop, request_stop)
+    prepare_pipelines(services, global_limit, per_token_limit)
+
+    clients = {}
+    for service in services:
+        if service.token not in clients:
+            clients[service.token] = create_async_client(service.token)
+        service.http_client = clients[service.token]
+        service.stop_event = stop_event
+    repos = {id(service.document_repo): service.document_repo for service in services}
+
+    seen: Dict = {}
+    cycle = 0
+    try:
+        while not stop_event.is_set():
+            cycle += 1
+            await _remember_latest(services, seen)
+            for repo in repos.values():
+                await asyncio.to_thread(repo.refresh_existing_links_index)
+
+            start_date, end_date = collection_window()
+            logger.info(f"=== Цикл {cycle}: період {start_date} по {end_date} ===")
+            await run_cycle(services, base_link, start_date, end_date, per_token_limit=per_token_limit)
+
+            # Очікування наступного циклу: за розкладом, за новими рядками або до зупинки.
+            deadline = loop.time() + interval_minutes * 60
+            while not stop_event.is_set():
+                timeout = min(poll_seconds, deadline - loop.time())
+                if timeout <= 0:
+                    break
+                wake.clear()
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                if not stop_event.is_set() and await _has_new_rows(services, seen):
+                    logger.info("У джерелі з'явилися нові рядки — запускаємо цикл раніше")
+                    break
+    finally:
+        for client in clients.values():
+            await client.aclose()
+        for service in services:
+            service.http_client = None
+        logger.info(f"Демон зупинено після {cycle} циклів")
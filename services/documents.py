@@ -1,21 +1,110 @@
 import asyncio
-import json
-import os
+import hashlib
+import random
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from time import time
-from typing import Dict, List, Optional, Set
+from time import monotonic, time
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sized,
+    Tuple,
+    Union,
+)
 
 import httpx
 import requests
-from sqlalchemy import Tuple
 from tqdm.asyncio import tqdm
 
-from config.logger import get_logger
-from repo.documents import DocumentRepository
+from config.config import (
+    API_PAGE_CONCURRENCY,
+    API_PAGE_SIZE,
+    API_TIMEOUT,
+    CLUSTER_CLAIM_BATCH,
+    DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_MAX_ATTEMPTS,
+    HASH_WRITE_WORKERS,
+    MANIFEST_CHUNK_SIZE,
+    MANIFEST_WORKERS,
+    RETRY_BACKOFF_BASE,
+    RETRY_BACKOFF_MAX,
+    PLAN_QUEUE_SIZE,
+    SOURCE_QUERY_MODE,
+    STORAGE_COMPRESSION_LEVEL,
+    SYNC_WATERMARK_OVERLAP_MINUTES,
+)
+from config.logger import RATE_LIMITED, get_logger
+from repo.documents import DocumentRepository, DocumentWriteBatcher
+from repo.download_queue import (
+    DEFERRED,
+    DONE,
+    FAILED,
+    IN_PROGRESS,
+    REJECTED,
+    DownloadQueue,
+    download_queue_path,
+)
+from repo.leases import LeaseStore
+from utils.file_hashing import HashingFileWriter
+from utils.link_index import LinkIndex
+from utils.metrics import (
+    BYTES,
+    DOWNLOAD_SECONDS,
+    FILES,
+    HTTP_RESPONSES,
+    HTTP_TTFB,
+    IN_FLIGHT,
+    QUEUE_DEPTH,
+    RETRIES,
+    STAGE_SECONDS,
+    STORED_BYTES,
+    timed,
+    timed_iter,
+)
+from services.http_client import create_async_client, create_sync_session
+from services.limiter import AdaptiveLimiter
+from services.manifest import ManifestBuilder, build_chunk, project_row
 
 logger = get_logger(__name__)
 
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# 4xx, після яких файл може стати доступним у наступному запуску (токен, таймаут запиту).
+TRANSIENT_CLIENT_STATUS_CODES = {401, 408}
+FAILURE_EXAMPLES = 3
+# Результат завантаження -> стан у стійкій черзі (решта — FAILED).
+QUEUE_STATES = {"success": DONE, "404": DONE, "rejected": REJECTED}
+
+
+def record_failure(stats: Dict, reason: str, url: str):
+    """Рахує незбережені файли за причиною і запам'ятовує кілька прикладів посилань."""
+    entry = stats.setdefault("failure_reasons", {}).setdefault(reason, {"count": 0, "examples": []})
+    entry["count"] += 1
+    if len(entry["examples"]) < FAILURE_EXAMPLES:
+        entry["examples"].append(url)
+
+
+def log_failure_reasons(stats: Dict):
+    reasons = stats.get("failure_reasons") or {}
+    if not reasons:
+        return
+    logger.info("Причини незбережених файлів:")
+    for reason, entry in sorted(reasons.items(), key=lambda item: -item[1]["count"]):
+        logger.info(f"  - {reason}: {entry['count']} (напр. {', '.join(entry['examples'])})")
+
+
+class ScanStopped(Exception):
+    """Сканування перервано запитом на зупинку (див. DocumentService.stop_event)."""
+
 
 class DocumentService:
     def __init__(self, document_repo: DocumentRepository, doc_type: str, token, company: str):
@@ -23,19 +112,47 @@ class DocumentService:
         self.doc_type = doc_type
         self.token = token
         self.company = company
+        self._http_session: Optional[requests.Session] = None
+        self._write_batcher: Optional[DocumentWriteBatcher] = None
+        # Спільні для кількох сервісів обмежувачі паралелізму (див. services/orchestrator.py):
+        # адаптивний ліміт токена та глобальна стеля.
+        self.adaptive_limiter: Optional[AdaptiveLimiter] = None
+        self.shared_limiters: List[asyncio.Semaphore] = []
+        self._limiter: Optional[AdaptiveLimiter] = None
+        self._download_queue: Optional[DownloadQueue] = None
+        self._io_executor: Optional[ThreadPoolExecutor] = None
+        # Для режиму демона (services/daemon.py): клієнт, що живе між циклами,
+        # і подія зупинки — після неї нові файли не беруться, поточні дозавантажуються.
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self.stop_event: Optional[threading.Event] = None
+        # Кілька вузлів на одну БД (services/orchestrator.py, CLUSTER_NODE_ID):
+        # файл завантажується лише після захоплення оренди посилання.
+        self.lease_store: Optional[LeaseStore] = None
+
+    @property
+    def http_session(self) -> requests.Session:
+        """Пулований requests.Session, спільний для всіх синхронних запитів сервісу."""
+        if self._http_session is None:
+            self._http_session = create_sync_session(self.token)
+        return self._http_session
+
+    @property
+    def stopping(self) -> bool:
+        return self.stop_event is not None and self.stop_event.is_set()
+
+    def close(self):
+        if self._http_session is not None:
+            self._http_session.close()
+            self._http_session = None
 
     def _fetch_data(self, url: str, query_params: Optional[Dict] = None):
         if not self.token:
             logger.critical("Не знайдено API_BEARER_TOKEN. Роботу зупинено.")
             sys.exit(1)
 
-        headers = {"Authorization": f"Bearer {self.token}"}
-
         try:
-            logger.info(f"Надсилаємо запит до {url}")
-            response = requests.get(
-                url, headers=headers, params=query_params, timeout=360
-            )
+            logger.debug(f"Надсилаємо запит до {url}")
+            response = self.http_session.get(url, params=query_params, timeout=360)
             response.raise_for_status()
             api_data = response.json()
 
@@ -76,6 +193,130 @@ class DocumentService:
 
         return documents
 
+    async def _fetch_page_async(
+        self, client: httpx.AsyncClient, url: str, query_params: Dict
+    ) -> Optional[Dict]:
+        """Одна сторінка списку з повторами на таймаутах, 429, 5xx і тілі, що не є JSON."""
+        for attempt in range(1, DOWNLOAD_MAX_ATTEMPTS + 1):
+            try:
+                response = await client.get(url, params=query_params, timeout=API_TIMEOUT)
+                response.raise_for_status()
+                api_data = response.json()
+                if api_data.get("data") is None:
+                    logger.warning("У відповіді відсутній ключ 'data'.")
+                return api_data
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in RETRYABLE_STATUS_CODES:
+                    logger.error(f"Помилка запиту до API: {e}", exc_info=True)
+                    return None
+                await asyncio.sleep(self._retry_delay(attempt, e.response))
+            except httpx.TransportError as e:
+                logger.warning(f"Помилка з'єднання з API ({attempt}/{DOWNLOAD_MAX_ATTEMPTS}): {e}")
+                await asyncio.sleep(self._retry_delay(attempt))
+            except ValueError as e:
+                # Не JSON або обрізане тіло (напр. сторінка помилки проксі) — як збій з'єднання.
+                logger.warning(f"Некоректна відповідь API ({attempt}/{DOWNLOAD_MAX_ATTEMPTS}): {e}")
+                await asyncio.sleep(self._retry_delay(attempt))
+        logger.error(f"Не вдалося отримати сторінку {query_params.get('offset')} з {url}")
+        return None
+
+    async def _fetch_data_by_date_range_async(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        start_date: str,
+        end_date: str,
+        page_concurrency: int = API_PAGE_CONCURRENCY,
+        limit: int = API_PAGE_SIZE,
+    ) -> AsyncIterator[List[Dict]]:
+        """
+        Асинхронний варіант _fetch_data_by_date_range: отримує першу сторінку,
+        з неї — pageCount, а решту offset'ів запитує паралельно (не більше
+        page_concurrency одночасно). Сторінки віддаються по мірі надходження,
+        без накопичення всього списку.
+        """
+        filters = [
+            f"updatedAt||$gte||{start_date}",
+            f"updatedAt||$lte||{end_date}",
+        ]
+
+        def params(offset: int) -> Dict:
+            return {"filter": filters, "limit": limit, "offset": offset}
+
+        first = await self._fetch_page_async(client, url, params(0))
+        if not first:
+            return
+        if first.get("data"):
+            yield first["data"]
+
+        page_count = first.get("pageCount") or 0
+        offsets = iter(range(limit, page_count * limit, limit))
+        pending = set()
+
+        def fill():
+            for offset in offsets:
+                pending.add(asyncio.create_task(self._fetch_page_async(client, url, params(offset))))
+                if len(pending) >= page_concurrency:
+                    return
+
+        fill()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.discard(task)
+                    page = task.result()
+                    if page and page.get("data"):
+                        yield page["data"]
+                fill()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def gather_documents_from_api_async(
+        self,
+        list_url: str,
+        base_link: str,
+        start_date: str,
+        end_date: str,
+        concurrency_limit: int = 10,
+    ) -> Dict:
+        """
+        Прохід з REST-джерелом: сторінки списку одразу перетворюються на
+        план і йдуть у стадію завантаження, поки решта сторінок ще надходить.
+        """
+        existing_links = await asyncio.to_thread(self._load_existing_links)
+        scan = {
+            "documents": 0,
+            "attachments": 0,
+            "in_db": 0,
+            "planned": 0,
+            "last_row_key": None,
+        }
+
+        async with create_async_client(self.token) as api_client:
+
+            async def planned_files():
+                async for page in self._fetch_data_by_date_range_async(
+                    api_client, list_url, start_date, end_date
+                ):
+                    rows = [project_row(doc, self.doc_type) for doc in page]
+                    chunk = await asyncio.to_thread(build_chunk, rows, self.doc_type, base_link)
+                    for download_url, link, file_name, _ in self._plan_manifest_chunk(
+                        chunk, existing_links, scan
+                    ):
+                        yield download_url, link, file_name
+
+            stats = await self._run_all_downloads_async(planned_files(), concurrency_limit)
+
+        logger.info(
+            f"[{self.company}/{self.doc_type}] API: документів {scan['documents']}, "
+            f"attachments {scan['attachments']}, вже в бд {scan['in_db']}, "
+            f"заплановано {scan['planned']}, успішно {stats['success']}, "
+            f"404 {stats['not_found']}, помилок {stats['failed']}"
+        )
+        return {**scan, **stats}
+
     def _download_and_save_to_db(
         self, base_url: str, original_url: str, file_name: str
     ):
@@ -83,9 +324,8 @@ class DocumentService:
             logger.critical("Не знайдено API_BEARER_TOKEN.")
             return
 
-        headers = {"Authorization": f"Bearer {self.token}"}
         try:
-            response = requests.get(base_url, headers=headers, stream=True, timeout=360)
+            response = self.http_session.get(base_url, stream=True, timeout=360)
             response.raise_for_status()
             file_content = response.content
             size_in_bytes = len(file_content)
@@ -95,188 +335,832 @@ class DocumentService:
 
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 404:
-                logger.warning(f"Файл не знайдено за посиланням (404): {base_url}")
+                logger.warning(f"Файл не знайдено за посиланням (404): {base_url}", extra=RATE_LIMITED)
             elif e.response.status_code == 403:
-                logger.warning(f"Доступ заборонено (403) до файлу: {base_url}")
+                logger.warning(f"Доступ заборонено (403) до файлу: {base_url}", extra=RATE_LIMITED)
             else:
-                logger.error(f"HTTP помилка завантаження файлу {base_url}: {e}", exc_info=True)
+                logger.error(
+                    f"HTTP помилка завантаження файлу {base_url}: {e}", exc_info=True, extra=RATE_LIMITED
+                )
             raise
 
         except requests.exceptions.RequestException as e:
-            logger.error(f"Загальна помилка завантаження файлу {base_url}: {e}", exc_info=True)
+            logger.error(f"Загальна помилка завантаження файлу {base_url}: {e}", exc_info=True, extra=RATE_LIMITED)
             raise
 
-    async def _download_and_save_to_db_async(self, base_url: str, original_url: str, file_name: str):
+    @staticmethod
+    def _retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """
+        Пауза перед наступною спробою: Retry-After (секунди або HTTP-дата),
+        якщо сервер його надіслав, інакше експоненційний backoff з повним jitter.
+        """
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    delay = float(retry_after)
+                except ValueError:
+                    try:
+                        retry_at = parsedate_to_datetime(retry_after)
+                        delay = (retry_at - datetime.now(timezone.utc)).total_seconds()
+                    except (TypeError, ValueError):
+                        delay = None
+                if delay is not None:
+                    return min(max(delay, 0.0), RETRY_BACKOFF_MAX)
+        return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** (attempt - 1)))
+
+    async def _download_and_save_to_db_async(
+        self,
+        client: httpx.AsyncClient,
+        base_url: str,
+        original_url: str,
+        file_name: str,
+        stats: Optional[Dict] = None,
+    ):
+        """
+        Завантажує файл (див. _download_async) і чекає його збереження в БД.
+        Повертає "success", "404", "rejected" (сервер остаточно відмовив,
+        напр. 403) або "failed".
+        """
+        result = await self._download_async(client, base_url, original_url, file_name, stats)
+        if isinstance(result, str):
+            return result
+        return self._save_result(await result, base_url, stats)
+
+    @staticmethod
+    def _save_result(saved: bool, base_url: str, stats: Optional[Dict]) -> str:
+        if saved:
+            return "success"
+        logger.debug(f"Не збережено (запис у БД): {base_url}", extra=RATE_LIMITED)
+        if stats is not None:
+            record_failure(stats, "запис у БД", base_url)
+        return "failed"
+
+    async def _download_async(
+        self,
+        client: httpx.AsyncClient,
+        base_url: str,
+        original_url: str,
+        file_name: str,
+        stats: Optional[Dict] = None,
+    ) -> Union[str, Awaitable[bool]]:
+        """
+        Завантажує файл потоково у .part і передає його на збереження в БД.
+        Після обриву з'єднання докачує файл запитом Range (якщо сервер
+        відповідає 206), інакше починає спочатку. Повтори — з експоненційним
+        backoff і jitter; на 429/503 враховується Retry-After.
+        Лічильники retries / bytes_resumed додаються у stats.
+        Невдача — рядок "404", "rejected" або "failed"; завантажений файл —
+        Future збереження (True/False), що завершиться після коміту його пачки,
+        тож слот завантаження можна звільнити, не чекаючи на БД.
+        """
         if not self.token:
             logger.critical("Не знайдено API_BEARER_TOKEN.")
             return "failed"
 
-        headers = {"Authorization": f"Bearer {self.token}"}
+        part_path = self.document_repo.part_path(file_name, original_url)
+        file_hash = hashlib.sha256()
+        size_in_bytes = 0
+        validator = None
+        retries = 0
+        codec = self.document_repo.storage_codec
+        # Кодек .part на диску: writer скидає його для вже стиснених форматів (docx, zip, jpg...).
+        # Докачується лише нестиснений файл — стан компресора не відновити.
+        stored_codec = codec
 
-        for attempt in range(1, 10):
+        def count(key: str, value: int = 1):
+            if stats is not None:
+                stats[key] = stats.get(key, 0) + value
+
+        def fail(reason: str):
+            """Причина потрапляє в підсумок запуску замість окремого рядка логу на файл."""
+            logger.debug(f"Не збережено ({reason}): {base_url}", extra=RATE_LIMITED)
+            if stats is not None:
+                record_failure(stats, reason, base_url)
+
+        loop = asyncio.get_running_loop()
+
+        def run_io(func, *args):
+            return loop.run_in_executor(self._io_executor, func, *args)
+
+        for attempt in range(1, DOWNLOAD_MAX_ATTEMPTS + 1):
+            headers = {}
+            if size_in_bytes and not stored_codec:
+                headers["Range"] = f"bytes={size_in_bytes}-"
+                if validator:
+                    headers["If-Range"] = validator
             try:
-                async with httpx.AsyncClient(timeout=httpx.Timeout(600.0)) as client:
-                    async with client.stream("GET", base_url, headers=headers, follow_redirects=True) as response:
-                        response.raise_for_status()
-
-                        chunks = []
-                        async for chunk in response.aiter_bytes():
-                            chunks.append(chunk)
-                        file_content = b"".join(chunks)
-
-                size_in_bytes = len(file_content)
-                db_success = await self.document_repo.save_document_async(
-                    original_url, file_content, file_name, size_in_bytes
-                )
-                return "success" if db_success else "failed"
+                request_started = monotonic()
+                async with client.stream("GET", base_url, headers=headers) as response:
+                    ttfb = monotonic() - request_started
+                    HTTP_RESPONSES.inc(status=response.status_code)
+                    HTTP_TTFB.observe(ttfb)
+                    response.raise_for_status()
 
-            except (httpx.ReadTimeout, httpx.ConnectTimeout, httpx.ReadError):
-                await asyncio.sleep(10)
-                if attempt == 9:
-                    logger.error(f"Не вдалося завантажити після 9 спроб: {base_url}")
-                    return "failed"
+                    if size_in_bytes and response.status_code == 206:
+                        # Докачування: хеш і розмір вже містять записаний префікс.
+                        count("bytes_resumed", size_in_bytes)
+                    else:
+                        file_hash = hashlib.sha256()
+                        size_in_bytes = 0
+                    validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+
+                    # Хешування і запис — у пулі hash/write, а не в потоці циклу подій.
+                    resumed_from = size_in_bytes
+                    writer = await run_io(
+                        HashingFileWriter, part_path, file_hash, size_in_bytes,
+                        None if size_in_bytes else codec, STORAGE_COMPRESSION_LEVEL, file_name,
+                    )
+                    try:
+                        async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                            await run_io(writer.write, chunk)
+                    finally:
+                        await run_io(writer.close)
+                        file_hash, size_in_bytes = writer.hasher, writer.size
+                        stored_codec = writer.codec
+                        BYTES.inc(size_in_bytes - resumed_from)
+                        STAGE_SECONDS.observe(writer.hash_seconds, stage="hash")
+                        STAGE_SECONDS.observe(writer.write_seconds, stage="write")
+                        if writer.compress_seconds:
+                            STAGE_SECONDS.observe(writer.compress_seconds, stage="compress")
+                            STORED_BYTES.inc(writer.stored_size)
+                DOWNLOAD_SECONDS.observe(monotonic() - request_started)
+
+                if self._limiter is not None:
+                    self._limiter.on_success(ttfb)
+                if retries:
+                    count("files_retried")
+                if self._write_batcher is not None:
+                    return self.document_repo.enqueue_streamed_document(
+                        self._write_batcher,
+                        original_url, part_path, file_name, size_in_bytes, file_hash.hexdigest(),
+                        writer.codec, writer.stored_size,
+                    )
+                return asyncio.ensure_future(self.document_repo.save_streamed_document_async(
+                    original_url, part_path, file_name, size_in_bytes, file_hash.hexdigest(),
+                    writer.codec, writer.stored_size,
+                ))
+
+            except (httpx.TimeoutException, httpx.ReadError, httpx.RemoteProtocolError):
+                if self._limiter is not None:
+                    self._limiter.on_overload("timeout")
+                if attempt == DOWNLOAD_MAX_ATTEMPTS:
+                    break
+                retries += 1
+                count("retries")
+                RETRIES.inc()
+                await asyncio.sleep(self._retry_delay(attempt))
 
             except httpx.HTTPStatusError as e:
-                if e.response.status_code == 404:
-                    logger.warning(f"Файл не знайдено (404): {base_url}")
+                status_code = e.response.status_code
+                if status_code in RETRYABLE_STATUS_CODES:
+                    if self._limiter is not None:
+                        self._limiter.on_overload(f"http {status_code}")
+                    if attempt == DOWNLOAD_MAX_ATTEMPTS:
+                        break
+                    retries += 1
+                    count("retries")
+                    RETRIES.inc()
+                    await asyncio.sleep(self._retry_delay(attempt, e.response))
+                    continue
+
+                part_path.unlink(missing_ok=True)
+                if status_code == 416:
+                    # Сервер не прийняв Range — наступна спроба почне з нуля.
+                    file_hash = hashlib.sha256()
+                    size_in_bytes = 0
+                    continue
+                if status_code == 404:
+                    fail("404")
                     return "404"
-                elif e.response.status_code == 403:
-                    logger.warning(f"Доступ заборонено (403): {base_url}")
-                    return "failed"
-                else:
-                    logger.error(f"HTTP помилка завантаження файлу {base_url}: {e}", exc_info=True)
-                    return "failed"
+                fail(f"http {status_code}")
+                if 400 <= status_code < 500 and status_code not in TRANSIENT_CLIENT_STATUS_CODES:
+                    return "rejected"
+                return "failed"
 
             except Exception as e:
-                logger.error(f"Загальна помилка завантаження файлу {base_url}: {e}", exc_info=True)
+                part_path.unlink(missing_ok=True)
+                logger.error(f"Загальна помилка завантаження файлу {base_url}: {e}", exc_info=True, extra=RATE_LIMITED)
+                fail(type(e).__name__)
                 return "failed"
 
+        part_path.unlink(missing_ok=True)
+        fail(f"вичерпано {DOWNLOAD_MAX_ATTEMPTS} спроб")
+        return "failed"
+
     async def _run_all_downloads_async(
-        self, files_to_download: Set[Tuple], concurrency_limit: int = 10
-    ) -> Dict[str, int]:
+        self,
+        files_to_download: Iterable[Tuple] | AsyncIterable[Tuple],
+        concurrency_limit: int = 10,
+    ) -> Dict:
         """
         Асинхронно запускає всі завдання на завантаження з обмеженням паралелізму.
+        Один пулований httpx.AsyncClient спільний для всіх завдань запуску,
+        хешування і запис на диск виконуються в окремому пулі потоків,
+        рядки Documents записуються пачками через write-behind батчер.
         """
-        semaphore = asyncio.Semaphore(concurrency_limit)
-        stats = {"success": 0, "not_found": 0, "failed": 0}
+        io_executor = ThreadPoolExecutor(
+            max_workers=HASH_WRITE_WORKERS, thread_name_prefix=f"hash-write-{self.doc_type}"
+        )
+        try:
+            async with (
+                nullcontext(self.http_client) if self.http_client else create_async_client(self.token) as client,
+                self.document_repo.create_write_batcher() as batcher,
+            ):
+                self._write_batcher = batcher
+                self._io_executor = io_executor
+                try:
+                    return await self._run_downloads_with_client(
+                        client, files_to_download, concurrency_limit
+                    )
+                finally:
+                    self._write_batcher = None
+                    self._io_executor = None
+        finally:
+            io_executor.shutdown(wait=True)
 
-        async def semaphore_task_wrapper(base_url, original_url, file_name):
-            async with semaphore:
-                return await self._download_and_save_to_db_async(
-                    base_url, original_url, file_name
-                )
+    async def _run_downloads_with_client(
+        self,
+        client: httpx.AsyncClient,
+        files_to_download: Iterable[Tuple] | AsyncIterable[Tuple],
+        concurrency_limit: int,
+    ) -> Dict:
+        """
+        Стадія завантаження: фіксований пул воркерів бере файли з обмеженої
+        черги, яку лениво наповнює план (сканування). Кожен воркер перед
+        завантаженням захоплює слот адаптивного обмежувача (початковий ліміт —
+        concurrency_limit) та спільних обмежувачів з self.shared_limiters.
+        Кількість задач і пам'ять не залежать від кількості запланованих файлів:
+        повна черга зупиняє план, зайняті воркери — чергу. Завантажений файл
+        звільняє слоти одразу, а коміту його пачки чекає стадія завершення:
+        стан у стійкій черзі (DONE) і оренда змінюються лише після коміту.
+        """
+        limiter = self.adaptive_limiter or AdaptiveLimiter(
+            f"{self.company}/{self.doc_type}", initial=concurrency_limit
+        )
+        limiters = [limiter, *self.shared_limiters]
+        self._limiter = limiter
+        workers_count = limiter.max_limit
+        work_queue = asyncio.Queue(maxsize=workers_count * 2)
+        stats = {
+            "success": 0,
+            "not_found": 0,
+            "failed": 0,
+            "rejected": 0,
+            "retries": 0,
+            "files_retried": 0,
+            "bytes_resumed": 0,
+            "done_elsewhere": 0,
+            "leased_elsewhere": 0,
+            "failure_reasons": {},
+        }
+        total = len(files_to_download) if isinstance(files_to_download, Sized) else None
+        progress = tqdm(total=total, desc=f"Завантаження файлів {self.company}/{self.doc_type}")
+
+        async def dispatch(items: List[Tuple], defer: bool):
+            if self.lease_store is not None:
+                items = await self._claim_for_download(items, defer, stats)
+            for item in items:
+                await work_queue.put(item)
+                QUEUE_DEPTH.set(work_queue.qsize(), queue="work")
+
+        async def feed():
+            batch_size = CLUSTER_CLAIM_BATCH if self.lease_store is not None else 1
+            batch = []
+            try:
+                async for item in self._as_async_iter(files_to_download):
+                    if self.stopping:
+                        logger.info(f"[{self.company}/{self.doc_type}] Зупинка: нові файли не беруться")
+                        batch = []
+                        break
+                    batch.append(item)
+                    if len(batch) >= batch_size:
+                        await dispatch(batch, defer=True)
+                        batch = []
+                if batch:
+                    await dispatch(batch, defer=True)
+                if self.lease_store is not None and self._download_queue is not None:
+                    await drain_deferred()
+            finally:
+                for _ in range(workers_count):
+                    await work_queue.put(None)
+
+        async def drain_deferred():
+            """
+            Після своєї частки — посилання інших вузлів, які ті ще не зберегли
+            і не орендують (вузол зник або відстає): перехоплюємо їх.
+            """
+            await asyncio.to_thread(self._download_queue.flush)
+            batches = self._download_queue.iter_pending(CLUSTER_CLAIM_BATCH, state=DEFERRED)
+            while not self.stopping:
+                rows = await asyncio.to_thread(next, batches, None)
+                if rows is None:
+                    return
+                await dispatch([tuple(row) for row in rows], defer=False)
+
+        # Завантажені файли чекають коміту своєї пачки тут, а не в слоті завантаження.
+        completions: asyncio.Queue = asyncio.Queue()
+
+        def finish(base_url: str, original_url: str, result: str):
+            if result == "success":
+                stats["success"] += 1
+            elif result == "404":
+                stats["not_found"] += 1
+            else:
+                stats["failed"] += 1
+                if result == "rejected":
+                    stats["rejected"] += 1
+            FILES.inc(company=self.company, doc_type=self.doc_type, result=result)
+            if result != "success":
+                self.document_repo.forget_cached_link(original_url)
+            if self.lease_store is not None:
+                if result == "404":
+                    self.lease_store.mark_not_found(original_url)
+                else:
+                    self.lease_store.release(original_url)
+            if self._download_queue is not None:
+                self._download_queue.mark(original_url, QUEUE_STATES.get(result, FAILED))
+            progress.update(1)
+
+        async def worker():
+            while True:
+                item = await work_queue.get()
+                if item is None:
+                    return
+                QUEUE_DEPTH.set(work_queue.qsize(), queue="work")
+                base_url, original_url, file_name = item
+                for shared in limiters:
+                    await shared.acquire()
+                if self._download_queue is not None:
+                    self._download_queue.mark(original_url, IN_PROGRESS)
+                IN_FLIGHT.inc()
+                try:
+                    result = await self._download_async(
+                        client, base_url, original_url, file_name, stats
+                    )
+                except Exception as e:
+                    logger.error(f"Помилка у виконанні завдання: {e}", exc_info=True, extra=RATE_LIMITED)
+                    record_failure(stats, type(e).__name__, base_url)
+                    result = "failed"
+                finally:
+                    IN_FLIGHT.dec()
+                    for shared in reversed(limiters):
+                        shared.release()
+
+                if isinstance(result, str):
+                    finish(base_url, original_url, result)
+                else:
+                    completions.put_nowait((base_url, original_url, result))
+                    QUEUE_DEPTH.set(completions.qsize(), queue="completion")
+
+        async def run_workers():
+            try:
+                await asyncio.gather(*(worker() for _ in range(workers_count)))
+            finally:
+                completions.put_nowait(None)
 
-        tasks = []
-        for base_url, original_url, file_name in files_to_download:
-            tasks.append(semaphore_task_wrapper(base_url, original_url, file_name))
+        async def complete():
+            """Стадія завершення: результат файлу фіксується лише після коміту його пачки."""
+            while True:
+                item = await completions.get()
+                if item is None:
+                    return
+                base_url, original_url, pending = item
+                try:
+                    saved = await pending
+                except Exception as e:
+                    logger.error(f"Помилка збереження {base_url}: {e}", exc_info=True, extra=RATE_LIMITED)
+                    saved = False
+                finish(base_url, original_url, self._save_result(saved, base_url, stats))
+                QUEUE_DEPTH.set(completions.qsize(), queue="completion")
 
         logger.info(
-            f"Запускаємо {len(tasks)} паралельних завдань "
-            f"з обмеженням {concurrency_limit} одночасних завантажень..."
+            f"Запускаємо {workers_count} воркерів завантаження з адаптивним обмеженням "
+            f"(зараз {limiter.limit}, межі {limiter.min_limit}-{limiter.max_limit})..."
         )
 
-        for future in tqdm(
-            asyncio.as_completed(tasks),
-            total=len(tasks),
-            desc="Завантаження файлів",
-        ):
-            try:
-                result = await future
-                if result == "success":
-                    stats["success"] += 1
-                elif result == "404":
-                    stats["not_found"] += 1
-                else:
-                    stats["failed"] += 1
-            except Exception as e:
-                logger.error(f"Помилка у виконанні завдання: {e}", exc_info=True)
-                stats["failed"] += 1
-        
+        await asyncio.gather(feed(), run_workers(), complete())
+        progress.close()
+        self._limiter = None
+        stats["concurrency_limit"] = limiter.limit
+        stats["limit_changes"] = len(limiter.history)
         return stats
-    
-    def gather_documents(self, base_link: str, start_date: str, end_date: str):
-        documents = self.document_repo._fetch_data_from_db_by_date_range(
-            start_date, end_date, self.doc_type
+
+    async def _claim_for_download(self, items: List[Tuple], defer: bool, stats: Dict) -> List[Tuple]:
+        """
+        Захоплює оренди пачки (download_url, link, file_name) і повертає ті,
+        що має завантажити цей вузол. defer=True: посилання, які за хешем
+        належать іншому живому вузлу, відкладаються у стійкій черзі (DEFERRED)
+        до кінця проходу. Вже збережені іншими вузлами (або 404 у них) позначаються DONE,
+        орендовані ними — DEFERRED: watermark лишається перед ними, доки
+        вони не з'являться в БД.
+        """
+        download_queue = self._download_queue
+        if defer and download_queue is not None:
+            own = []
+            for item in items:
+                if self.lease_store.is_owner(item[1]):
+                    own.append(item)
+                else:
+                    download_queue.mark(item[1], DEFERRED)
+            items = own
+        if not items:
+            return []
+
+        claimed, stored, leased = await asyncio.to_thread(
+            self.lease_store.claim, [item[1] for item in items]
         )
+        stats["done_elsewhere"] += len(stored)
+        for link in stored:
+            if download_queue is not None:
+                download_queue.mark(link, DONE)
+        for link in leased:
+            self.document_repo.forget_cached_link(link)
+            if download_queue is not None:
+                download_queue.mark(link, DEFERRED)
+        if not defer or download_queue is None:
+            stats["leased_elsewhere"] += len(leased)
+        claimed = set(claimed)
+        return [item for item in items if item[1] in claimed]
 
-        if not documents:
-            logger.warning(
-                f"Не знайдено документів типу '{self.doc_type}' за вказаний період."
-            )
-            return
-        
-        logger.info("Завантажуємо існуючі посилання з бази даних...")
-        existing_links_set = self.document_repo.get_existing_links_set()
-        logger.info(f"Завантажено {len(existing_links_set)} існуючих унікальних посилань.")
-
-        files_in_db_count = 0
-        all_attachments_count = 0
-        files_to_download = set()
-        
-        logger.info(f"Знайдено {len(documents)} документів. Починаємо обробку...")
-
-        for doc in tqdm(documents, desc="Обробка документів"):
-            if self.doc_type == "data":
-                doc_id = doc.get("DocumentId")
-            else:
-                doc_id = doc.get("id")
-            if not doc_id:
+    @staticmethod
+    async def _as_async_iter(items: Iterable | AsyncIterable) -> AsyncIterator:
+        if isinstance(items, AsyncIterable):
+            async for item in items:
+                yield item
+        else:
+            for item in items:
+                yield item
+
+    def _watermark_since(self, full_rescan: bool):
+        """
+        Нижня межа updatedAt для інкрементального запуску: збережений watermark
+        мінус перекриття. None означає повне сканування вказаного періоду.
+        """
+        if full_rescan:
+            logger.info(f"Повне сканування '{self.doc_type}' для {self.company} (watermark ігнорується).")
+            return None
+        watermark = self.document_repo.get_watermark(self.doc_type)
+        if watermark is None:
+            return None
+        last_updated_at, last_id = watermark
+        since = last_updated_at - timedelta(minutes=SYNC_WATERMARK_OVERLAP_MINUTES)
+        logger.info(
+            f"Інкрементальний запуск '{self.doc_type}' для {self.company}: "
+            f"watermark {last_updated_at} (id={last_id}), скануємо з {since}"
+        )
+        return since
+
+    def _use_link_projection(self) -> bool:
+        """
+        SOURCE_QUERY_MODE=links — читати з джерела лише посилання (розбір JSON
+        на сервері), якщо діалект це підтримує; full — повні рядки, як раніше.
+        """
+        if SOURCE_QUERY_MODE != "links":
+            return False
+        if not self.document_repo.supports_link_projection():
+            logger.info("Діалект джерела не підтримує розбір посилань на сервері — читаємо повні рядки.")
+            return False
+        return True
+
+    def _load_existing_links(self) -> LinkIndex:
+        with timed("existing_links"):
+            return self.document_repo.get_existing_links_index()
+
+    def _plan_manifest_chunk(self, chunk: Dict, existing_links: LinkIndex, scan: Dict) -> List[Tuple]:
+        """
+        Зводить результат ManifestBuilder у статистику сканування і відсіює
+        посилання, які вже є в БД (або вже заплановані в цьому запуску).
+        """
+        STAGE_SECONDS.observe(chunk["elapsed"], stage="manifest")
+        scan["documents"] += chunk["documents"]
+        scan["attachments"] += chunk["attachments"]
+        if chunk["last_row_key"] is not None and (
+            scan["last_row_key"] is None or chunk["last_row_key"] > scan["last_row_key"]
+        ):
+            scan["last_row_key"] = chunk["last_row_key"]
+        # Окремі документи — лише в DEBUG, у підсумку запуску — кількості.
+        for doc_id, attachNum_log in chunk["missing_link"]:
+            logger.debug(f"no link in {doc_id=} {attachNum_log=} found, skipping...", extra=RATE_LIMITED)
+        for doc_id in chunk["no_attachments"]:
+            logger.debug(f"No attachments found for document ID {doc_id}.", extra=RATE_LIMITED)
+        scan["missing_link"] = scan.get("missing_link", 0) + len(chunk["missing_link"])
+        scan["no_attachments"] = scan.get("no_attachments", 0) + len(chunk["no_attachments"])
+
+        planned = []
+        for record in chunk["records"]:
+            link = record[1]
+            if link in existing_links:
+                scan["in_db"] += 1
                 continue
+            existing_links.add(link)
+            planned.append(record)
+        scan["planned"] += len(planned)
+        return planned
 
-            if self.doc_type == "data":
-                attachments = [json.loads(doc.get("originalText"))]
-            else:
-                attachments = json.loads(doc.get("attachments"))
-
-            if attachments:
-                all_attachments_count += len(attachments)
-                for attachment in attachments:
-                    link = attachment.get("link")
-                    if not link:
-                        attachNum_log = attachment.get("attachNum", "N/A")
-                        logger.warning(f"no link in {doc_id=} {attachNum_log=} found, skipping...")
-                        continue
+    def _scan_and_plan_sync(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        queue: asyncio.Queue,
+        base_link: str,
+        start_date: str,
+        end_date: str,
+        since,
+        existing_links: LinkIndex,
+        scan: Dict,
+        download_queue: DownloadQueue,
+        resume_only: bool,
+        abort: threading.Event,
+    ):
+        """
+        Виконується в окремому потоці: спершу віддає незавершені записи
+        стійкої черги з попереднього запуску, потім (якщо resume_only=False)
+        читає джерело пачками, розбір JSON яких розподіляється по пулу
+        процесів (ManifestBuilder). Кожна пачка фіксується у стійкій черзі і лише
+        потім кладеться в обмежену чергу циклу подій (з backpressure).
+        Наприкінці завжди кладе None як ознаку завершення. abort — стадія
+        завантаження завершилась (зокрема з помилкою): нові файли не кладуться.
+        """
 
-                    if link in existing_links_set:
-                        files_in_db_count += 1
+        def put(item):
+            if item is not None and (self.stopping or abort.is_set()):
+                raise ScanStopped()
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        try:
+            for rows in download_queue.iter_pending():
+                for download_url, link, file_name in rows:
+                    if link in existing_links:
+                        download_queue.mark(link, DONE)
                         continue
-                    
-                    existing_links_set.add(link)
-                    ext = Path(link).suffix
-                    attachNum = ""
-                    
-                    if self.doc_type != "data":
-                        attachNum = attachment.get("attachNum")
-                        file_name = f"{doc_id}-{attachNum}"
-                    else:
-                        file_name = f"{doc_id}"
-                    file_name += ext
-                    files_to_download.add(
-                        (f"{base_link}storage/file/{link}", link, file_name)
+                    existing_links.add(link)
+                    scan["resumed"] += 1
+                    put((download_url, link, file_name))
+            if scan["resumed"]:
+                logger.info(f"З черги попереднього запуску продовжено {scan['resumed']} файлів")
+            if resume_only:
+                return
+
+            projected = self._use_link_projection()
+            iter_source = (
+                self.document_repo.iter_links_from_db_by_date_range
+                if projected
+                else self.document_repo.iter_data_from_db_by_date_range
+            )
+            batches = timed_iter(iter_source(start_date, end_date, self.doc_type, since=since), "source_scan")
+            with ManifestBuilder(
+                self.doc_type, base_link, 0 if projected else MANIFEST_WORKERS, MANIFEST_CHUNK_SIZE
+            ) as manifest:
+                chunks = manifest.iter_link_results(batches) if projected else manifest.iter_results(batches)
+                for chunk in chunks:
+                    planned = self._plan_manifest_chunk(chunk, existing_links, scan)
+                    download_queue.add_planned(planned)
+                    for download_url, link, file_name, _ in planned:
+                        put((download_url, link, file_name))
+                    logger.info(
+                        f"Оброблено {scan['documents']} документів, "
+                        f"заплановано {scan['planned']} файлів"
                     )
+            download_queue.mark_scan_complete(scan["last_row_key"])
+        except ScanStopped as e:
+            # Незавантажене лишається в стійкій черзі, watermark не просувається.
+            scan["error"] = e
+            logger.info(f"Сканування '{self.doc_type}' для {self.company} зупинено")
+        except Exception as e:
+            scan["error"] = e
+            logger.error(f"Помилка читання джерела '{self.doc_type}': {e}", exc_info=True)
+        finally:
+            put(None)
+
+    async def _gather_documents_async(
+        self,
+        base_link: str,
+        start_date: str,
+        end_date: str,
+        since,
+        existing_links: LinkIndex,
+        scan: Dict,
+        concurrency_limit: int,
+        download_queue: DownloadQueue,
+        resume_only: bool,
+    ) -> Dict:
+        """
+        Сканування джерела та завантаження працюють одночасно:
+        перші файли завантажуються ще до завершення сканування.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=PLAN_QUEUE_SIZE)
+
+        scan_finished = False
+
+        async def planned_files():
+            nonlocal scan_finished
+            while True:
+                item = await queue.get()
+                if item is None:
+                    scan_finished = True
+                    return
+                yield item
+
+        abort = threading.Event()
+        scan_task = asyncio.create_task(
+            asyncio.to_thread(
+                self._scan_and_plan_sync,
+                loop, queue, base_link, start_date, end_date, since, existing_links, scan,
+                download_queue, resume_only, abort,
+            )
+        )
+        self._download_queue = download_queue
+        try:
+            return await self._run_all_downloads_async(planned_files(), concurrency_limit=concurrency_limit)
+        finally:
+            self._download_queue = None
+            # Черга вже не читається (зупинка або помилка завантаження) — дочитуємо до None,
+            # щоб потік сканування не лишився заблокованим на put.
+            abort.set()
+            while not scan_finished and await queue.get() is not None:
+                pass
+            await scan_task
+
+    def gather_documents(
+        self, base_link: str, start_date: str, end_date: str, full_rescan: bool = False
+    ) -> Dict:
+        return asyncio.run(
+            self.gather_documents_async(base_link, start_date, end_date, full_rescan)
+        )
+
+    async def gather_documents_async(
+        self,
+        base_link: str,
+        start_date: str,
+        end_date: str,
+        full_rescan: bool = False,
+        concurrency_limit: int = 10,
+    ) -> Dict:
+        """
+        Повний прохід одного типу документів однієї компанії.
+        Блокуючі звернення до БД виконуються в потоках, тож кілька проходів
+        можуть працювати одночасно в одному циклі подій.
+        Повертає підсумкову статистику проходу.
+        """
+        started = time()
+        summary = {
+            "company": self.company,
+            "doc_type": self.doc_type,
+            "documents": 0,
+            "planned": 0,
+            "success": 0,
+            "not_found": 0,
+            "failed": 0,
+            "retries": 0,
+            "files_retried": 0,
+            "bytes_resumed": 0,
+            "done_elsewhere": 0,
+            "leased_elsewhere": 0,
+            "concurrency_limit": None,
+            "duration": 0.0,
+        }
+        download_queue = await asyncio.to_thread(DownloadQueue, self.download_queue_path())
+        try:
+            return await self._gather_with_queue(
+                base_link, start_date, end_date, full_rescan, concurrency_limit,
+                download_queue, summary, started,
+            )
+        finally:
+            await asyncio.to_thread(download_queue.close)
+
+    def download_queue_path(self) -> Path:
+        return download_queue_path(self.document_repo.folder, self.doc_type)
+
+    async def _gather_with_queue(
+        self,
+        base_link: str,
+        start_date: str,
+        end_date: str,
+        full_rescan: bool,
+        concurrency_limit: int,
+        download_queue: DownloadQueue,
+        summary: Dict,
+        started: float,
+    ) -> Dict:
+        recovered = await asyncio.to_thread(download_queue.recover)
+        if recovered:
+            logger.warning(f"Після збою повернуто у чергу {recovered} незавершених файлів")
+        pending = await asyncio.to_thread(download_queue.count_pending)
+        scan_complete = await asyncio.to_thread(download_queue.scan_complete)
+        # Сканування попереднього запуску завершилось — достатньо доробити чергу.
+        resume_only = not full_rescan and scan_complete and pending > 0
+
+        since = None
+        if not resume_only:
+            since = await asyncio.to_thread(self._watermark_since, full_rescan)
+        else:
+            logger.info(
+                f"[{self.company}/{self.doc_type}] Продовжуємо {pending} файлів зі стійкої черги "
+                f"без повторного сканування джерела"
+            )
+
+        logger.info(f"Завантажуємо існуючі посилання з бази даних ({self.company})...")
+        existing_links = await asyncio.to_thread(self._load_existing_links)
+        logger.info(f"Завантажено {len(existing_links)} існуючих унікальних посилань.")
+
+        scan = {
+            "documents": 0,
+            "attachments": 0,
+            "in_db": 0,
+            "planned": 0,
+            "resumed": 0,
+            "last_row_key": None,
+            "error": None,
+        }
+        stats = await self._gather_documents_async(
+            base_link, start_date, end_date, since, existing_links, scan, concurrency_limit,
+            download_queue, resume_only,
+        )
+        await asyncio.to_thread(download_queue.flush)
+        summary.update(
+            documents=scan["documents"],
+            planned=scan["planned"] + scan["resumed"],
+            success=stats["success"],
+            not_found=stats["not_found"],
+            failed=stats["failed"],
+            retries=stats["retries"],
+            files_retried=stats["files_retried"],
+            bytes_resumed=stats["bytes_resumed"],
+            done_elsewhere=stats["done_elsewhere"],
+            leased_elsewhere=stats["leased_elsewhere"],
+            concurrency_limit=stats.get("concurrency_limit"),
+            failure_reasons=stats.get("failure_reasons", {}),
+            duration=time() - started,
+        )
+
+        if scan["error"] is None:
+            # Наступний запуск почне з найранішого рядка з невдалим (не відхиленим) завантаженням.
+            failed_key = await asyncio.to_thread(download_queue.min_failed_row_key)
+            if resume_only:
+                last_row_key = await asyncio.to_thread(download_queue.last_row_key)
             else:
-                logger.warning(f"No attachments found for document ID {doc_id}.")
+                last_row_key = scan["last_row_key"]
+            await asyncio.to_thread(self._advance_watermark, failed_key or last_row_key)
+            if await asyncio.to_thread(download_queue.count_pending) == 0:
+                pruned = await asyncio.to_thread(download_queue.prune)
+                logger.info(f"Зі стійкої черги видалено {pruned} завершених записів")
 
-        logger.info(f"Всього attachments {all_attachments_count}")
-        logger.info(f"Всього знайдено в бд {files_in_db_count} по посиланнях")
-        logger.info(f"Всього посилань на файли {len(files_to_download)} для завантаження")
+        if not scan["documents"] and not scan["resumed"]:
+            logger.warning(
+                f"Не знайдено документів типу '{self.doc_type}' за вказаний період."
+            )
+            return summary
 
-        if not files_to_download:
-            logger.info("Немає нових файлів для завантаження.")
-            return
+        logger.info(f"[{self.company}/{self.doc_type}] Всього документів {scan['documents']}")
+        logger.info(f"[{self.company}/{self.doc_type}] Всього attachments {scan['attachments']}")
+        if scan.get("missing_link") or scan.get("no_attachments"):
+            logger.warning(
+                f"[{self.company}/{self.doc_type}] Вкладень без посилання: {scan.get('missing_link', 0)}, "
+                f"документів без вкладень: {scan.get('no_attachments', 0)}"
+            )
+        logger.info(f"[{self.company}/{self.doc_type}] Всього знайдено в бд {scan['in_db']} по посиланнях")
+        logger.info(f"[{self.company}/{self.doc_type}] Всього посилань на файли {scan['planned']} для завантаження")
 
-        stats = asyncio.run(self._run_all_downloads_async(files_to_download, concurrency_limit=10))
+        if not scan["planned"] and not scan["resumed"]:
+            logger.info("Немає нових файлів для завантаження.")
+            return summary
 
         # --- Логування результатів ---
         files_not_saved = stats["failed"] + stats["not_found"]
         files_not_saved_404 = stats["not_found"]
 
-        logger.info("--- Результати завантаження ---")
+        logger.info(f"--- Результати завантаження {self.company}/{self.doc_type} ---")
         logger.info(f"Успішно завантажено: {stats['success']}")
         logger.info(f"Не збережених файлів {files_not_saved} усього")
         logger.info(f"  - з них не знайдено (404): {files_not_saved_404}")
         logger.info(f"  - з них інші помилки: {stats['failed']}")
+        if stats["rejected"]:
+            logger.warning(
+                f"  - з них остаточно відхилено сервером (4xx): {stats['rejected']} — "
+                f"watermark їх не чекає, повторно не плануються"
+            )
+        logger.info(
+            f"Повторних спроб: {stats['retries']} (файлів з повторами: {stats['files_retried']}), "
+            f"докачано без повторного завантаження: {stats['bytes_resumed']} байт"
+        )
+        if self.lease_store is not None:
+            logger.info(
+                f"Інші вузли: вже зберегли {stats['done_elsewhere']}, "
+                f"ще завантажують {stats['leased_elsewhere']} (перевіримо в наступному проході)"
+            )
+        log_failure_reasons(stats)
         logger.info("---------------------------------")
+        return summary
 
-
-
+    def _advance_watermark(self, row_key):
+        if row_key is None:
+            return
+        last_updated_at, last_id = row_key
+        if not self.document_repo.set_watermark(self.doc_type, last_updated_at, last_id):
+            logger.warning(
+                f"Watermark '{self.doc_type}' для {self.company} не збережено — "
+                f"наступний запуск почне з попереднього"
+            )
+            return
+        logger.info(f"Watermark '{self.doc_type}' для {self.company}: {last_updated_at} (id={last_id})")
@@ -0,0 +1,61 @@
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.config import (
+    HTTP2_ENABLED,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_TIMEOUT,
+)
+from config.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_async_client(token: str) -> httpx.AsyncClient:
+    """
+    Створює довгоживучий httpx.AsyncClient з пулом з'єднань та keep-alive.
+    Один клієнт на запуск сервісу (токен), спільний для всіх завдань.
+    """
+    http2 = HTTP2_ENABLED
+    if http2 and not _http2_available():
+        logger.warning("HTTP2_ENABLED=true, але пакет 'h2' не встановлено. Використовуємо HTTP/1.1.")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=httpx.Timeout(HTTP_TIMEOUT),
+        limits=limits,
+        http2=http2,
+        follow_redirects=True,
+    )
+
+
+def create_sync_session(token: str) -> requests.Session:
+    """
+    Створює requests.Session з пулом з'єднань для синхронних запитів.
+    """
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {token}"
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        pool_maxsize=HTTP_MAX_CONNECTIONS,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
@@ -0,0 +1,114 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from sqlalchemy import bindparam, update
+
+from config.config import (
+    LAYOUT_MIGRATION_BATCH_SIZE,
+    LAYOUT_MIGRATION_WORKERS,
+    STORAGE_SHARD_LEVELS,
+    STORAGE_SHARD_WIDTH,
+)
+from config.logger import RATE_LIMITED, get_logger
+from database.database import SessionLocal
+from database.models import Documents
+from utils.file_layout import sharded_relative_path
+
+logger = get_logger(__name__)
+
+
+def _iter_flat_batches(folder: Path, batch_size: int) -> Iterator[List[str]]:
+    """Імена файлів, що лежать у корені папки (без .part і службових файлів)."""
+    batch = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.startswith(".") or entry.name.endswith(".part"):
+                continue
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            batch.append(entry.name)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _update_local_paths(moves: List[Tuple[str, str]]) -> int:
+    """Одним executemany переводить local_path з плоского імені на шардований шлях."""
+    table = Documents.__table__
+    statement = (
+        update(table)
+        .where(table.c.local_path == bindparam("old_path"))
+        .values(local_path=bindparam("new_path"))
+    )
+    session = SessionLocal()
+    try:
+        result = session.execute(
+            statement, [{"old_path": old, "new_path": new} for old, new in moves]
+        )
+        session.commit()
+        return result.rowcount
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def _move(folder: Path, old: str, new: str) -> bool:
+    target = folder / new
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(folder / old, target)
+        return True
+    except FileNotFoundError:
+        # Вже перенесено паралельним або попереднім запуском.
+        return target.exists()
+    except OSError as e:
+        logger.error(f"! Не вдалося перенести {old} -> {new}: {e}", extra=RATE_LIMITED)
+        return False
+
+
+def migrate_flat_folder(
+    folder,
+    levels: int = STORAGE_SHARD_LEVELS,
+    width: int = STORAGE_SHARD_WIDTH,
+    workers: int = LAYOUT_MIGRATION_WORKERS,
+    batch_size: int = LAYOUT_MIGRATION_BATCH_SIZE,
+) -> Dict[str, int]:
+    """
+    Переносить файли з кореня плоскої папки компанії у шардовану структуру.
+    Пачками: спершу оновлюються local_path у БД (один коміт на пачку),
+    потім файли переносяться паралельно в пулі потоків. Якщо процес
+    перервано між комітом і перенесенням, файли лишаються в корені і
+    наступний запуск перенесе їх (повторне оновлення БД нічого не змінить),
+    тож міграцію можна перезапускати і виконувати поряд із завантаженням.
+    """
+    folder = Path(folder)
+    stats = {"files": 0, "moved": 0, "failed": 0, "rows_updated": 0}
+    if levels <= 0:
+        logger.info("STORAGE_SHARD_LEVELS=0 — плоска структура, переносити нічого.")
+        return stats
+    if not folder.is_dir():
+        logger.warning(f"Папка {folder} не існує, пропускаємо.")
+        return stats
+
+    logger.info(f"Міграція {folder} у {levels} рівні шардів ({workers} потоків)...")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="layout-migration") as pool:
+        for names in _iter_flat_batches(folder, batch_size):
+            moves = [(name, sharded_relative_path(name, levels, width)) for name in names]
+            stats["rows_updated"] += _update_local_paths(moves)
+            results = list(pool.map(lambda move: _move(folder, *move), moves))
+            moved = sum(results)
+            stats["files"] += len(moves)
+            stats["moved"] += moved
+            stats["failed"] += len(moves) - moved
+            logger.info(
+                f"{folder}: перенесено {stats['moved']} файлів, "
+                f"оновлено {stats['rows_updated']} рядків, помилок {stats['failed']}"
+            )
+    logger.info(f"Міграцію {folder} завершено: {stats}")
+    return stats
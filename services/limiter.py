@@ -0,0 +1,110 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from config.config import (
+    ADAPTIVE_COOLDOWN_SECONDS,
+    ADAPTIVE_DECREASE_FACTOR,
+    ADAPTIVE_LATENCY_TOLERANCE,
+    DOWNLOAD_CONCURRENCY_INITIAL,
+    DOWNLOAD_CONCURRENCY_MAX,
+    DOWNLOAD_CONCURRENCY_MIN,
+)
+from config.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class AdaptiveLimiter:
+    """
+    Адаптивний обмежувач паралелізму (AIMD) з інтерфейсом семафора.
+
+    Поки затримка до першого байта (TTFB) тримається біля базової,
+    ліміт росте на ~1 за "раунд" (limit успішних відповідей).
+    На таймаутах, 429 та 5xx ліміт множиться на decrease_factor —
+    не частіше, ніж раз на cooldown секунд, щоб одна хвиля помилок
+    не обвалила його до мінімуму.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int = DOWNLOAD_CONCURRENCY_INITIAL,
+        min_limit: int = DOWNLOAD_CONCURRENCY_MIN,
+        max_limit: int = DOWNLOAD_CONCURRENCY_MAX,
+        decrease_factor: float = ADAPTIVE_DECREASE_FACTOR,
+        latency_tolerance: float = ADAPTIVE_LATENCY_TOLERANCE,
+        cooldown: float = ADAPTIVE_COOLDOWN_SECONDS,
+    ):
+        self.name = name
+        self.min_limit = min(min_limit, max_limit)
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self._limit = float(min(max(initial, self.min_limit), max_limit))
+        self._in_flight = 0
+        self._condition = asyncio.Condition()
+        self._baseline_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        # (час, новий ліміт, причина) — для налаштування та підсумку
+        self.history: Deque[Tuple[float, int, str]] = deque(maxlen=1000)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    def release(self):
+        self._in_flight -= 1
+        asyncio.get_running_loop().create_task(self._notify())
+
+    async def _notify(self):
+        async with self._condition:
+            self._condition.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+    def on_success(self, latency: Optional[float] = None):
+        """Успішна відповідь; latency — TTFB у секундах."""
+        if latency is not None:
+            if self._baseline_latency is None or latency < self._baseline_latency:
+                self._baseline_latency = latency
+            else:
+                # Повільно "забуваємо" мінімум, щоб базова лінія стежила за мережею.
+                self._baseline_latency = 0.99 * self._baseline_latency + 0.01 * latency
+            if latency > self._baseline_latency * self.latency_tolerance:
+                return
+        if self._limit < self.max_limit:
+            self._set_limit(min(self.max_limit, self._limit + 1 / max(self._limit, 1)), "increase")
+
+    def on_overload(self, reason: str):
+        """Таймаут, 429 або 5xx — мультиплікативне зменшення ліміту."""
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self._set_limit(max(self.min_limit, self._limit * self.decrease_factor), reason)
+
+    def _set_limit(self, new_limit: float, reason: str):
+        old = self.limit
+        self._limit = new_limit
+        if self.limit != old:
+            self.history.append((time.time(), self.limit, reason))
+            logger.info(f"[limiter {self.name}] ліміт {old} -> {self.limit} ({reason})")
+            if self.limit > old:
+                asyncio.get_running_loop().create_task(self._notify())
@@ -0,0 +1,227 @@
+"""
+Побудова маніфесту вкладень (download_url, link, file_name) з рядків-джерел
+у пулі процесів. Модуль навмисно легкий (без config/БД), бо імпортується
+дочірніми процесами.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import deque
+from pathlib import Path
+from time import perf_counter
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+
+    _json_loads = json.loads
+
+_pool_lock = threading.Lock()
+_shared_pool: Optional[ProcessPoolExecutor] = None
+
+
+def pool_context():
+    """
+    Контекст процесів для пулів збирача: forkserver (spawn, де його немає),
+    а не fork — процес на цей момент уже багатопотоковий (слухач логу, пули).
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+def shared_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Один пул на процес: створюється при першому проході і живе між проходами
+    та циклами демона (див. pool_context).
+    """
+    global _shared_pool
+    with _pool_lock:
+        if _shared_pool is None:
+            _shared_pool = ProcessPoolExecutor(max_workers=workers, mp_context=pool_context())
+        return _shared_pool
+
+
+def shutdown_pool():
+    """Зупиняє спільний пул; наступний прохід створить новий."""
+    global _shared_pool
+    with _pool_lock:
+        pool, _shared_pool = _shared_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def project_row(doc: Dict, doc_type: str) -> Tuple:
+    """Лише потрібні поля — менше даних передається між процесами."""
+    if doc_type == "data":
+        return doc.get("DocumentId"), doc.get("updatedAt"), doc.get("originalText")
+    return doc.get("id"), doc.get("updatedAt"), doc.get("attachments")
+
+
+def build_chunk(rows: List[Tuple], doc_type: str, base_link: str) -> Dict:
+    """
+    Розбирає пачку спроєктованих рядків (doc_id, updatedAt, payload).
+    Фільтрація за існуючими посиланнями лишається батьківському процесу,
+    тож порядок записів зберігається.
+    """
+    started = perf_counter()
+    records = []
+    missing_link = []
+    no_attachments = []
+    documents = 0
+    attachments_count = 0
+    last_row_key = None
+
+    for doc_id, updated_at, payload in rows:
+        documents += 1
+        if not doc_id:
+            continue
+        row_key = (updated_at, doc_id)
+        if updated_at is not None and (last_row_key is None or row_key > last_row_key):
+            last_row_key = row_key
+
+        if doc_type == "data":
+            attachments = [_json_loads(payload)]
+        else:
+            attachments = _json_loads(payload)
+
+        if not attachments:
+            no_attachments.append(doc_id)
+            continue
+
+        attachments_count += len(attachments)
+        for attachment in attachments:
+            link = attachment.get("link")
+            if not link:
+                missing_link.append((doc_id, attachment.get("attachNum", "N/A")))
+                continue
+
+            ext = Path(link).suffix
+            if doc_type != "data":
+                file_name = f"{doc_id}-{attachment.get('attachNum')}{ext}"
+            else:
+                file_name = f"{doc_id}{ext}"
+            records.append((f"{base_link}storage/file/{link}", link, file_name, row_key))
+
+    return {
+        "records": records,
+        "documents": documents,
+        "attachments": attachments_count,
+        "missing_link": missing_link,
+        "no_attachments": no_attachments,
+        "last_row_key": last_row_key,
+        "elapsed": perf_counter() - started,
+    }
+
+
+def build_links_chunk(rows: List[Dict], doc_type: str, base_link: str) -> Dict:
+    """
+    Те саме, що build_chunk, для рядків, у яких посилання вже витягнуто
+    на сервері (DocumentRepository.iter_links_from_db_by_date_range):
+    по рядку на вкладення, JSON не розбирається. Документ рахується за
+    першим вкладенням (attachment_ord 0) або рядком без вкладень, тож
+    документ, розділений між пачками, не рахується двічі.
+    """
+    started = perf_counter()
+    records = []
+    missing_link = []
+    no_attachments = []
+    documents = 0
+    attachments_count = 0
+    last_row_key = None
+
+    for row in rows:
+        doc_id, updated_at, attachment_ord = row["doc_id"], row["updatedAt"], row["attachment_ord"]
+        if attachment_ord is None or attachment_ord == 0:
+            documents += 1
+        if not doc_id:
+            continue
+        row_key = (updated_at, doc_id)
+        if updated_at is not None and (last_row_key is None or row_key > last_row_key):
+            last_row_key = row_key
+
+        if attachment_ord is None:
+            no_attachments.append(doc_id)
+            continue
+
+        attachments_count += 1
+        link = row["link"]
+        if not link:
+            attach_num = row["attachNum"]
+            missing_link.append((doc_id, "N/A" if attach_num is None else attach_num))
+            continue
+
+        ext = Path(link).suffix
+        if doc_type != "data":
+            file_name = f"{doc_id}-{row['attachNum']}{ext}"
+        else:
+            file_name = f"{doc_id}{ext}"
+        records.append((f"{base_link}storage/file/{link}", link, file_name, row_key))
+
+    return {
+        "records": records,
+        "documents": documents,
+        "attachments": attachments_count,
+        "missing_link": missing_link,
+        "no_attachments": no_attachments,
+        "last_row_key": last_row_key,
+        "elapsed": perf_counter() - started,
+    }
+
+
+class ManifestBuilder:
+    """
+    Розподіляє пачки рядків-джерел по спільному пулу процесів (shared_pool)
+    і віддає результати build_chunk у вихідному порядку, тримаючи в роботі
+    не більше workers * 2 частин. workers=0 — розбір у поточному потоці.
+    """
+
+    def __init__(self, doc_type: str, base_link: str, workers: int, chunk_size: int):
+        self.doc_type = doc_type
+        self.base_link = base_link
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._in_flight: Deque[Future] = deque()
+
+    def __enter__(self) -> "ManifestBuilder":
+        if self.workers > 0:
+            self._pool = shared_pool(self.workers)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Пул спільний: скасовуємо лише свої частини, а зламаний пул замінюємо.
+        while self._in_flight:
+            self._in_flight.popleft().cancel()
+        if isinstance(exc_value, BrokenProcessPool):
+            shutdown_pool()
+        self._pool = None
+
+    def _chunks(self, batches: Iterable[List[Dict]]) -> Iterator[List[Tuple]]:
+        for batch in batches:
+            rows = [project_row(doc, self.doc_type) for doc in batch]
+            for start in range(0, len(rows), self.chunk_size):
+                yield rows[start:start + self.chunk_size]
+
+    def iter_results(self, batches: Iterable[List[Dict]]) -> Iterator[Dict]:
+        if self._pool is None:
+            for rows in self._chunks(batches):
+                yield build_chunk(rows, self.doc_type, self.base_link)
+            return
+
+        in_flight = self._in_flight
+        for rows in self._chunks(batches):
+            in_flight.append(self._pool.submit(build_chunk, rows, self.doc_type, self.base_link))
+            if len(in_flight) >= self.workers * 2:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+    def iter_link_results(self, batches: Iterable[List[Dict]]) -> Iterator[Dict]:
+        """Для пачок з уже витягнутими посиланнями: розбирати нічого, пул не потрібен."""
+        for batch in batches:
+            yield build_links_chunk(batch, self.doc_type, self.base_link)
@@ -0,0 +1,132 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from config.config import GLOBAL_DOWNLOAD_CONCURRENCY, TOKEN_DOWNLOAD_CONCURRENCY
+from config.logger import get_logger
+from services.cluster import cluster_membership, create_lease_store
+from services.documents import DocumentService
+from services.limiter import AdaptiveLimiter
+
+logger = get_logger(__name__)
+
+
+def collection_window(now: Optional[datetime] = None) -> Tuple[str, str]:
+    """
+    Період збору: з далекого минулого до «зараз» з невеликим запасом.
+    Нижню межу на практиці задає watermark кожного проходу.
+    """
+    now = now or datetime.now(timezone.utc)
+    start_date = (now - timedelta(weeks=5000, hours=24, seconds=10)).isoformat()
+    end_date = (now + timedelta(seconds=10)).isoformat()
+    return start_date, end_date
+
+
+def prepare_pipelines(
+    services: List[DocumentService],
+    global_limit: int = GLOBAL_DOWNLOAD_CONCURRENCY,
+    per_token_limit: int = TOKEN_DOWNLOAD_CONCURRENCY,
+):
+    """
+    Налаштовує спільні ресурси проходів: пул потоків циклу подій, глобальну
+    стелю завантажень і окремий адаптивний ліміт на кожен токен (спільний для
+    проходів data і party одного токена) зі стелею per_token_limit — він
+    починається з DOWNLOAD_CONCURRENCY_INITIAL і не перевищує цю стелю,
+    а за заданого CLUSTER_NODE_ID — сховище оренд вузла (repo/leases.py).
+    Викликається один раз на цикл подій — обмежувачі зберігають стан між циклами демона.
+    """
+    loop = asyncio.get_running_loop()
+    # Кожен прохід тримає потік сканування і потоки запису в БД.
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=max(8, 3 * len(services) + 4)))
+
+    global_limiter = asyncio.Semaphore(global_limit)
+    # Один вузол кластера на процес: спільне сховище оренд для всіх проходів.
+    lease_store = create_lease_store()
+    token_limiters: Dict[str, AdaptiveLimiter] = {}
+    for service in services:
+        if service.token not in token_limiters:
+            token_limiters[service.token] = AdaptiveLimiter(service.company, max_limit=per_token_limit)
+        service.adaptive_limiter = token_limiters[service.token]
+        service.shared_limiters = [global_limiter]
+        service.lease_store = lease_store
+
+    logger.info(
+        f"Запускаємо {len(services)} проходів одночасно: глобальний ліміт {global_limit}, "
+        f"стеля адаптивного ліміту на токен {per_token_limit}"
+    )
+
+
+async def run_cycle(
+    services: List[DocumentService],
+    base_link: str,
+    start_date: str,
+    end_date: str,
+    full_rescan: bool = False,
+    per_token_limit: int = TOKEN_DOWNLOAD_CONCURRENCY,
+) -> List[Dict]:
+    """Один прохід усіх (token, doc_type) одночасно в одному циклі подій."""
+
+    async def run_one(service: DocumentService) -> Dict:
+        try:
+            return await service.gather_documents_async(
+                base_link,
+                start_date=start_date,
+                end_date=end_date,
+                full_rescan=full_rescan,
+                concurrency_limit=per_token_limit,
+            )
+        except Exception as e:
+            logger.critical(
+                f"Критична помилка проходу {service.company}/{service.doc_type}: {e}", exc_info=True
+            )
+            return {"company": service.company, "doc_type": service.doc_type, "error": str(e)}
+
+    lease_store = next((service.lease_store for service in services if service.lease_store), None)
+    async with cluster_membership(lease_store):
+        summaries = await asyncio.gather(*(run_one(service) for service in services))
+    log_summaries(summaries)
+    limiters = {id(service.adaptive_limiter): service.adaptive_limiter for service in services}
+    for limiter in limiters.values():
+        if limiter is None:
+            continue
+        logger.info(
+            f"[limiter {limiter.name}] фінальний ліміт {limiter.limit}, "
+            f"змін ліміту: {len(limiter.history)}"
+        )
+    return summaries
+
+
+async def run_pipelines(
+    services: List[DocumentService],
+    base_link: str,
+    start_date: str,
+    end_date: str,
+    full_rescan: bool = False,
+    global_limit: int = GLOBAL_DOWNLOAD_CONCURRENCY,
+    per_token_limit: int = TOKEN_DOWNLOAD_CONCURRENCY,
+) -> List[Dict]:
+    """
+    Запускає всі проходи (token, doc_type) одночасно в одному циклі подій.
+    Завантаження обмежені глобальною стелею та окремим адаптивним лімітом
+    на кожен токен (спільним для проходів data і party одного токена)
+    зі стелею per_token_limit.
+    """
+    prepare_pipelines(services, global_limit, per_token_limit)
+    return await run_cycle(services, base_link, start_date, end_date, full_rescan, per_token_limit)
+
+
+def log_summaries(summaries: List[Dict]):
+    logger.info("=== Підсумок по компаніях ===")
+    for summary in summaries:
+        prefix = f"{summary['company']}/{summary['doc_type']}"
+        if "error" in summary:
+            logger.info(f"{prefix}: ПОМИЛКА — {summary['error']}")
+            continue
+        logger.info(
+            f"{prefix}: документів {summary['documents']}, заплановано {summary['planned']}, "
+            f"успішно {summary['success']}, 404 {summary['not_found']}, "
+            f"помилок {summary['failed']}, повторів {summary['retries']}, "
+            f"докачано {summary['bytes_resumed']} байт, час {summary['duration']:.1f} с"
+        )
+    logger.info("=============================")
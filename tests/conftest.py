@@ -0,0 +1,33 @@
+"""
+Тести працюють на SQLite-стенді, як benchmarks/run.py: змінні середовища
+задаються до першого імпорту config, тож MSSQL і мережа не потрібні.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+WORKDIR = Path(tempfile.mkdtemp(prefix="ecourt-tests-"))
+
+os.environ.update(
+    BASE_LINK="http://127.0.0.1:9/",
+    API_VERSION="",
+    TOKENS_FOLDERS_COMPANIES="{}",
+    TABLE_NAME="Documents",
+    DATABASE_URL=f"sqlite:///{(WORKDIR / 'documents.sqlite3').as_posix()}",
+    SOURCE_DATABASE_URL=f"sqlite:///{(WORKDIR / 'source.sqlite3').as_posix()}",
+    SOURCE_SCHEMA_CACHE_DIR="",
+)
+sys.path.insert(0, str(REPO_ROOT))
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Таблиці Documents створюються один раз на сесію."""
+    import database.models  # noqa: F401 — реєструє моделі в Base.metadata
+    from database.database import initialize_database
+
+    initialize_database()
@@ -0,0 +1,67 @@
+import uuid
+
+from sqlalchemy import select
+
+from database.database import SessionLocal
+from database.models import DocumentLinks, Documents
+from repo.download_queue import DownloadQueue, download_queue_path
+from services.audit import audit_storage
+
+
+def _queued_links(folder) -> set:
+    path = download_queue_path(folder, "data")
+    if not path.exists():
+        return set()
+    download_queue = DownloadQueue(path)
+    try:
+        return {link for rows in download_queue.iter_pending() for _, link, _ in rows}
+    finally:
+        download_queue.close()
+
+
+def test_requeue_targets_only_the_owning_company(database, tmp_path):
+    folder_a, folder_b = tmp_path / "company-a", tmp_path / "company-b"
+    folder_a.mkdir()
+    folder_b.mkdir()
+    (folder_a / "corrupt.pdf").write_bytes(b"short")
+
+    rows = {
+        # Знайдено в папці A з іншим розміром — належить A.
+        "audit/corrupt.pdf": dict(local_path="corrupt.pdf", size=100),
+        # Абсолютний local_path (до шардування) під папкою B — належить B.
+        "audit/absolute.pdf": dict(local_path=str(folder_b / "absolute.pdf"), size=10),
+        # Відносний шлях, файлу немає в жодній папці — власника не визначити.
+        "audit/unknown.pdf": dict(local_path="unknown-audit.pdf", size=10),
+    }
+    session = SessionLocal()
+    ids = {}
+    for link, values in rows.items():
+        file_hash = uuid.uuid4().hex
+        document = Documents(original_url=link, file_hash=file_hash, **values)
+        session.add(document)
+        session.add(DocumentLinks(original_url=link, file_hash=file_hash))
+        session.flush()
+        ids[link] = document.id
+    session.commit()
+
+    stats = audit_storage(
+        [str(folder_a), str(folder_b)],
+        base_link="http://base/",
+        requeue=True,
+        verify_hash=False,
+        workers=1,
+        output_dir=str(tmp_path / "reports"),
+    )
+
+    assert _queued_links(folder_a) == {"audit/corrupt.pdf"}
+    assert _queued_links(folder_b) == {"audit/absolute.pdf"}
+    assert stats["unattributed"] >= 1
+
+    remaining = set(session.execute(
+        select(Documents.original_url).where(Documents.id.in_(list(ids.values())))
+    ).scalars())
+    session.close()
+    # Переплановані рядки видалено, невизначений лишається для наступного аудиту.
+    assert remaining == {"audit/unknown.pdf"}
+    report = next((tmp_path / "reports").iterdir()) / "unattributed.tsv"
+    assert str(ids["audit/unknown.pdf"]) in report.read_text(encoding="utf-8")
@@ -0,0 +1,59 @@
+import asyncio
+import threading
+import time
+
+from repo.leases import LeaseStore
+from services.cluster import wait_for_nodes
+
+
+def test_not_found_link_is_not_reclaimed_by_other_nodes(database):
+    first, second = LeaseStore("node-404-a"), LeaseStore("node-404-b")
+    link = "data/missing-404.pdf"
+
+    assert first.claim([link]) == ([link], [], [])
+    first.mark_not_found(link)
+    first.flush_releases()
+    # Вузол, що отримав 404, виходить — позначка лишається для решти.
+    first.leave()
+
+    assert second.claim([link]) == ([], [link], [])
+    second.leave()
+
+
+def test_released_link_is_claimed_by_other_node(database):
+    first, second = LeaseStore("node-release-a"), LeaseStore("node-release-b")
+    link = "data/failed-500.pdf"
+
+    assert first.claim([link]) == ([link], [], [])
+    first.release(link)
+    first.flush_releases()
+
+    assert second.claim([link]) == ([link], [], [])
+    second.leave()
+    first.leave()
+
+
+def test_wait_for_nodes_returns_once_expected_nodes_registered(database):
+    first, second = LeaseStore("node-wait-a"), LeaseStore("node-wait-b")
+    late_start = threading.Timer(0.3, second.heartbeat)
+    late_start.start()
+
+    started = time.monotonic()
+    live = asyncio.run(wait_for_nodes(first, grace=10, expected_nodes=2, poll=0.05))
+    late_start.join()
+
+    assert {"node-wait-a", "node-wait-b"} <= set(live)
+    assert time.monotonic() - started < 5
+    second.leave()
+    first.leave()
+
+
+def test_wait_for_nodes_gives_up_after_grace(database):
+    store = LeaseStore("node-alone")
+
+    started = time.monotonic()
+    live = asyncio.run(wait_for_nodes(store, grace=0.3, expected_nodes=3, poll=0.05))
+
+    assert "node-alone" in live
+    assert 0.3 <= time.monotonic() - started < 5
+    store.leave()
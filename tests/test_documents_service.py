@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import threading
+from datetime import datetime
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+import services.documents as documents
+from database.database import SessionLocal
+from database.models import DocumentLinks, Documents
+from repo.documents import DocumentRepository
+from repo.download_queue import DownloadQueue
+from services.documents import DocumentService
+from utils.link_index import LinkIndex
+
+
+def _run_in_thread(coroutine_factory, timeout: float):
+    """asyncio.run в окремому потоці: зависання стає провалом тесту, а не тесту-раннера."""
+    outcome = {}
+
+    def target():
+        try:
+            outcome["result"] = asyncio.run(coroutine_factory())
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "asyncio.run не завершився"
+    return outcome
+
+
+def test_download_stage_error_propagates_and_releases_scan_thread(tmp_path, monkeypatch):
+    # Черга планування менша за кількість файлів — потік сканування блокується на put.
+    monkeypatch.setattr(documents, "PLAN_QUEUE_SIZE", 2)
+    download_queue = DownloadQueue(tmp_path / "queue.sqlite3")
+    download_queue.add_planned([
+        (f"url-{i}", f"link-{i}", f"file-{i}.pdf", (datetime(2024, 1, 1), f"doc-{i}")) for i in range(50)
+    ])
+    download_queue.flush()
+
+    service = DocumentService(document_repo=None, doc_type="data", token="token", company="test")
+
+    async def failing_downloads(files, concurrency_limit):
+        async for _ in files:
+            raise RuntimeError("download stage failed")
+
+    monkeypatch.setattr(service, "_run_all_downloads_async", failing_downloads)
+    scan = {"resumed": 0}
+
+    outcome = _run_in_thread(
+        lambda: service._gather_documents_async(
+            "http://base/", "2000-01-01", "2100-01-01", None, LinkIndex(), scan,
+            concurrency_limit=4, download_queue=download_queue, resume_only=True,
+        ),
+        timeout=30,
+    )
+    download_queue.close()
+
+    assert isinstance(outcome.get("error"), RuntimeError)
+    assert str(outcome["error"]) == "download stage failed"
+    assert isinstance(scan.get("error"), documents.ScanStopped)
+
+
+def test_links_sharing_file_name_stream_into_separate_part_files(database, tmp_path, monkeypatch):
+    # Party з повтореним attachNum: два посилання, одне file_name, різний вміст.
+    monkeypatch.setattr(documents, "DOWNLOAD_CHUNK_SIZE", 1024)
+    contents = {
+        "party/a.pdf": b"A" * 64 * 1024,
+        "party/b.pdf": b"B" * 48 * 1024,
+    }
+
+    async def body(content: bytes):
+        for start in range(0, len(content), 1024):
+            await asyncio.sleep(0)
+            yield content[start:start + 1024]
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        link = request.url.path.removeprefix("/storage/file/")
+        return httpx.Response(200, content=body(contents[link]))
+
+    session = SessionLocal()
+    repo = DocumentRepository(session=session, folder=str(tmp_path / "files"), company="parts")
+    service = DocumentService(document_repo=repo, doc_type="party", token="token", company="parts")
+
+    async def run():
+        service.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await service._run_all_downloads_async(
+                [(f"http://base/storage/file/{link}", link, "doc-None.pdf") for link in contents],
+                concurrency_limit=2,
+            )
+        finally:
+            await service.http_client.aclose()
+
+    stats = asyncio.run(run())
+    assert stats["success"] == 2
+
+    recorded = dict(session.execute(
+        select(DocumentLinks.original_url, DocumentLinks.file_hash)
+        .where(DocumentLinks.original_url.in_(list(contents)))
+    ).all())
+    sizes = dict(session.execute(
+        select(Documents.original_url, Documents.size).where(Documents.original_url.in_(list(contents)))
+    ).all())
+    session.close()
+    assert recorded == {link: hashlib.sha256(content).hexdigest() for link, content in contents.items()}
+    assert sizes == {link: len(content) for link, content in contents.items()}
+    assert not list((tmp_path / "files").rglob("*.part"))
+    assert repo.part_path("doc-None.pdf", "party/a.pdf") != repo.part_path("doc-None.pdf", "party/b.pdf")
+
+
+def test_uncompressed_file_resumes_with_range_when_company_compresses(database, tmp_path, monkeypatch):
+    # docx writer зберігає без стиснення навіть за codec компанії — обрив докачується з Range.
+    monkeypatch.setattr(documents, "DOWNLOAD_CHUNK_SIZE", 1024)
+    monkeypatch.setattr(DocumentService, "_retry_delay", staticmethod(lambda attempt, response=None: 0))
+    content = b"PK\x03\x04" + bytes(range(256)) * 256
+    cut = 20 * 1024
+    ranges = []
+
+    async def broken_body():
+        for start in range(0, cut, 1024):
+            await asyncio.sleep(0)
+            yield content[start:start + 1024]
+        raise httpx.ReadError("connection reset")
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        range_header = request.headers.get("Range")
+        ranges.append(range_header)
+        if range_header is None:
+            return httpx.Response(200, headers={"ETag": '"v1"'}, content=broken_body())
+        start = int(range_header.removeprefix("bytes=").removesuffix("-"))
+        return httpx.Response(206, headers={"ETag": '"v1"'}, content=content[start:])
+
+    session = SessionLocal()
+    repo = DocumentRepository(session=session, folder=str(tmp_path / "files"), company="resume")
+    repo.storage_codec = "gzip"
+    service = DocumentService(document_repo=repo, doc_type="data", token="token", company="resume")
+
+    async def run():
+        service.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await service._run_all_downloads_async(
+                [("http://base/storage/file/data/resume.docx", "data/resume.docx", "resume.docx")],
+                concurrency_limit=1,
+            )
+        finally:
+            await service.http_client.aclose()
+
+    stats = asyncio.run(run())
+    row = session.execute(
+        select(DocumentLinks.file_hash).where(DocumentLinks.original_url == "data/resume.docx")
+    ).scalar_one()
+    size = session.execute(
+        select(Documents.size).where(Documents.original_url == "data/resume.docx")
+    ).scalar_one()
+    session.close()
+
+    assert stats["success"] == 1
+    assert ranges == [None, f"bytes={cut}-"]
+    assert stats["bytes_resumed"] == cut
+    assert row == hashlib.sha256(content).hexdigest()
+    assert size == len(content)
@@ -0,0 +1,27 @@
+import asyncio
+from types import SimpleNamespace
+
+from services.orchestrator import prepare_pipelines
+
+
+def test_token_limit_caps_adaptive_limiter():
+    services = [
+        SimpleNamespace(token="token-a", company="a", doc_type="data"),
+        SimpleNamespace(token="token-a", company="a", doc_type="party"),
+        SimpleNamespace(token="token-b", company="b", doc_type="data"),
+    ]
+
+    async def prepare():
+        prepare_pipelines(services, global_limit=50, per_token_limit=3)
+        limiter = services[0].adaptive_limiter
+        for _ in range(100):
+            limiter.on_success()
+        return limiter
+
+    limiter = asyncio.run(prepare())
+    # data і party одного токена ділять ліміт, інший токен має власний.
+    assert services[1].adaptive_limiter is limiter
+    assert services[2].adaptive_limiter is not limiter
+    assert limiter.max_limit == 3
+    assert limiter.limit == 3
+    assert services[2].adaptive_limiter.limit <= 3
@@ -0,0 +1,26 @@
+import sqlite3
+import threading
+
+from config.config import SOURCE_DATABASE_URL
+from database.source import dispose_source_engines, get_source_table, invalidate_source_table
+
+
+def test_get_source_table_without_engine_uses_shared_engine():
+    path = SOURCE_DATABASE_URL.removeprefix("sqlite:///")
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE IF NOT EXISTS "documentnoengine" ("DocumentId" VARCHAR(64), "updatedAt" DATETIME)')
+    connection.close()
+    invalidate_source_table("documentnoengine")
+
+    outcome = {}
+
+    def reflect():
+        outcome["table"] = get_source_table("documentnoengine")
+
+    # Замок модуля нереентрантний: виклик без engine не повинен чекати сам на себе.
+    thread = threading.Thread(target=reflect, daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive(), "get_source_table без engine заблокувався"
+    dispose_source_engines()
+    assert set(outcome["table"].c.keys()) == {"DocumentId", "updatedAt"}
@@ -0,0 +1,106 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+
+import repo.documents as documents_repo
+from database.database import create_db_engine
+from database.source import get_source_table
+from repo.documents import DocumentRepository
+
+COMPANY = "scan"
+DOCUMENTS = 40
+
+
+@pytest.fixture(scope="module")
+def source_path(tmp_path_factory):
+    """Таблиці data і party; updatedAt повторюються, щоб keyset перевірявся і за id."""
+    path = tmp_path_factory.mktemp("source") / "source.sqlite3"
+    connection = sqlite3.connect(path)
+    started = datetime(2024, 1, 1)
+    connection.execute(
+        f'CREATE TABLE "document{COMPANY}" ('
+        '"DocumentId" VARCHAR(64) PRIMARY KEY, "updatedAt" DATETIME, "originalText" TEXT)'
+    )
+    connection.execute(
+        f'CREATE TABLE "partyDocs{COMPANY}" ("id" VARCHAR(64) PRIMARY KEY, "updatedAt" DATETIME, "attachments" TEXT)'
+    )
+    for i in range(DOCUMENTS):
+        updated_at = (started + timedelta(minutes=i // 3)).strftime("%Y-%m-%d %H:%M:%S.%f")
+        connection.execute(
+            f'INSERT INTO "document{COMPANY}" VALUES (?, ?, ?)',
+            (f"doc-{i:03}", updated_at, json.dumps({"link": f"data/{i}.pdf"})),
+        )
+        attachments = [{"link": f"party/{i}-{n}.pdf", "attachNum": n} for n in range(i % 4)]
+        connection.execute(
+            f'INSERT INTO "partyDocs{COMPANY}" VALUES (?, ?, ?)', (f"party-{i:03}", updated_at, json.dumps(attachments))
+        )
+    connection.commit()
+    connection.close()
+    return path
+
+
+def _scan(repo, engine, doc_type, projected, shards, fetch_size=3):
+    table = get_source_table(repo.source_table_name(doc_type), engine)
+    lower, upper = datetime(2000, 1, 1), datetime(2100, 1, 1)
+    if shards > 1:
+        batches = repo._iter_sharded(engine, table, doc_type, lower, upper, fetch_size, shards, projected)
+    else:
+        batches = repo._iter_source_range(engine, table, doc_type, lower, upper, fetch_size, projected=projected)
+    return [row for batch in batches for row in batch]
+
+
+@pytest.mark.parametrize("doc_type", ["data", "party"])
+@pytest.mark.parametrize("projected", [False, True])
+def test_sharded_pages_match_single_stream(source_path, doc_type, projected):
+    engine = create_db_engine(f"sqlite:///{source_path.as_posix()}", read_only=True)
+    repo = DocumentRepository(session=None, folder=str(source_path.parent), company=COMPANY)
+    try:
+        expected = _scan(repo, engine, doc_type, projected, shards=1)
+        assert _scan(repo, engine, doc_type, projected, shards=4) == expected
+        assert len(expected) == (DOCUMENTS if doc_type == "data" or not projected else 70)
+    finally:
+        engine.dispose()
+
+
+def test_parked_shards_do_not_starve_concurrent_passes(source_path, monkeypatch):
+    # Дві проходи по 4 шарди на пулі з 2 з'єднань, без повторів: шард, що тримав би
+    # з'єднання, чекаючи на заповнену чергу, довів би інший прохід до PoolTimeout.
+    monkeypatch.setattr(documents_repo, "SOURCE_SHARD_PREFETCH", 1)
+    monkeypatch.setattr(documents_repo, "SOURCE_SHARD_RETRIES", 0)
+    engine = create_engine(
+        f"sqlite:///{source_path.as_posix()}",
+        connect_args={"check_same_thread": False},
+        pool_size=2,
+        max_overflow=0,
+        pool_timeout=0.5,
+    )
+    repo = DocumentRepository(session=None, folder=str(source_path.parent), company=COMPANY)
+    table = get_source_table(repo.source_table_name("data"), engine)
+    results, errors = [], []
+
+    def run_pass():
+        try:
+            rows = 0
+            for batch in repo._iter_sharded(
+                engine, table, "data", datetime(2000, 1, 1), datetime(2100, 1, 1), 2, 4
+            ):
+                rows += len(batch)
+                time.sleep(0.05)
+            results.append(rows)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run_pass) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(60)
+    engine.dispose()
+
+    assert not errors
+    assert results == [DOCUMENTS, DOCUMENTS]
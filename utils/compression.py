@@ -0,0 +1,87 @@
+"""
+Опційне стиснення файлів сховища (gzip або zstd) під час потокового запису
+і прозоре читання. Модуль без config/БД: імпортується пулом процесів аудиту.
+"""
+import gzip
+import os
+import zlib
+from typing import BinaryIO, Iterable, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP = "gzip"
+ZSTD = "zstd"
+CODEC_SUFFIXES = {GZIP: ".gz", ZSTD: ".zst"}
+DEFAULT_LEVELS = {GZIP: 6, ZSTD: 3}
+
+# Формати, що вже стиснені всередині (zip-контейнери Office, архіви, зображення).
+COMPRESSED_EXTENSIONS = frozenset({
+    ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp", ".zip", ".7z", ".rar",
+    ".gz", ".tgz", ".bz2", ".xz", ".zst", ".jpg", ".jpeg", ".png", ".gif",
+    ".webp", ".heic", ".mp3", ".mp4", ".avi", ".mkv",
+})
+_COMPRESSED_MAGIC = (
+    b"PK\x03\x04",            # zip (docx/xlsx/odt)
+    b"\x1f\x8b",              # gzip
+    b"\x28\xb5\x2f\xfd",      # zstd
+    b"BZh",                   # bzip2
+    b"\xfd7zXZ\x00",          # xz
+    b"7z\xbc\xaf\x27\x1c",    # 7z
+    b"Rar!\x1a\x07",          # rar
+    b"\xff\xd8\xff",          # jpeg
+    b"\x89PNG\r\n\x1a\n",     # png
+    b"GIF8",                  # gif
+)
+
+
+def available_codec(codec: Optional[str]) -> Optional[str]:
+    """
+    Нормалізує назву кодека: None/""/"none" — без стиснення; zstd без пакета
+    zstandard замінюється на gzip (стандартна бібліотека).
+    """
+    codec = (codec or "").lower()
+    if codec in ("", "none", "off"):
+        return None
+    if codec not in CODEC_SUFFIXES:
+        raise ValueError(f"Невідомий кодек стиснення: {codec}")
+    if codec == ZSTD and zstandard is None:
+        return GZIP
+    return codec
+
+
+def should_compress(file_name: str, head: bytes, skip_extensions: Iterable[str] = COMPRESSED_EXTENSIONS) -> bool:
+    """Чи варто стискати файл: не за розширенням зі списку і не за сигнатурою першого блоку."""
+    if os.path.splitext(file_name)[1].lower() in skip_extensions:
+        return False
+    return not head.startswith(_COMPRESSED_MAGIC)
+
+
+def stored_file_name(file_name: str, codec: Optional[str]) -> str:
+    """Ім'я файлу на диску: зі суфіксом кодека, щоб стиснені файли було видно без БД."""
+    return file_name + CODEC_SUFFIXES[codec] if codec else file_name
+
+
+def create_compressor(codec: str, level: Optional[int] = None):
+    """Потоковий компресор з методами compress(chunk) і flush()."""
+    level = DEFAULT_LEVELS[codec] if level is None else level
+    if codec == ZSTD:
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    # wbits=31 — контейнер gzip, сумісний з gzip.open і утилітою gzip.
+    return zlib.compressobj(level, zlib.DEFLATED, 31)
+
+
+def open_stored(path, codec: Optional[str]) -> BinaryIO:
+    """Відкриває файл сховища для читання, прозоро розпаковуючи його за codec."""
+    if not codec:
+        return open(path, "rb")
+    if codec == GZIP:
+        return gzip.open(path, "rb")
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Для читання zstd-файлів потрібен пакет zstandard")
+        raw = open(path, "rb")
+        return zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    raise ValueError(f"Невідомий кодек стиснення: {codec}")
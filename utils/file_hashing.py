@@ -1,17 +1,129 @@
 import hashlib
+import os
+from time import perf_counter
+from typing import List, Optional, Tuple
+
+from utils.compression import create_compressor, open_stored, should_compress
 
 def calculate_file_hash_from_bytes(content: bytes) -> str:
     """Обчислює SHA-256 хеш з вмісту файлу в пам'яті."""
     return hashlib.sha256(content).hexdigest()
 
 
-def calculate_file_hash_from_path(file_path: str, buffer_size: int = 65536) -> str:
-    """Обчислює SHA-256 хеш файлу, читаючи його частинами."""
+def calculate_file_hash_from_path(file_path: str, buffer_size: int = 65536, codec: Optional[str] = None) -> str:
+    """Обчислює SHA-256 хеш файлу (для стисненого — вихідного вмісту), читаючи його частинами."""
     sha256_hash = hashlib.sha256()
-    with open(file_path, 'rb') as f:
+    with open_stored(file_path, codec) as f:
         while True:
             data = f.read(buffer_size)
             if not data:
                 break
             sha256_hash.update(data)
-    return sha256_hash.hexdigest()
\ No newline at end of file
+    return sha256_hash.hexdigest()
+
+class HashingFileWriter:
+    """
+    Пише файл частинами, паралельно оновлюючи SHA-256 і розмір.
+    Для докачування приймає стан хешу та розмір вже записаного префікса
+    і обрізає файл до нього (mode "ab"), інакше пише файл з нуля.
+    codec ("gzip"/"zstd") — стискати на льоту; хеш і size рахуються по
+    вихідних байтах, stored_size — розмір на диску. Чи стискати, вирішує
+    перший блок (should_compress); якщо ні, codec скидається в None.
+    Стиснений файл не докачується — лише з нуля. name — ім'я кінцевого файлу
+    для should_compress (за замовчуванням — ім'я path без .part).
+    hash_seconds / write_seconds / compress_seconds — накопичений час стадій.
+    """
+
+    def __init__(
+        self,
+        path,
+        hasher=None,
+        size: int = 0,
+        codec: Optional[str] = None,
+        level: Optional[int] = None,
+        name: Optional[str] = None,
+    ):
+        self.codec = codec
+        self.level = level
+        self.stored_size = 0
+        self._compressor = None
+        self._name = name or os.path.basename(path).removesuffix(".part")
+        if hasher is not None and size and not codec:
+            self.hasher, self.size = hasher, size
+            os.truncate(path, size)
+            self._file = open(path, "ab")
+        else:
+            self.hasher, self.size = hashlib.sha256(), 0
+            self._file = open(path, "wb")
+        self.hash_seconds = 0.0
+        self.write_seconds = 0.0
+        self.compress_seconds = 0.0
+
+    def write(self, chunk: bytes):
+        data = chunk
+        if self.codec:
+            if self._compressor is None:
+                if self.size == 0 and should_compress(self._name, chunk):
+                    self._compressor = create_compressor(self.codec, self.level)
+                else:
+                    self.codec = None
+            if self._compressor is not None:
+                started = perf_counter()
+                data = self._compressor.compress(chunk)
+                self.compress_seconds += perf_counter() - started
+        started = perf_counter()
+        self._file.write(data)
+        written = perf_counter()
+        self.hasher.update(chunk)
+        self.write_seconds += written - started
+        self.hash_seconds += perf_counter() - written
+        self.size += len(chunk)
+
+    def close(self):
+        if self._compressor is not None:
+            started = perf_counter()
+            tail = self._compressor.flush()
+            self.compress_seconds += perf_counter() - started
+            self._file.write(tail)
+            self._compressor = None
+        elif self.codec and self.size == 0:
+            # Порожній файл не стискаємо.
+            self.codec = None
+        self.stored_size = self._file.tell()
+        self._file.close()
+
+
+def check_stored_files(
+    rows: List[Tuple],
+    folders: List[str],
+    verify_hash: bool = True,
+    buffer_size: int = 1024 * 1024,
+) -> List[Tuple]:
+    """
+    Перевіряє пачку файлів сховища (для пулу процесів аудиту).
+    rows — (id, local_path, size, file_hash, codec, stored_size); файл шукається
+    в кожній з folders. Спершу порівнюється розмір на диску (stored_size для
+    стиснених) і лише за збігу рахується SHA-256 вихідного вмісту великими блоками. Повертає (id, status, знайдений шлях або None), де status —
+    "ok", "missing", "size" чи "hash".
+    """
+    results = []
+    for row_id, local_path, size, file_hash, codec, stored_size in rows:
+        expected_size = stored_size if codec else size
+        path, actual_size = None, None
+        for folder in folders:
+            candidate = os.path.join(folder, local_path)
+            try:
+                actual_size = os.stat(candidate).st_size
+            except OSError:
+                continue
+            path = candidate
+            break
+        if path is None:
+            results.append((row_id, "missing", None))
+        elif expected_size is not None and actual_size != expected_size:
+            results.append((row_id, "size", path))
+        elif verify_hash and file_hash and calculate_file_hash_from_path(path, buffer_size, codec) != file_hash:
+            results.append((row_id, "hash", path))
+        else:
+            results.append((row_id, "ok", path))
+    return results
@@ -0,0 +1,15 @@
+import hashlib
+
+
+def sharded_relative_path(file_name: str, levels: int, width: int) -> str:
+    """
+    Відносний шлях файлу в шардованому сховищі: levels рівнів підпапок
+    з префіксів hex-хешу імені (по width символів), напр. "3f/a2/<file_name>".
+    levels=0 — плоска папка, шлях дорівнює імені файлу.
+    Роздільник завжди "/", тож local_path у БД не залежить від ОС.
+    """
+    if levels <= 0:
+        return file_name
+    digest = hashlib.blake2b(file_name.encode("utf-8"), digest_size=16).hexdigest()
+    parts = [digest[i * width:(i + 1) * width] for i in range(levels)]
+    return "/".join(parts + [file_name])
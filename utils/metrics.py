@@ -0,0 +1,270 @@
+import os
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+DEFAULT_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0
+)
+
+
+def _label_key(labels: Dict) -> Tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: Tuple, extra: Tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def total(self) -> float:
+        """Сума по всіх наборах міток."""
+        with self._lock:
+            return sum(self._values.values())
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(key)} {value}" for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Гістограма з фіксованими межами кошиків (секунди)."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [лічильники кошиків..., +Inf], сума, кількість
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - started, **labels)
+
+    def totals(self) -> Dict[Tuple, Tuple[float, int]]:
+        """(сума, кількість) для кожного набору міток."""
+        with self._lock:
+            return {key: (state[1], state[2]) for key, state in self._values.items()}
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Усі метрики у текстовому форматі Prometheus."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """
+        Атомарний запис для textfile collector'а node_exporter:
+        спершу тимчасовий файл, потім os.replace.
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+REGISTRY = MetricsRegistry()
+
+FILES = REGISTRY.register(Counter(
+    "collector_files_total", "Оброблені файли за результатом (success, 404, failed)."
+))
+BYTES = REGISTRY.register(Counter(
+    "collector_bytes_total", "Завантажені байти."
+))
+STORED_BYTES = REGISTRY.register(Counter(
+    "collector_stored_bytes_total", "Байти, записані на диск у стисненому вигляді."
+))
+RETRIES = REGISTRY.register(Counter(
+    "collector_retries_total", "Повторні спроби завантаження."
+))
+HTTP_RESPONSES = REGISTRY.register(Counter(
+    "collector_http_responses_total", "HTTP відповіді сховища файлів за кодом статусу."
+))
+HTTP_TTFB = REGISTRY.register(Histogram(
+    "collector_http_ttfb_seconds", "Час до заголовків відповіді."
+))
+DOWNLOAD_SECONDS = REGISTRY.register(Histogram(
+    "collector_download_seconds", "Тривалість завантаження файлу, від запиту до останнього байта."
+))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "collector_stage_seconds",
+    "Час стадій: source_scan, manifest, existing_links, hash, write, db_commit.",
+))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "collector_downloads_in_flight", "Завантаження, що виконуються зараз."
+))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "collector_queue_depth", "Кількість елементів у внутрішніх чергах."
+))
+
+
+def timed(stage: str):
+    """Контекстний менеджер: час блоку йде у collector_stage_seconds{stage=...}."""
+    return STAGE_SECONDS.time(stage=stage)
+
+
+def timed_iter(iterable: Iterable, stage: str) -> Iterator:
+    """Віддає елементи iterable, зараховуючи час отримання кожного до стадії stage."""
+    iterator = iter(iterable)
+    while True:
+        started = perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            STAGE_SECONDS.observe(perf_counter() - started, stage=stage)
+            return
+        STAGE_SECONDS.observe(perf_counter() - started, stage=stage)
+        yield item
+
+
+def profile_report() -> str:
+    """Підсумок часу по стадіях для режиму --profile."""
+    rows = []
+    for key, (total, count) in STAGE_SECONDS.totals().items():
+        rows.append((dict(key).get("stage", "?"), total, count))
+    for histogram, stage in ((HTTP_TTFB, "http_ttfb"), (DOWNLOAD_SECONDS, "download")):
+        for key, (total, count) in histogram.totals().items():
+            rows.append((stage, total, count))
+    rows.sort(key=lambda row: row[1], reverse=True)
+
+    lines = [f"{'стадія':<16}{'сумарно, с':>14}{'викликів':>12}{'середнє, мс':>14}"]
+    for stage, total, count in rows:
+        lines.append(f"{stage:<16}{total:>14.2f}{count:>12}{total / count * 1000 if count else 0:>14.2f}")
+    return "\n".join(lines)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """HTTP endpoint /metrics у фоновому потоці."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def start_textfile_exporter(path: str, interval: float) -> threading.Event:
+    """
+    Періодично переписує textfile з метриками у фоновому потоці.
+    Повертає Event: set() зупиняє експорт; фінальний запис робить викликач.
+    """
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            REGISTRY.write_textfile(path)
+
+    threading.Thread(target=run, name="metrics-textfile", daemon=True).start()
+    return stop